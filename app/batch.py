@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import json
+import secrets
+import typing as t
+
+import httpx
+
+from app.configs import BatchConfig
+from app.exceptions import OpenAIServiceError
+from app.logger import get_logger
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def batch_input(bodies: dict[str, dict]) -> str:
+    """
+    JSONL input file of the OpenAI Batch API: one chat completion request
+    body per custom id.
+    """
+    return "".join(
+        json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": body,
+        }) + "\n"
+        for custom_id, body in bodies.items()
+    )
+
+
+def parse_batch_output(output: str) -> dict[str, dict]:
+    """Lines of a Batch API output file by their custom id."""
+    lines = (json.loads(line) for line in output.splitlines() if line)
+    return {line["custom_id"]: line for line in lines}
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for the OpenAI Batch API: runs every line of an input file
+    against the chat completions endpoint and returns the output file.
+    """
+
+    def __init__(self, send: t.Callable[[dict], t.Awaitable[httpx.Response]]):
+        self.send = send
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def run(self, input_file: str) -> str:
+        lines = [json.loads(line) for line in input_file.splitlines() if line]
+        self.logger.info(f"Running a batch of {len(lines)} requests")
+        results = await asyncio.gather(*map(self._run_line, lines))
+        return "".join(json.dumps(result) + "\n" for result in results)
+
+    async def _run_line(self, line: dict) -> dict:
+        result = {
+            "id": f"batch_req_{secrets.token_hex(12)}",
+            "custom_id": line["custom_id"],
+            "response": None,
+            "error": None,
+        }
+        # As in the Batch API, a failed line does not fail the batch.
+        try:
+            response = await self.send(line["body"])
+            result["response"] = {
+                "status_code": response.status_code,
+                "request_id": response.headers.get("x-request-id", ""),
+                "body": response.json(),
+            }
+        except Exception as e:
+            result["error"] = {"code": "request_failed", "message": str(e)}
+        return result
+
+
+class CompletionBatcher:
+    """
+    Collects chat completion requests for up to `max_wait` seconds, or
+    until there are `max_size` of them, and runs them as one batch job.
+    """
+
+    def __init__(
+        self,
+        backend: LocalBatchBackend,
+        max_size: int = BatchConfig.API_MAX_SIZE,
+        max_wait: float = BatchConfig.API_MAX_WAIT,
+    ):
+        self.backend = backend
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.pending: dict[str, tuple[dict, asyncio.Future[dict]]] = {}
+        self._ids = itertools.count(1)
+        self._timer: asyncio.TimerHandle | None = None
+        self._jobs: set[asyncio.Task] = set()
+
+    async def complete(self, body: dict) -> dict:
+        """Returns the response body of the request once its batch ran."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[f"request-{next(self._ids)}"] = (body, future)
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+        job = asyncio.create_task(self._run(pending))
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+
+    async def _run(
+        self,
+        pending: dict[str, tuple[dict, asyncio.Future[dict]]]
+    ) -> None:
+        try:
+            output = parse_batch_output(await self.backend.run(batch_input(
+                {custom_id: body for custom_id, (body, _) in pending.items()}
+            )))
+        except Exception as e:
+            for _, future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, (_, future) in pending.items():
+            # The caller may have given up, e.g. on its deadline.
+            if future.done():
+                continue
+            line = output.get(custom_id)
+            if line is None or line["error"] is not None:
+                future.set_exception(OpenAIServiceError(
+                    f"Batch request {custom_id} failed:"
+                    f" {line and line['error']}"
+                ))
+            elif line["response"]["status_code"] != 200:
+                future.set_exception(OpenAIServiceError(
+                    f"OpenAI API error: {line['response']['status_code']}"
+                    f" - {line['response']['body']}"
+                ))
+            else:
+                future.set_result(line["response"]["body"])
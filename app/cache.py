@@ -1,12 +1,33 @@
+import asyncio
+import base64
+import contextvars
 import hashlib
 import json
-import os
+import time
+import typing as t
+import uuid
+import zlib
 
-import redis
+import redis.asyncio as redis
 
-from functools import wraps
+from collections import OrderedDict
+from dataclasses import dataclass
 
-DEFAULT_CACHE_TIME = 60 * 60
+from pydantic import BaseModel
+
+from app.configs import (
+    BlobCacheConfig,
+    HttpCacheConfig,
+    OpenAIConfig,
+    ReviewCacheConfig,
+)
+from app.logger import get_logger
+from app.metrics import CACHE_REQUESTS
+from app.models import ReviewResponse
+
+SINGLE_FLIGHT_LOCK_TIMEOUT = 5 * 60
+# Result of a leader that was cancelled, its followers try again.
+_ABANDONED = object()
 
 
 class UniversalJSONEncoder(json.JSONEncoder):
@@ -20,6 +41,10 @@ class UniversalJSONEncoder(json.JSONEncoder):
         return str(obj)
 
 
+def _dumps(value: t.Any) -> str:
+    return json.dumps(value, cls=UniversalJSONEncoder)
+
+
 def get_redis_client() -> redis.Redis:
     from app.main import redis_client
 
@@ -30,35 +55,553 @@ def get_redis_client() -> redis.Redis:
     return redis_client
 
 
-def redis_cache(ttl: int = DEFAULT_CACHE_TIME):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
+class SingleFlight:
+    """
+    Runs one computation per cache key at a time. Callers in the same
+    process await a shared future, callers in other workers wait on a Redis
+    lock and receive the leader's serialized result over pubsub.
+    """
+
+    def __init__(self, lock_timeout: int = SINGLE_FLIGHT_LOCK_TIMEOUT):
+        self.lock_timeout = lock_timeout
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def do(
+        self,
+        client: redis.Redis,
+        key: str,
+        compute: t.Callable[[], t.Awaitable[t.Any]],
+        ttl: int,
+        dumps: t.Callable[[t.Any], str] = _dumps,
+        loads: t.Callable[[str], t.Any] = json.loads,
+        current: t.Callable[[str], bool] | None = None,
+    ) -> t.Any:
+        """
+        Returns the result of `compute`, stored at `key` as `dumps` of it.
+        Followers in other workers read it back with `loads`. A payload
+        already at `key` is only taken for the result if `current` says so,
+        e.g. not while an expired entry is being replaced.
+        """
+        # A cancelled leader hands over to the next caller instead of
+        # cancelling its followers.
+        while (leader := self._in_flight.get(key)) is not None:
+            result = await asyncio.shield(leader)
+            if result is not _ABANDONED:
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._run(
+                client, key, compute, ttl, dumps, loads, current
+            )
+        except asyncio.CancelledError:
+            future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved, there may be no other waiters.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    async def _run(
+        self,
+        client: redis.Redis,
+        key: str,
+        compute: t.Callable[[], t.Awaitable[t.Any]],
+        ttl: int,
+        dumps: t.Callable[[t.Any], str],
+        loads: t.Callable[[str], t.Any],
+        current: t.Callable[[str], bool] | None = None,
+    ) -> t.Any:
+        lock_key, channel = f"{key}:lock", f"{key}:done"
+        token = uuid.uuid4().hex
+
+        if not await client.set(lock_key, token, nx=True, ex=self.lock_timeout):
+            payload = await self._wait_for_leader(
+                client, key, channel, current
+            )
+            if payload:
+                return loads(payload)
+            # The leader failed or timed out, compute on our own.
+            return await self._compute_and_store(
+                client, key, compute, ttl, dumps
+            )
+
+        try:
+            result = await self._compute_and_store(
+                client, key, compute, ttl, dumps, channel
+            )
+        except BaseException:
+            # Also when cancelled (deadline, disconnect, shutdown), so other
+            # workers stop waiting and compute on their own. Shielded, the
+            # cancellation must not cut the hand-over short.
+            await asyncio.shield(client.publish(channel, ""))
+            raise
+        finally:
+            await asyncio.shield(self._release(client, lock_key, token))
+        return result
+
+    @staticmethod
+    async def _compute_and_store(
+        client: redis.Redis,
+        key: str,
+        compute: t.Callable[[], t.Awaitable[t.Any]],
+        ttl: int,
+        dumps: t.Callable[[t.Any], str],
+        channel: str | None = None,
+    ) -> t.Any:
+        result = await compute()
+        payload = dumps(result)
+        await client.set(key, payload, ex=ttl)
+        if channel:
+            await client.publish(channel, payload)
+        return result
+
+    async def _wait_for_leader(
+        self,
+        client: redis.Redis,
+        key: str,
+        channel: str,
+        current: t.Callable[[str], bool] | None = None,
+    ) -> str | None:
+        async with client.pubsub() as pubsub:
+            await pubsub.subscribe(channel)
+
+            # The leader may have finished before we subscribed.
+            cached_data = await client.get(key)
+            if cached_data and (current is None or current(cached_data)):
+                return cached_data
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.lock_timeout
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=remaining
+                )
+                if message is not None:
+                    return message["data"]
+        return None
+
+    @staticmethod
+    async def _release(client: redis.Redis, lock_key: str, token: str):
+        # Only delete the lock if it still belongs to us.
+        async with client.pipeline(transaction=True) as pipe:
+            await pipe.watch(lock_key)
+            if await pipe.get(lock_key) == token:
+                pipe.multi()
+                pipe.delete(lock_key)
+                await pipe.execute()
+
+
+single_flight = SingleFlight()
+
 
-            if os.getenv("TEST"):
-                return await func(*args, **kwargs)
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
 
-            client = get_redis_client()
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
 
+
+class LRUByteCache:
+    """
+    In-process LRU cache bounded by the total size of its values: the UTF-8
+    size of strings, or the size given for other values.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[t.Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> t.Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value: t.Any, size: int | None = None) -> None:
+        if size is None:
+            size = len(value.encode())
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self.size += size
+
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.stats.evictions += 1
+            self.stats.evicted_bytes += evicted_size
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class LayeredCache:
+    """
+    In-memory LRU bounded by size in front of Redis, so workers share what
+    any of them has stored. Redis errors are logged and treated as misses.
+    """
+
+    KEY_PREFIX: str
+
+    def __init__(
+        self,
+        client: redis.Redis | None,
+        max_bytes: int,
+        ttl: int,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.memory = LRUByteCache(max_bytes)
+        self.stats = CacheStats()
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def get(self, key: str) -> str | None:
+        value = self.memory.get(key)
+        if value is None and self.client is not None:
             try:
-                kwargs_serialized = json.dumps(kwargs, sort_keys=True)
-            except TypeError as e:
-                raise ValueError(f"Cannot serialize kwargs: {kwargs}. Error: {e}")
+                value = await self.client.get(f"{self.KEY_PREFIX}:{key}")
+            except redis.RedisError as e:
+                self.logger.warning(f"Cache lookup failed: {e}")
+            if value is not None:
+                self.memory.set(key, value)
+
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        CACHE_REQUESTS.inc(
+            cache=self.KEY_PREFIX, result="miss" if value is None else "hit"
+        )
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self.memory.set(key, value)
+        if self.client is None:
+            return
+        try:
+            await self.client.set(
+                f"{self.KEY_PREFIX}:{key}", value, ex=self.ttl
+            )
+        except redis.RedisError as e:
+            self.logger.warning(f"Cache store failed: {e}")
+
+
+class BlobCache(LayeredCache):
+    """
+    Content-addressed cache of file contents keyed by git blob SHA. Blobs
+    are immutable, so entries never need invalidation.
+    """
+
+    KEY_PREFIX = "blob"
+
+    def __init__(
+        self,
+        client: redis.Redis | None = None,
+        max_bytes: int = BlobCacheConfig.MAX_BYTES,
+        ttl: int = BlobCacheConfig.TTL,
+    ):
+        super().__init__(client, max_bytes, ttl)
 
-            cache_key = f"{func.__name__}:{hashlib.md5(kwargs_serialized.encode()).hexdigest()}"
-            cached_data = client.get(cache_key)
-            if cached_data:
-                return json.loads(cached_data)
 
-            result = await func(*args, **kwargs)
+class HttpResponseCache(LayeredCache):
+    """
+    Stores validators (ETag, Last-Modified) and bodies of GET responses so
+    they can be revalidated with conditional requests. Bodies larger than
+    `max_entry_bytes` are not cached.
+    """
 
-            client.set(
-                cache_key,
-                json.dumps(result, cls=UniversalJSONEncoder),
-                ex=ttl
+    KEY_PREFIX = "http"
+
+    def __init__(
+        self,
+        client: redis.Redis | None = None,
+        max_bytes: int = HttpCacheConfig.MAX_BYTES,
+        ttl: int = HttpCacheConfig.TTL,
+        max_entry_bytes: int = HttpCacheConfig.MAX_ENTRY_BYTES,
+    ):
+        super().__init__(client, max_bytes, ttl)
+        self.max_entry_bytes = max_entry_bytes
+
+
+M = t.TypeVar("M", bound=BaseModel)
+
+
+class ModelCodec(t.Generic[M]):
+    """
+    Encodes pydantic models as their JSON, or when it is longer than
+    `compress_threshold` as zlib-compressed JSON in Base85. A one letter
+    prefix tells the two apart. Payloads stay text because the shared
+    Redis pool decodes responses.
+    """
+
+    RAW, COMPRESSED = "j", "z"
+
+    def __init__(
+        self,
+        model: type[M],
+        compress_threshold: int = ReviewCacheConfig.COMPRESS_THRESHOLD,
+    ):
+        self.model = model
+        self.compress_threshold = compress_threshold
+
+    def encode(self, value: M) -> str:
+        data = value.model_dump_json()
+        if len(data) <= self.compress_threshold:
+            return self.RAW + data
+        compressed = zlib.compress(data.encode())
+        return self.COMPRESSED + base64.b85encode(compressed).decode()
+
+    def decode(self, payload: str) -> M:
+        """Raises ValueError (or zlib.error) for foreign payloads."""
+        kind, data = payload[:1], payload[1:]
+        if kind == self.COMPRESSED:
+            data = zlib.decompress(base64.b85decode(data))
+        elif kind != self.RAW:
+            raise ValueError(f"Unknown payload encoding {kind!r}")
+        return self.model.model_validate_json(data)
+
+
+class CachedReview(BaseModel):
+    result: ReviewResponse
+    stored_at: float
+    ttl: int
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.stored_at + self.ttl
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    # GitHub owner and repository names are case-insensitive.
+    return repo_url.strip().rstrip("/").removesuffix(".git").lower()
+
+
+def normalize_text(text: str) -> str:
+    """Ignores whitespace and casing, which do not change a review."""
+    return " ".join(text.split()).casefold()
+
+
+class ReviewResultCache:
+    """
+    Caches review results per repository commit, normalized assignment and
+    candidate level, in a namespace of the cache version and the model.
+    Results are fresh for a TTL that depends on the level. Expired results
+    are still served for `stale_ttl` while they are recomputed in the
+    background. Misses are computed once across workers.
+
+    Entries are kept in memory in front of Redis, as decoded models. When a
+    worker replaces an entry it tells the others over pubsub to drop their
+    copy, which needs `start` to have been called.
+    """
+
+    KEY_PREFIX = "review:result"
+    INVALIDATION_CHANNEL = "review:result:invalidate"
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        version: str = ReviewCacheConfig.VERSION,
+        ttl: int = ReviewCacheConfig.TTL,
+        level_ttls: dict[str, int] | None = None,
+        stale_ttl: int = ReviewCacheConfig.STALE_TTL,
+        max_memory_bytes: int = ReviewCacheConfig.MEMORY_MAX_BYTES,
+    ):
+        self.client = client
+        self.namespace = f"{self.KEY_PREFIX}:v{version}:{OpenAIConfig.MODEL}"
+        self.ttl = ttl
+        self.level_ttls = (
+            ReviewCacheConfig.LEVEL_TTLS if level_ttls is None else level_ttls
+        )
+        self.stale_ttl = stale_ttl
+        self.memory = LRUByteCache(max_memory_bytes)
+        self.codec = ModelCodec(CachedReview)
+        self.logger = get_logger(self.__class__.__name__)
+        # Tells this worker's invalidations apart from the others'.
+        self.instance_id = uuid.uuid4().hex
+        self._refreshes: set[asyncio.Task] = set()
+        self._listener: asyncio.Task | None = None
+
+    def key(
+        self,
+        repo_url: str,
+        sha: str,
+        description: str,
+        candidate_level: str
+    ) -> str:
+        digest = hashlib.sha256(
+            f"{normalize_text(description)}\n{candidate_level}".encode()
+        ).hexdigest()
+        repo = normalize_repo_url(repo_url)
+        return f"{self.namespace}:{repo}:{sha}:{digest}"
+
+    def ttl_for(self, candidate_level: str) -> int:
+        return self.level_ttls.get(candidate_level, self.ttl)
+
+    async def start(self) -> None:
+        """Subscribes to invalidations from other workers."""
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def get_or_compute(
+        self,
+        key: str,
+        candidate_level: str,
+        compute: t.Callable[[], t.Awaitable[ReviewResponse]],
+    ) -> ReviewResponse:
+        entry = self._get_memory(key)
+        if entry is None:
+            try:
+                payload = await self.client.get(key)
+            except redis.RedisError as e:
+                self.logger.warning(f"Review cache lookup failed: {e}")
+                return await compute()
+            if payload is not None:
+                entry = self._decode(payload)
+            if entry is not None:
+                self.memory.set(key, entry, size=len(payload))
+
+        if entry is None:
+            CACHE_REQUESTS.inc(cache="review", result="miss")
+            entry = await self._compute(key, candidate_level, compute)
+        elif entry.is_fresh():
+            CACHE_REQUESTS.inc(cache="review", result="hit")
+        else:
+            CACHE_REQUESTS.inc(cache="review", result="stale")
+            self._refresh(key, candidate_level, compute, entry)
+        return entry.result
+
+    def _get_memory(self, key: str) -> CachedReview | None:
+        entry = self.memory.get(key)
+        if entry is not None and (
+            time.time() >= entry.stored_at + entry.ttl + self.stale_ttl
+        ):
+            # Gone from Redis as well.
+            self.memory.delete(key)
+            return None
+        return entry
+
+    def _decode(self, payload: str) -> CachedReview | None:
+        try:
+            return self.codec.decode(payload)
+        except (ValueError, zlib.error) as e:
+            # E.g. written by an older version, recompute it.
+            self.logger.warning(f"Unreadable review cache entry: {e}")
+            return None
+
+    async def _compute(
+        self,
+        key: str,
+        candidate_level: str,
+        compute: t.Callable[[], t.Awaitable[ReviewResponse]],
+        stale: CachedReview | None = None,
+    ) -> CachedReview:
+        """Computes the entry, or one replacing the `stale` entry."""
+        ttl = self.ttl_for(candidate_level)
+
+        async def entry() -> CachedReview:
+            return CachedReview(
+                result=await compute(), stored_at=time.time(), ttl=ttl
             )
-            return result
 
-        return wrapper
+        def current(payload: str) -> bool:
+            stored = self._decode(payload)
+            return stored is not None and (
+                stale is None or stored.stored_at > stale.stored_at
+            )
+
+        # Payloads this caller stored in Redis or received from the leader.
+        # Followers in this process get neither, their leader keeps the
+        # entry in memory.
+        written: list[str] = []
+        received: list[str] = []
+
+        def dumps(value: CachedReview) -> str:
+            written.append(self.codec.encode(value))
+            return written[-1]
+
+        def loads(payload: str) -> CachedReview:
+            received.append(payload)
+            return self.codec.decode(payload)
+
+        result = await single_flight.do(
+            self.client, key, entry, ttl + self.stale_ttl,
+            dumps=dumps, loads=loads, current=current,
+        )
+        if payloads := written or received:
+            self.memory.set(key, result, size=len(payloads[-1]))
+        if written and stale is not None:
+            # Other workers may still hold the entry that was replaced.
+            try:
+                await self.client.publish(
+                    self.INVALIDATION_CHANNEL, f"{self.instance_id} {key}"
+                )
+            except redis.RedisError as e:
+                self.logger.warning(
+                    f"Review cache invalidation failed: {e}"
+                )
+        return result
+
+    def _refresh(
+        self,
+        key: str,
+        candidate_level: str,
+        compute: t.Callable[[], t.Awaitable[ReviewResponse]],
+        stale: CachedReview,
+    ) -> None:
+        async def refresh() -> None:
+            try:
+                await self._compute(key, candidate_level, compute, stale)
+            except Exception as e:
+                self.logger.warning(f"Review cache refresh failed: {e}")
+
+        # Not bound to the deadline or the trace of the request that
+        # happened to find the stale entry.
+        task = asyncio.create_task(refresh(), context=contextvars.Context())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
 
-    return decorator
+    async def _listen(self, pubsub: redis.client.PubSub) -> None:
+        try:
+            async with pubsub:
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    sender, _, key = message["data"].partition(" ")
+                    if sender != self.instance_id:
+                        self.memory.delete(key)
+        except redis.RedisError as e:
+            self.logger.warning(f"Review cache invalidations stopped: {e}")
@@ -0,0 +1,225 @@
+"""
+Record/replay of upstream HTTP traffic below the interceptor chain.
+
+A cassette is a gzip-compressed JSON lines file with one entry per
+exchange: the request (method, URL, body hash and conditional headers),
+the response status, headers and body chunks, each with its offset from
+the start of the request. Other request headers are not stored, so
+tokens never end up in it.
+"""
+import asyncio
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import time
+import typing as t
+
+import httpx
+
+from app.enums import CassetteMode
+from app.exceptions import CassetteMissError
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# Request headers that change the response, e.g. a 304 for a revalidation
+# by the HTTP cache instead of a 200 for the same URL.
+KEY_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+
+def request_key(request: httpx.Request, body: bytes) -> str:
+    """
+    Matches a request to its recording. The host is left out, so traffic
+    recorded against one host (e.g. a stub on a random port) replays
+    against another.
+    """
+    return " ".join([
+        request.method,
+        request.url.raw_path.decode(),
+        hashlib.sha256(body).hexdigest()[:16],
+        *(
+            f"{name}={request.headers[name]}"
+            for name in KEY_HEADERS if name in request.headers
+        ),
+    ])
+
+
+class Cassette:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: dict[str, collections.deque[dict]] = (
+            collections.defaultdict(collections.deque)
+        )
+        self._write_lock = asyncio.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        cassette = cls(path)
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                entry = json.loads(line)
+                cassette.entries[entry["key"]].append(entry)
+        return cassette
+
+    def __len__(self) -> int:
+        return sum(map(len, self.entries.values()))
+
+    async def append(self, entry: dict) -> None:
+        self.entries[entry["key"]].append(entry)
+        # Compression and disk IO stay off the event loop, the lock keeps
+        # concurrent exchanges from interleaving in the file.
+        async with self._write_lock:
+            await asyncio.to_thread(self._write, entry)
+
+    def _write(self, entry: dict) -> None:
+        # One gzip member per entry, a crash loses at most the last one.
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def next(self, key: str) -> dict | None:
+        """
+        Recordings of the same request are served in recorded order, the
+        last one again once they run out.
+        """
+        entries = self.entries.get(key)
+        if not entries:
+            return None
+        if len(entries) > 1:
+            return entries.popleft()
+        return entries[0]
+
+
+class _RecordingStream(httpx.AsyncByteStream):
+    """Passes the body through and records when every chunk arrived."""
+
+    def __init__(
+        self,
+        stream: httpx.AsyncByteStream,
+        started: float,
+        on_close: t.Callable[[list[list]], t.Awaitable[None]],
+    ):
+        self.stream = stream
+        self.started = started
+        self.on_close = on_close
+        self.chunks: list[list] = []
+
+    async def __aiter__(self) -> t.AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            self.chunks.append([
+                round(time.perf_counter() - self.started, 6),
+                base64.b64encode(chunk).decode(),
+            ])
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.stream.aclose()
+        await self.on_close(self.chunks)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Sends requests through `transport` and records the exchanges."""
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        transport: httpx.AsyncBaseTransport,
+    ):
+        self.cassette = cassette
+        self.transport = transport
+
+    async def handle_async_request(
+        self,
+        request: httpx.Request,
+    ) -> httpx.Response:
+        body = await request.aread()
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        headers_at = time.perf_counter() - started
+
+        async def record(chunks: list[list]) -> None:
+            await self.cassette.append({
+                "key": request_key(request, body),
+                "url": str(request.url.copy_with(query=None)),
+                "status": response.status_code,
+                "headers": response.headers.multi_items(),
+                "headers_at": round(headers_at, 6),
+                "chunks": chunks,
+            })
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, record),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+
+    def __init__(self, chunks: list[list], headers_at: float, scale: float):
+        self.chunks = chunks
+        self.headers_at = headers_at
+        self.scale = scale
+
+    async def __aiter__(self) -> t.AsyncIterator[bytes]:
+        previous = self.headers_at
+        for offset, data in self.chunks:
+            if self.scale:
+                await asyncio.sleep((offset - previous) * self.scale)
+            previous = offset
+            yield base64.b64decode(data)
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves recorded responses without touching the network, waiting the
+    recorded time to the headers and between body chunks multiplied by
+    `latency_scale` (0 replays instantly).
+    """
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 1.0):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+
+    async def handle_async_request(
+        self,
+        request: httpx.Request,
+    ) -> httpx.Response:
+        key = request_key(request, await request.aread())
+        entry = self.cassette.next(key)
+        if entry is None:
+            raise CassetteMissError(f"No recording of {key}")
+
+        if self.latency_scale:
+            await asyncio.sleep(entry["headers_at"] * self.latency_scale)
+        return httpx.Response(
+            status_code=entry["status"],
+            headers=entry["headers"],
+            stream=_ReplayStream(
+                entry["chunks"], entry["headers_at"], self.latency_scale
+            ),
+        )
+
+
+def cassette_transport(
+    mode: CassetteMode,
+    path: str,
+    transport: httpx.AsyncBaseTransport,
+    latency_scale: float = 1.0,
+) -> httpx.AsyncBaseTransport:
+    """Puts `transport` behind a recorder or a replayer of `path`."""
+    if mode is CassetteMode.RECORD:
+        logger.info(f"Recording upstream traffic to {path}")
+        return RecordingTransport(Cassette(path), transport)
+    if mode is CassetteMode.REPLAY:
+        cassette = Cassette.load(path)
+        logger.info(f"Replaying {len(cassette)} exchanges from {path}")
+        return ReplayTransport(cassette, latency_scale)
+    return transport
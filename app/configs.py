@@ -1,16 +1,229 @@
+import os
+
 from dataclasses import dataclass
 
 
 @dataclass(frozen=True)
 class OpenAIConfig:
-    API_URL = "https://api.openai.com/v1/chat/completions"
+    API_URL = os.getenv(
+        "OPENAI_API_URL", "https://api.openai.com/v1/chat/completions"
+    )
     MODEL = "gpt-4-turbo"
     MAX_RETRIES = 3
     BACKOFF_FACTOR = 2
+    # Leaves room for the response within the 128k context window.
+    MAX_PROMPT_TOKENS = int(os.getenv("OPENAI_MAX_PROMPT_TOKENS", 100_000))
+    # Chunks of one review that are completed at the same time.
+    CHUNK_CONCURRENCY = int(os.getenv("OPENAI_CHUNK_CONCURRENCY", 4))
+    # In-flight completions of the whole process.
+    MAX_CONCURRENT_REQUESTS = int(
+        os.getenv("OPENAI_MAX_CONCURRENT_REQUESTS", 16)
+    )
+    # Comma-separated pool of keys, "key" or "key:organization". Requests
+    # are balanced between them.
+    API_KEYS = [
+        key for key in os.getenv(
+            "OPENAI_API_KEYS", os.getenv("OPENAI_API_KEY", "")
+        ).split(",") if key
+    ]
+    # Per-key quotas assumed until the x-ratelimit-* headers tell.
+    RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 500))
+    TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 30_000))
+    # Counted against the token quota on top of the prompt estimate.
+    COMPLETION_TOKENS = int(os.getenv("OPENAI_COMPLETION_TOKENS", 1000))
 
 
 @dataclass(frozen=True)
 class GitHubConfig:
-    API_URL = "https://api.github.com"
+    API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
     MAX_RETRIES = 3
     BACKOFF_FACTOR = 2
+    # In-flight requests of the whole process.
+    MAX_CONCURRENT_REQUESTS = int(
+        os.getenv("GITHUB_MAX_CONCURRENT_REQUESTS", 32)
+    )
+    # One of app.enums.GitHubFetchMode: contents, trees or tarball.
+    FETCH_MODE = os.getenv("GITHUB_FETCH_MODE", "contents")
+    # Comma-separated pool of tokens, requests rotate between them.
+    API_KEYS = [
+        key for key in os.getenv(
+            "GITHUB_API_KEYS", os.getenv("GITHUB_API_KEY", "")
+        ).split(",") if key
+    ]
+    # Requests left untouched per token, e.g. for manual debugging.
+    RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", 50))
+    # Below this share of the quota requests are paced until the reset.
+    RATE_LIMIT_SLOWDOWN_RATIO = float(
+        os.getenv("GITHUB_RATE_LIMIT_SLOWDOWN_RATIO", 0.1)
+    )
+    # The compare API lists at most 300 changed files.
+    COMPARE_MAX_FILES = 300
+
+
+@dataclass(frozen=True)
+class HttpClientConfig:
+    TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 60.0))
+    MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    MAX_KEEPALIVE_CONNECTIONS = int(
+        os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+    )
+    KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+    HTTP2 = os.getenv("HTTP2", "true").lower() == "true"
+    # One of app.enums.CassetteMode: off, record (saves upstream traffic
+    # to the cassette) or replay (serves it from there, offline).
+    CASSETTE_MODE = os.getenv("HTTP_CASSETTE_MODE", "off")
+    # Recordings are appended to an existing cassette.
+    CASSETTE_PATH = os.getenv("HTTP_CASSETTE_PATH", "cassette.jsonl.gz")
+    # Replayed latency is the recorded one times this, 0 replays instantly.
+    CASSETTE_LATENCY_SCALE = float(
+        os.getenv("HTTP_CASSETTE_LATENCY_SCALE", 1.0)
+    )
+
+
+@dataclass(frozen=True)
+class WarmupConfig:
+    ENABLED = os.getenv("WARMUP", "true").lower() == "true"
+    # Pre-connected on startup, the GitHub and OpenAI API origins by
+    # default. Comma-separated.
+    URLS = [url for url in os.getenv("WARMUP_URLS", "").split(",") if url]
+    # Connections opened to every URL.
+    CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 2))
+    TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 5.0))
+
+
+@dataclass(frozen=True)
+class RedisConfig:
+    URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+    MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+
+
+@dataclass(frozen=True)
+class BlobCacheConfig:
+    MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    TTL = int(os.getenv("BLOB_CACHE_TTL", 7 * 24 * 60 * 60))
+
+
+@dataclass(frozen=True)
+class FileFilterConfig:
+    MAX_FILE_SIZE = int(os.getenv("REVIEW_MAX_FILE_SIZE", 256 * 1024))
+    MAX_FILES = int(os.getenv("REVIEW_MAX_FILES", 300))
+    # Hard cap on the content of all files of one review.
+    MAX_TOTAL_SIZE = int(
+        os.getenv("REVIEW_MAX_TOTAL_SIZE", 16 * 1024 * 1024)
+    )
+    # Contents beyond this many bytes per review are spilled to disk.
+    MAX_MEMORY_BYTES = int(
+        os.getenv("REVIEW_MAX_MEMORY_BYTES", 2 * 1024 * 1024)
+    )
+
+
+@dataclass(frozen=True)
+class JobQueueConfig:
+    CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 4))
+    MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", 3))
+    RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 24 * 60 * 60))
+    # A running job whose worker stops renewing its lease for this many
+    # seconds is considered lost and retried.
+    LEASE_TIMEOUT = float(os.getenv("JOB_LEASE_TIMEOUT", 60))
+    # Delay before the first retry of a failed job, doubled on each retry.
+    RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", 30))
+    # How often a worker looks for expired leases.
+    REAP_INTERVAL = float(os.getenv("JOB_REAP_INTERVAL", 5))
+    # Comma-separated hosts job results may be posted to. Without it any
+    # public host is accepted, loopback and private addresses never are.
+    CALLBACK_HOSTS = [
+        host for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",")
+        if host
+    ]
+
+
+@dataclass(frozen=True)
+class HttpCacheConfig:
+    MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    MAX_ENTRY_BYTES = int(os.getenv("HTTP_CACHE_MAX_ENTRY_BYTES", 1024 * 1024))
+    TTL = int(os.getenv("HTTP_CACHE_TTL", 24 * 60 * 60))
+
+
+@dataclass(frozen=True)
+class ReviewStateConfig:
+    # How long the last reviewed commit of a repository is remembered.
+    TTL = int(os.getenv("REVIEW_STATE_TTL", 30 * 24 * 60 * 60))
+
+
+@dataclass(frozen=True)
+class ReviewCacheConfig:
+    # Bump when prompts change, results of other versions are never read.
+    VERSION = os.getenv("REVIEW_CACHE_VERSION", "1")
+    # How long a result is fresh. Keys include the reviewed commit, so a
+    # push never serves an outdated review.
+    TTL = int(os.getenv("REVIEW_CACHE_TTL", 24 * 60 * 60))
+    # Per candidate level overrides, e.g. "Junior=3600,Senior=86400".
+    LEVEL_TTLS = {
+        level.strip(): int(ttl)
+        for level, _, ttl in (
+            item.partition("=")
+            for item in os.getenv("REVIEW_CACHE_LEVEL_TTLS", "").split(",")
+            if item
+        )
+    }
+    # How long an expired result is still served while it is recomputed.
+    STALE_TTL = int(os.getenv("REVIEW_CACHE_STALE_TTL", 60 * 60))
+    # Size of the in-process tier in front of Redis, per worker.
+    MEMORY_MAX_BYTES = int(
+        os.getenv("REVIEW_CACHE_MEMORY_MAX_BYTES", 16 * 1024 * 1024)
+    )
+    # Entries larger than this are stored compressed.
+    COMPRESS_THRESHOLD = int(
+        os.getenv("REVIEW_CACHE_COMPRESS_THRESHOLD", 1024)
+    )
+
+
+@dataclass(frozen=True)
+class ResilienceConfig:
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.5))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 30.0))
+    # Upper bound for a whole review, retries included.
+    REVIEW_DEADLINE = float(os.getenv("REVIEW_DEADLINE", 300.0))
+    # Consecutive failures after which requests to a host fail fast.
+    CIRCUIT_FAILURE_THRESHOLD = int(
+        os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)
+    )
+    # Seconds an open circuit waits before letting a trial request through.
+    CIRCUIT_RECOVERY_TIMEOUT = float(
+        os.getenv("CIRCUIT_RECOVERY_TIMEOUT", 30.0)
+    )
+    # In-flight requests per host adapt between these bounds (AIMD).
+    ADAPTIVE_CONCURRENCY = (
+        os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+    )
+    CONCURRENCY_INITIAL_LIMIT = int(
+        os.getenv("CONCURRENCY_INITIAL_LIMIT", 8)
+    )
+    CONCURRENCY_MIN_LIMIT = int(os.getenv("CONCURRENCY_MIN_LIMIT", 1))
+    CONCURRENCY_MAX_LIMIT = int(os.getenv("CONCURRENCY_MAX_LIMIT", 128))
+    # The limit is multiplied by this on throttling, errors or slowdowns.
+    CONCURRENCY_BACKOFF_RATIO = float(
+        os.getenv("CONCURRENCY_BACKOFF_RATIO", 0.5)
+    )
+    # A response this many times slower than usual counts as a slowdown.
+    CONCURRENCY_LATENCY_TOLERANCE = float(
+        os.getenv("CONCURRENCY_LATENCY_TOLERANCE", 3.0)
+    )
+
+
+@dataclass(frozen=True)
+class TracingConfig:
+    # One of "none", "console" (JSON lines on stdout) or "file".
+    EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+    FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+
+
+@dataclass(frozen=True)
+class BatchConfig:
+    MAX_REVIEWS = int(os.getenv("BATCH_MAX_REVIEWS", 100))
+    # Repositories of one batch that are reviewed at the same time.
+    MAX_CONCURRENT_REVIEWS = int(os.getenv("BATCH_MAX_CONCURRENT_REVIEWS", 8))
+    # Completions are collected this long into one Batch API job.
+    API_MAX_WAIT = float(os.getenv("BATCH_API_MAX_WAIT", 0.5))
+    # Requests per Batch API job, the OpenAI limit per input file.
+    API_MAX_SIZE = int(os.getenv("BATCH_API_MAX_SIZE", 50_000))
@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import httpx
+import redis.asyncio as redis
+
+from app.cache import BlobCache, HttpResponseCache, ReviewResultCache
+from app.configs import (
+    GitHubConfig,
+    OpenAIConfig,
+    RedisConfig,
+    WarmupConfig,
+)
+from app.http_client import create_http_client
+from app.logger import get_logger
+from app.rate_limit import GitHubRateLimitBudget, OpenAIKeyScheduler
+from app.review_state import ReviewStateStore
+from app.services import GitHubService, OpenAIService
+
+logger = get_logger(__name__)
+
+
+def default_warmup_urls() -> list[str]:
+    """Origins of the GitHub and OpenAI APIs, local stubs included."""
+    return [
+        str(httpx.URL(url).copy_with(path="/", query=None))
+        for url in (GitHubConfig.API_URL, OpenAIConfig.API_URL)
+    ]
+
+
+class ServiceContainer:
+    """
+    Clients, caches and services shared by every request of a process.
+    Built once in the lifespan, requests only assemble use cases from it.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        http_client: httpx.AsyncClient
+    ):
+        self.redis = redis_client
+        self.http_client = http_client
+
+        self.blob_cache = BlobCache(redis_client)
+        self.http_cache = HttpResponseCache(redis_client)
+        self.review_cache = ReviewResultCache(redis_client)
+        self.review_state = ReviewStateStore(redis_client)
+        self.rate_limit_budget = (
+            GitHubRateLimitBudget(GitHubConfig.API_KEYS, redis_client)
+            if GitHubConfig.API_KEYS else None
+        )
+
+        self.openai_scheduler = (
+            OpenAIKeyScheduler(OpenAIConfig.API_KEYS)
+            if OpenAIConfig.API_KEYS else None
+        )
+
+        self.github = GitHubService(
+            api_key=next(iter(GitHubConfig.API_KEYS), None),
+            client=http_client,
+            blob_cache=self.blob_cache,
+            rate_limit_budget=self.rate_limit_budget,
+            http_cache=self.http_cache,
+        )
+        # Requests get their key from the scheduler, this one only fills
+        # the default headers.
+        openai_key = (
+            self.openai_scheduler.keys[0].key
+            if self.openai_scheduler else None
+        )
+        self.openai = OpenAIService(
+            api_key=openai_key,
+            client=http_client,
+            scheduler=self.openai_scheduler,
+        )
+        # Shared by all batch requests, their completions end up in the
+        # same Batch API jobs. Both services draw from one semaphore, so
+        # OPENAI_MAX_CONCURRENT_REQUESTS bounds the requests in flight of
+        # the whole process. Requests waiting for quota do not hold a slot.
+        self.openai_batch = OpenAIService(
+            api_key=openai_key,
+            client=http_client,
+            batch=True,
+            scheduler=self.openai_scheduler,
+            semaphore=self.openai.semaphore,
+        )
+
+    @classmethod
+    def from_config(cls) -> "ServiceContainer":
+        redis_client = redis.Redis.from_pool(
+            redis.BlockingConnectionPool.from_url(
+                url=RedisConfig.URL,
+                max_connections=RedisConfig.MAX_CONNECTIONS,
+                decode_responses=True,
+            )
+        )
+        return cls(redis_client, create_http_client())
+
+    async def start(self, warm_up: bool = WarmupConfig.ENABLED) -> None:
+        await self.review_cache.start()
+        if warm_up:
+            await self.warm_up()
+
+    async def warm_up(
+        self,
+        urls: list[str] | None = None,
+        connections: int = WarmupConfig.CONNECTIONS,
+        timeout: float = WarmupConfig.TIMEOUT,
+    ) -> None:
+        """
+        Resolves DNS and opens the Redis and (TLS) API connections before
+        the first request needs them. Failures are only logged, those
+        connections are then opened on demand.
+        """
+        urls = urls or WarmupConfig.URLS or default_warmup_urls()
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            asyncio.wait_for(self.redis.ping(), timeout),
+            *(
+                asyncio.wait_for(self.http_client.head(url), timeout)
+                for url in urls for _ in range(connections)
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up failed: {result!r}")
+        logger.info(
+            f"Warmed up connections to {', '.join(urls)} in"
+            f" {time.perf_counter() - started:.3f}s"
+        )
+
+    async def close(self) -> None:
+        await self.review_cache.stop()
+
+        await self.http_client.aclose()
+        logger.info("HTTP client pool closed")
+
+        await self.redis.aclose()
+        logger.info("Redis connection closed")
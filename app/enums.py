@@ -5,3 +5,28 @@ class CandidateLevel(enum.Enum):
     JUNIOR = 'Junior'
     MIDDLE = 'Middle'
     SENIOR = 'Senior'
+
+
+class GitHubFetchMode(enum.Enum):
+    CONTENTS = 'contents'
+    TREES = 'trees'
+    TARBALL = 'tarball'
+
+
+class JobStatus(enum.Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+
+class CircuitState(enum.Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CassetteMode(enum.Enum):
+    OFF = 'off'
+    RECORD = 'record'
+    REPLAY = 'replay'
@@ -17,3 +17,15 @@ class ValidationError(HTTPException):
 
     def __init__(self, detail: str):
         super().__init__(status_code=422, detail=detail)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+class CassetteMissError(Exception):
+    pass
@@ -0,0 +1,162 @@
+import fnmatch
+import typing as t
+
+from pathlib import PurePosixPath
+
+from app.configs import FileFilterConfig
+
+# Patterns without a slash match the file name at any depth, patterns ending
+# with a slash match a directory anywhere in the path, anything else matches
+# the full path from the repository root (as in .gitattributes).
+DEFAULT_EXCLUDED_PATTERNS = (
+    # Lockfiles
+    "*.lock", "package-lock.json", "pnpm-lock.yaml", "go.sum",
+    # Vendored and build output
+    "node_modules/", "vendor/", "third_party/", "dist/", "build/",
+    "__pycache__/", ".venv/", "venv/", ".git/", ".idea/", ".vscode/",
+    # Minified and generated
+    "*.min.js", "*.min.css", "*.map", "*_pb2.py", "*.pb.go",
+    # Binaries, archives, media and fonts
+    "*.pyc", "*.so", "*.dll", "*.exe", "*.bin", "*.class", "*.jar",
+    "*.zip", "*.tar", "*.gz", "*.tgz", "*.7z", "*.rar", "*.whl",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.bmp", "*.ico", "*.svg",
+    "*.webp", "*.pdf", "*.mp3", "*.mp4", "*.mov", "*.avi", "*.wav",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.sqlite", "*.db", "*.pkl", "*.npy", "*.ipynb",
+    # Repository metadata
+    ".gitignore", ".gitattributes", ".DS_Store",
+)
+
+GENERATED_ATTRIBUTES = ("linguist-generated", "linguist-vendored")
+
+ENTRY_POINTS = {
+    "main.py", "app.py", "__main__.py", "manage.py", "wsgi.py", "asgi.py",
+    "index.js", "index.ts", "app.js", "app.ts", "server.js", "server.ts",
+    "main.go", "main.rs", "lib.rs", "Main.java", "Program.cs",
+}
+
+SOURCE_SUFFIXES = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".kt",
+    ".rb", ".php", ".cs", ".c", ".h", ".cpp", ".hpp", ".swift", ".scala",
+    ".sql", ".sh",
+}
+
+BINARY_SNIFF_LENGTH = 8000
+
+
+class Entry(t.TypedDict):
+    path: str
+    size: int
+
+
+def matches(path: str, pattern: str) -> bool:
+    if pattern.endswith("/"):
+        return pattern.rstrip("/") in PurePosixPath(path).parent.parts
+    if "/" not in pattern:
+        return fnmatch.fnmatchcase(PurePosixPath(path).name, pattern)
+    return PurePosixPath(path).full_match(pattern.lstrip("/"))
+
+
+def parse_gitattributes(content: str) -> list[str]:
+    """Returns the patterns marked as generated or vendored."""
+    patterns = []
+    for line in content.splitlines():
+        parts = line.split()
+        if not parts or parts[0].startswith("#"):
+            continue
+        pattern, *attributes = parts
+        if any(
+            attribute in GENERATED_ATTRIBUTES
+            or attribute in (f"{name}=true" for name in GENERATED_ATTRIBUTES)
+            for attribute in attributes
+        ):
+            patterns.append(pattern)
+    return patterns
+
+
+def is_binary(content: str) -> bool:
+    return "\x00" in content[:BINARY_SNIFF_LENGTH]
+
+
+def importance(path: str) -> float:
+    """Heuristic score, higher means more relevant for a code review."""
+    file_path = PurePosixPath(path)
+    name = file_path.name.lower()
+    score = -0.5 * (len(file_path.parts) - 1)
+
+    if file_path.name in ENTRY_POINTS:
+        score += 3
+    if name.startswith("readme"):
+        score += 1
+    if file_path.suffix in SOURCE_SUFFIXES:
+        score += 2
+    if (
+        {"test", "tests", "__tests__", "spec"} & set(file_path.parent.parts)
+        or name.startswith("test_")
+        or file_path.stem.endswith(("_test", ".test", ".spec"))
+    ):
+        score -= 1
+    return score
+
+
+class FileFilter:
+    """
+    Decides which files of a repository are worth downloading and in which
+    order they are reviewed, using only listing metadata (path and size).
+    """
+
+    def __init__(
+        self,
+        excluded_patterns: t.Sequence[str] = DEFAULT_EXCLUDED_PATTERNS,
+        max_file_size: int = FileFilterConfig.MAX_FILE_SIZE,
+        max_files: int = FileFilterConfig.MAX_FILES,
+        max_total_size: int = FileFilterConfig.MAX_TOTAL_SIZE,
+    ):
+        self.excluded_patterns = excluded_patterns
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.max_total_size = max_total_size
+
+    def is_excluded(
+        self,
+        entry: Entry,
+        generated_patterns: t.Sequence[str] = ()
+    ) -> bool:
+        return entry["size"] > self.max_file_size or any(
+            matches(entry["path"], pattern)
+            for pattern in (*self.excluded_patterns, *generated_patterns)
+        )
+
+    def is_excluded_directory(self, path: str) -> bool:
+        """Whether a directory pattern excludes everything below the path."""
+        parts = PurePosixPath(path).parts
+        return any(
+            pattern.rstrip("/") in parts
+            for pattern in self.excluded_patterns if pattern.endswith("/")
+        )
+
+    def select(
+        self,
+        entries: t.Iterable[Entry],
+        gitattributes: str | None = None
+    ) -> list[Entry]:
+        generated_patterns = (
+            parse_gitattributes(gitattributes) if gitattributes else []
+        )
+        selected = [
+            entry for entry in entries
+            if not self.is_excluded(entry, generated_patterns)
+        ]
+        selected.sort(
+            key=lambda entry: (
+                -importance(entry["path"]), entry["path"].split("/")
+            )
+        )
+
+        # Most important first, skipping files that no longer fit.
+        capped, total_size = [], 0
+        for entry in selected[:self.max_files]:
+            if total_size + entry["size"] <= self.max_total_size:
+                capped.append(entry)
+                total_size += entry["size"]
+        return capped
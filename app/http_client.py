@@ -1,18 +1,82 @@
+import importlib.util
+
 import httpx
 
+from app.cassette import cassette_transport
+from app.configs import HttpClientConfig
+from app.enums import CassetteMode
 from app.interceptors import BaseInterceptor
 
 
+def create_http_client(
+    config: type[HttpClientConfig] = HttpClientConfig,
+    **kwargs,
+) -> httpx.AsyncClient:
+    """
+    Builds the long-lived client shared by every service. HTTP/2 is only
+    enabled when the optional `h2` package is installed. With a cassette
+    mode set, the traffic is recorded or replayed under the client.
+    """
+    limits = httpx.Limits(
+        max_connections=config.MAX_CONNECTIONS,
+        max_keepalive_connections=config.MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.KEEPALIVE_EXPIRY,
+    )
+    http2 = config.HTTP2 and importlib.util.find_spec("h2") is not None
+    mode = CassetteMode(config.CASSETTE_MODE)
+    if mode is not CassetteMode.OFF and "transport" not in kwargs:
+        kwargs["transport"] = cassette_transport(
+            mode,
+            config.CASSETTE_PATH,
+            httpx.AsyncHTTPTransport(http2=http2, limits=limits),
+            config.CASSETTE_LATENCY_SCALE,
+        )
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(config.TIMEOUT),
+        limits=limits,
+        http2=http2,
+        **kwargs,
+    )
+
 
 class HttpClientWithInterceptors:
 
-    def __init__(self, interceptors: list[BaseInterceptor]):
+    def __init__(
+        self,
+        interceptors: list[BaseInterceptor],
+        client: httpx.AsyncClient | None = None,
+    ):
         self.interceptors = interceptors
+        self.client = client
 
-    async def send(self, request: httpx.Request) -> httpx.Response:
+    async def send(
+        self,
+        request: httpx.Request,
+        stream: bool = False
+    ) -> httpx.Response:
+        """
+        With `stream=True` the body is not read, the caller iterates it and
+        must close the response.
+        """
         async def call_next(index: int, req: httpx.Request):
+            if index == len(self.interceptors):
+                return await self._transport_send(req, stream)
+
             return await self.interceptors[index].intercept(
                 req, lambda: call_next(index + 1, req)
             )
 
         return await call_next(0, request)
+
+    async def _transport_send(
+        self,
+        request: httpx.Request,
+        stream: bool
+    ) -> httpx.Response:
+        if self.client is not None:
+            return await self.client.send(request, stream=stream)
+
+        # No shared client was provided, fall back to a one-off connection.
+        # The body has to be read before that connection is closed.
+        async with create_http_client() as client:
+            return await client.send(request)
@@ -1,9 +1,25 @@
 from .abc import BaseInterceptor
 from .logging import LoggingInterceptor
 from .retry import RetryInterceptor
+from .rate_limit_budget import RateLimitBudgetInterceptor
+from .openai_key_scheduler import OpenAIKeySchedulerInterceptor
+from .http_cache import HttpCacheInterceptor
+from .circuit_breaker import CircuitBreakerInterceptor
+from .adaptive_concurrency import AdaptiveConcurrencyInterceptor
+from .concurrency_limit import ConcurrencyLimitInterceptor
+from .metrics import MetricsInterceptor
+from .tracing import TracingInterceptor
 
 __all__ = [
     "BaseInterceptor",
     "LoggingInterceptor",
     "RetryInterceptor",
+    "RateLimitBudgetInterceptor",
+    "OpenAIKeySchedulerInterceptor",
+    "HttpCacheInterceptor",
+    "CircuitBreakerInterceptor",
+    "AdaptiveConcurrencyInterceptor",
+    "ConcurrencyLimitInterceptor",
+    "MetricsInterceptor",
+    "TracingInterceptor",
 ]
\ No newline at end of file
@@ -0,0 +1,43 @@
+import httpx
+import typing as t
+
+from app.interceptors.abc import BaseInterceptor
+from app.rate_limit import is_rate_limited
+from app.resilience import ConcurrencyLimiterRegistry, concurrency_limiters
+
+
+class AdaptiveConcurrencyInterceptor(BaseInterceptor):
+    """
+    Holds every attempt to a host until its adaptive limiter has a free
+    slot. Throttling (429, GitHub's rate-limit 403), 5xx and transport
+    errors back the limit off. Placed after CircuitBreakerInterceptor, so
+    requests failed fast by an open circuit never take a slot. Streamed
+    responses give their slot back once the headers arrived.
+    """
+
+    def __init__(
+        self,
+        limiters: ConcurrencyLimiterRegistry = concurrency_limiters
+    ):
+        self.limiters = limiters
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        # The port tells apart upstreams on one host, e.g. local stubs.
+        limiter = self.limiters.get(request.url.netloc.decode())
+        started = await limiter.acquire()
+        overloaded = False
+        try:
+            response = await call_next()
+            overloaded = (
+                response.status_code >= 500 or is_rate_limited(response)
+            )
+            return response
+        except httpx.TransportError:
+            overloaded = True
+            raise
+        finally:
+            limiter.release(started, overloaded)
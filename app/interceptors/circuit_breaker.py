@@ -0,0 +1,48 @@
+import httpx
+import typing as t
+
+from app.exceptions import CircuitOpenError
+from app.interceptors.abc import BaseInterceptor
+from app.logger import get_logger
+from app.resilience import CircuitBreakerRegistry, circuit_breakers
+
+
+class CircuitBreakerInterceptor(BaseInterceptor):
+    """
+    Counts transport errors and 5xx responses per host and raises
+    CircuitOpenError instead of sending while the host's circuit is open.
+    Placed after RetryInterceptor, every attempt is counted.
+    """
+
+    def __init__(self, breakers: CircuitBreakerRegistry = circuit_breakers):
+        self.breakers = breakers
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        host = request.url.host
+        breaker = self.breakers.get(host)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {host} is open")
+
+        try:
+            response = await call_next()
+        except httpx.TransportError:
+            self._record_failure(host)
+            raise
+
+        if response.status_code >= 500:
+            self._record_failure(host)
+        else:
+            breaker.record_success()
+        return response
+
+    def _record_failure(self, host: str) -> None:
+        breaker = self.breakers.get(host)
+        was_open = breaker.opened_at is not None
+        breaker.record_failure()
+        if breaker.opened_at is not None and not was_open:
+            self.logger.warning(f"Circuit for {host} opened")
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+import typing as t
+
+from app.interceptors.abc import BaseInterceptor
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Gives the slot of a streamed response back once it is closed."""
+
+    def __init__(
+        self,
+        stream: httpx.AsyncByteStream,
+        release: t.Callable[[], None]
+    ):
+        self.stream = stream
+        self.release = release
+        self.released = False
+
+    async def __aiter__(self) -> t.AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.released:
+                self.released = True
+                self.release()
+
+
+class ConcurrencyLimitInterceptor(BaseInterceptor):
+    """
+    Holds every attempt until `semaphore` has a free slot. Placed after the
+    rate-limit budget or key scheduler, so requests that are paced or
+    waiting for quota do not take a slot meanwhile. Streamed responses
+    keep their slot until they are closed.
+    """
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self.semaphore = semaphore
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        await self.semaphore.acquire()
+        try:
+            response = await call_next()
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+        if response.is_closed:
+            self.semaphore.release()
+        else:
+            response.stream = _ReleasingStream(
+                response.stream, self.semaphore.release
+            )
+        return response
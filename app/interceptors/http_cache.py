@@ -0,0 +1,97 @@
+import base64
+import hashlib
+import json
+
+import httpx
+import typing as t
+
+from app.cache import HttpResponseCache
+from app.interceptors.abc import BaseInterceptor
+
+# Request headers that select a different representation of the resource.
+VARY_HEADERS = ("Authorization", "Accept")
+# Response headers replayed when a cached body is served.
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# File contents, those are kept by the blob cache under their SHA.
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+
+
+class HttpCacheInterceptor(BaseInterceptor):
+    """
+    Revalidates cached GET responses with If-None-Match / If-Modified-Since
+    and serves the cached body when upstream answers 304 Not Modified.
+    GitHub does not count 304s against the rate limit. Only API metadata
+    (listings, trees, commits) is cached: raw and codeload downloads and
+    blob contents are left to the blob cache.
+    """
+
+    def __init__(self, cache: HttpResponseCache, api_host: str):
+        self.cache = cache
+        self.api_host = api_host
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        if (
+            request.method != "GET"
+            or request.url.host != self.api_host
+            or request.headers.get("Accept") == RAW_MEDIA_TYPE
+        ):
+            return await call_next()
+
+        key = self._key(request)
+        cached = await self.cache.get(key)
+        entry = json.loads(cached) if cached else None
+        if entry:
+            if "ETag" in entry["headers"]:
+                request.headers["If-None-Match"] = entry["headers"]["ETag"]
+            if "Last-Modified" in entry["headers"]:
+                request.headers["If-Modified-Since"] = (
+                    entry["headers"]["Last-Modified"]
+                )
+
+        response = await call_next()
+
+        if response.status_code == 304 and entry:
+            await response.aclose()
+            return httpx.Response(
+                entry["status"],
+                headers={**entry["headers"], "X-Cache": "HIT"},
+                content=base64.b64decode(entry["body"]),
+                request=request,
+            )
+
+        if response.status_code == 200:
+            await self._store(key, response)
+        return response
+
+    @staticmethod
+    def _key(request: httpx.Request) -> str:
+        parts = [str(request.url)] + [
+            request.headers.get(name, "") for name in VARY_HEADERS
+        ]
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    async def _store(self, key: str, response: httpx.Response) -> None:
+        headers = {
+            name: response.headers[name]
+            for name in STORED_HEADERS if name in response.headers
+        }
+        if "ETag" not in headers and "Last-Modified" not in headers:
+            return
+
+        try:
+            body = response.content
+        except httpx.ResponseNotRead:
+            # Streamed responses are consumed by the caller.
+            return
+        if len(body) > self.cache.max_entry_bytes:
+            return
+
+        await self.cache.set(key, json.dumps({
+            "status": response.status_code,
+            "headers": headers,
+            "body": base64.b64encode(body).decode(),
+        }))
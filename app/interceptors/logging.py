@@ -2,20 +2,25 @@ import httpx
 import typing as t
 
 from app.interceptors.abc import BaseInterceptor
+from app.logger import get_logger
 
 
 class LoggingInterceptor(BaseInterceptor):
+
+    def __init__(self):
+        self.logger = get_logger(self.__class__.__name__)
+
     async def intercept(
         self,
         request: httpx.Request,
         call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
     ) -> httpx.Response:
-        from app.logger import get_logger
-
-        logger = get_logger("LoggingInterceptor")
-        logger.info(f"Sending {request.method} request to {request.url}")
+        self.logger.info(f"Sending {request.method} request to {request.url}")
 
         response = await call_next()
 
-        logger.info(f"Received response with status code {response.status_code} from {request.url}")
+        self.logger.info(
+            f"Received response with status code {response.status_code}"
+            f" from {request.url}"
+        )
         return response
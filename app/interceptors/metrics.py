@@ -0,0 +1,31 @@
+import httpx
+import time
+import typing as t
+
+from app.interceptors.abc import BaseInterceptor
+from app.metrics import UPSTREAM_LATENCY
+
+
+class MetricsInterceptor(BaseInterceptor):
+    """
+    Records the latency of every attempt per host and status. Placed last,
+    right before the transport, so retries are observed one by one.
+    """
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await call_next()
+            status = str(response.status_code)
+            return response
+        finally:
+            UPSTREAM_LATENCY.observe(
+                time.perf_counter() - start,
+                host=request.url.host,
+                status=status,
+            )
@@ -0,0 +1,42 @@
+import httpx
+import typing as t
+
+from app.interceptors.abc import BaseInterceptor
+from app.rate_limit import OpenAIKeyScheduler
+
+# Request extension with the service's estimate of the prompt tokens.
+TOKENS_EXTENSION = "prompt_tokens"
+
+
+class OpenAIKeySchedulerInterceptor(BaseInterceptor):
+    """
+    Sends every OpenAI request with a key admitted by the scheduler and
+    feeds the rate-limit headers of the response back into it. A request
+    that still hits a limit is retried once per other key in the pool.
+    """
+
+    def __init__(self, scheduler: OpenAIKeyScheduler):
+        self.scheduler = scheduler
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        # Without an estimate, about four bytes of the body make a token.
+        tokens = request.extensions.get(TOKENS_EXTENSION)
+        if tokens is None:
+            tokens = len(request.content) // 4
+
+        for _ in range(len(self.scheduler.keys)):
+            key = await self.scheduler.acquire(tokens)
+            request.headers.pop("OpenAI-Organization", None)
+            request.headers.update(key.headers)
+
+            response = await call_next()
+            self.scheduler.update(key, response)
+            if response.status_code != 429:
+                return response
+            await response.aclose()
+
+        return response
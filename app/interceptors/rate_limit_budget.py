@@ -0,0 +1,38 @@
+import httpx
+import typing as t
+
+from app.interceptors.abc import BaseInterceptor
+from app.rate_limit import GitHubRateLimitBudget, is_rate_limited
+
+
+class RateLimitBudgetInterceptor(BaseInterceptor):
+    """
+    Picks a token from the shared budget for every GitHub API request and
+    feeds the rate-limit headers of the response back into it. A request
+    that still hits a limit is retried once per other token in the pool.
+    """
+
+    def __init__(self, budget: GitHubRateLimitBudget, api_host: str):
+        self.budget = budget
+        self.api_host = api_host
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        # Raw and codeload downloads do not count against the REST quota.
+        if request.url.host != self.api_host:
+            return await call_next()
+
+        for _ in range(len(self.budget.tokens)):
+            token = await self.budget.acquire()
+            request.headers["Authorization"] = f"token {token}"
+
+            response = await call_next()
+            await self.budget.update(token, response)
+            if not is_rate_limited(response):
+                return response
+            await response.aclose()
+
+        return response
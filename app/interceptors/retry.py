@@ -4,35 +4,58 @@ import typing as t
 
 from app.interceptors import BaseInterceptor
 from app.interceptors.retry_strategies import RetryStrategy
-
-
-TIMEOUT_IN_SEC = 60.0  # in seconds, some requests arr so slow
+from app.logger import get_logger
+from app.metrics import UPSTREAM_RETRIES
+from app.resilience import time_left
+from app.tracing import set_attribute
 
 
 class RetryInterceptor(BaseInterceptor):
-
-    timeout = httpx.Timeout(TIMEOUT_IN_SEC)
-
+    """
+    Resends a request as long as the strategy asks for it, unless waiting
+    would outlast the deadline of the current review.
+    """
 
     def __init__(self, strategy: RetryStrategy):
         self.strategy = strategy
+        self.logger = get_logger(self.__class__.__name__)
 
     async def intercept(
         self,
         request: httpx.Request,
-        call_next: t.Callable[[], httpx.Response],
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]],
     ) -> httpx.Response:
         attempt = 0
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            while True:
-                response = await client.send(request)
-
-                should_retry, time_remaining = await self.strategy.should_retry(
-                    response, attempt
+        while True:
+            try:
+                response = await call_next()
+            except httpx.TransportError as e:
+                should_retry, time_remaining = (
+                    await self.strategy.should_retry_error(e, attempt)
                 )
-                if not should_retry:
+                if not should_retry or not self._fits_deadline(time_remaining):
+                    raise
+                self.logger.warning(
+                    f"{e!r} for {request.url}, retrying in"
+                    f" {time_remaining:.2f}s"
+                )
+            else:
+                should_retry, time_remaining = (
+                    await self.strategy.should_retry(response, attempt)
+                )
+                if not should_retry or not self._fits_deadline(time_remaining):
                     return response
 
-                attempt += 1
-                await asyncio.sleep(time_remaining)
+                # Releases the connection of a streamed response.
+                await response.aclose()
+
+            attempt += 1
+            UPSTREAM_RETRIES.inc(host=request.url.host)
+            set_attribute("http.retries", attempt)
+            await asyncio.sleep(time_remaining)
+
+    @staticmethod
+    def _fits_deadline(delay: float) -> bool:
+        left = time_left()
+        return left is None or delay < left
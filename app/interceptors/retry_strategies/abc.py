@@ -21,3 +21,11 @@ class RetryStrategy(ABC):
         attempt: int
     ) -> float:
         pass
+
+    async def should_retry_error(
+        self,
+        error: httpx.TransportError,
+        attempt: int
+    ) -> t.Tuple[bool, float]:
+        """Transport errors (connect, timeouts...) are not retried by default."""
+        return False, 0
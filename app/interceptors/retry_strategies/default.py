@@ -1,17 +1,90 @@
+import email.utils
+import random
+import time
+
 import httpx
 import typing as t
 
+from app.configs import ResilienceConfig
 from app.interceptors.retry_strategies.abc import RetryStrategy
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 
 class DefaultRetryStrategy(RetryStrategy):
+    """
+    Retries server errors, 429 and transport errors with decorrelated
+    jitter backoff: every delay is drawn between `base_delay` and
+    `backoff_factor` times the previous one, capped at `max_delay`.
+    A Retry-After header takes precedence over the backoff.
+    """
 
-    def __init__(self, backoff_factor: float = 2.0, max_retries: int = 3):
+    def __init__(
+        self,
+        backoff_factor: float = 2.0,
+        max_retries: int = 3,
+        base_delay: float = ResilienceConfig.RETRY_BASE_DELAY,
+        max_delay: float = ResilienceConfig.RETRY_MAX_DELAY,
+    ):
         self.backoff_factor = backoff_factor
         self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def should_retry(
+        self,
+        response: httpx.Response,
+        attempt: int
+    ) -> t.Tuple[bool, float]:
+        if response.status_code not in RETRY_STATUSES or (
+            attempt >= self.max_retries
+        ):
+            return False, 0
+        return True, await self.get_backoff_time(response, attempt)
+
+    async def should_retry_error(
+        self,
+        error: httpx.TransportError,
+        attempt: int
+    ) -> t.Tuple[bool, float]:
+        if attempt >= self.max_retries:
+            return False, 0
+        return True, self._jitter(error.request, attempt)
+
+    async def get_backoff_time(
+        self,
+        response: httpx.Response,
+        attempt: int
+    ) -> float:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return retry_after
+        return self._jitter(response.request, attempt)
+
+    def _jitter(self, request: httpx.Request, attempt: int) -> float:
+        # The previous delay travels with the request, strategies are shared.
+        previous = (
+            request.extensions.get("retry_delay", self.base_delay)
+            if attempt else self.base_delay
+        )
+        delay = min(
+            self.max_delay,
+            random.uniform(self.base_delay, previous * self.backoff_factor),
+        )
+        request.extensions["retry_delay"] = delay
+        return delay
 
-    async def should_retry(self, response: httpx.Response, attempt: int) -> t.Tuple[bool, int]:
-        return bool(response.status_code >= 500 and attempt < self.max_retries), 0
 
-    async def get_backoff_time(self, response: httpx.Response, attempt: int) -> float:
-        return self.backoff_factor ** attempt
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After is either a number of seconds or an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at - time.time(), 0)
@@ -2,10 +2,15 @@ import httpx
 import time
 import typing as t
 
-from app.interceptors.retry_strategies import RetryStrategy
+from app.interceptors.retry_strategies.default import DefaultRetryStrategy
 
 
-class RateLimitRetryStrategy(RetryStrategy):
+class RateLimitRetryStrategy(DefaultRetryStrategy):
+    """
+    Waits for the reset of an exhausted GitHub quota, otherwise retries like
+    DefaultRetryStrategy. 429s are left to the caller, which can switch to
+    another token (see RateLimitBudgetInterceptor).
+    """
 
     async def should_retry(
         self,
@@ -23,12 +28,16 @@ class RateLimitRetryStrategy(RetryStrategy):
                 time_remaining = max(0, reset_time - time.time())
                 return True, time_remaining
 
-        return False, 0
+        if response.status_code == 429:
+            return False, 0
+        return await super().should_retry(response, attempt)
 
     async def get_backoff_time(
         self,
         response: httpx.Response,
         attempt: int
     ) -> float:
-        _, time_remaining = await self.should_retry(response, attempt)
-        return time_remaining
+        if response.status_code == 403:
+            _, time_remaining = await self.should_retry(response, attempt)
+            return time_remaining
+        return await super().get_backoff_time(response, attempt)
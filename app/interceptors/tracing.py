@@ -0,0 +1,49 @@
+import httpx
+import typing as t
+
+from app.interceptors.abc import BaseInterceptor
+from app.tracing import Tracer, tracer as default_tracer
+
+
+class TracingInterceptor(BaseInterceptor):
+    """
+    Wraps every request in a span, a child of whatever the service was
+    doing. Interceptors further down the chain annotate it, e.g. with the
+    number of retries.
+    """
+
+    def __init__(self, tracer: Tracer = default_tracer):
+        self.tracer = tracer
+
+    async def intercept(
+        self,
+        request: httpx.Request,
+        call_next: t.Callable[[], t.Coroutine[None, None, httpx.Response]]
+    ) -> httpx.Response:
+        with self.tracer.start_span(
+            f"HTTP {request.method} {request.url.host}",
+            **{
+                "http.method": request.method,
+                # Query strings may carry tokens, e.g. on archive links.
+                "http.url": str(request.url.copy_with(query=None)),
+                "http.host": request.url.host,
+            },
+        ) as span:
+            response = await call_next()
+
+            span.set_attribute("http.status_code", response.status_code)
+            if "X-Cache" in response.headers:
+                span.set_attribute("http.cache", response.headers["X-Cache"])
+            try:
+                size = len(response.content)
+                span.set_attribute("http.response_bytes", size)
+            except httpx.ResponseNotRead:
+                # Streamed, only the announced size is known.
+                if "Content-Length" in response.headers:
+                    span.set_attribute(
+                        "http.response_bytes",
+                        int(response.headers["Content-Length"]),
+                    )
+            if response.status_code >= 400:
+                span.status = "error"
+            return response
@@ -0,0 +1,215 @@
+import json
+import time
+import typing as t
+import uuid
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from app.cache import UniversalJSONEncoder
+from app.configs import JobQueueConfig
+from app.enums import JobStatus
+from app.models import ReviewJob, ReviewJobRequest
+
+# Higher priorities always sort before lower ones, FIFO within a priority.
+PRIORITY_WEIGHT = 10 ** 10
+
+
+class JobQueue:
+    """
+    Redis-backed review queue. Pending job ids live in a sorted set ordered
+    by priority and enqueue time, each job's state lives in its own hash.
+    Running jobs hold a lease in a second sorted set until they finish,
+    failed ones wait out their backoff in a third.
+    """
+
+    QUEUE_KEY = "jobs:queue"
+    PROCESSING_KEY = "jobs:processing"
+    DELAYED_KEY = "jobs:delayed"
+    JOB_KEY_PREFIX = "job"
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        max_retries: int = JobQueueConfig.MAX_RETRIES,
+        result_ttl: int = JobQueueConfig.RESULT_TTL,
+        lease_timeout: float = JobQueueConfig.LEASE_TIMEOUT,
+        retry_backoff: float = JobQueueConfig.RETRY_BACKOFF,
+    ):
+        self.client = client
+        self.max_retries = max_retries
+        self.result_ttl = result_ttl
+        self.lease_timeout = lease_timeout
+        self.retry_backoff = retry_backoff
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.JOB_KEY_PREFIX}:{job_id}"
+
+    async def enqueue(self, request: ReviewJobRequest) -> ReviewJob:
+        job = ReviewJob(id=uuid.uuid4().hex, status=JobStatus.QUEUED)
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job.id), mapping={
+                "status": job.status.value,
+                "attempts": job.attempts,
+                "priority": request.priority,
+                "request": request.model_dump_json(),
+            })
+            pipe.zadd(self.QUEUE_KEY, {
+                job.id: self._score(request.priority)
+            })
+            await pipe.execute()
+        return job
+
+    async def get(self, job_id: str) -> ReviewJob | None:
+        data = await self.client.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+
+        return ReviewJob(
+            id=job_id,
+            status=JobStatus(data["status"]),
+            attempts=int(data["attempts"]),
+            result=json.loads(data["result"]) if "result" in data else None,
+            error=data.get("error"),
+        )
+
+    async def get_request(self, job_id: str) -> ReviewJobRequest | None:
+        """None once the job expired or was deleted."""
+        request = await self.client.hget(self._job_key(job_id), "request")
+        if request is None:
+            return None
+        return ReviewJobRequest.model_validate_json(request)
+
+    async def dequeue(self, timeout: float = 1.0) -> str | None:
+        """
+        Blocks until a job is available, marks it as running and leases it
+        to the caller for `lease_timeout` seconds.
+        """
+        await self.promote_due()
+        popped = await self.client.bzpopmin(self.QUEUE_KEY, timeout=timeout)
+        if popped is None:
+            return None
+
+        _, job_id, _ = popped
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.PROCESSING_KEY, {
+                job_id: time.time() + self.lease_timeout
+            })
+            pipe.hset(
+                self._job_key(job_id), "status", JobStatus.RUNNING.value
+            )
+            await pipe.execute()
+        return job_id
+
+    async def release(self, job_id: str) -> None:
+        """Drops the lease of a job that will not be run."""
+        await self.client.zrem(self.PROCESSING_KEY, job_id)
+
+    async def renew(self, job_id: str) -> None:
+        """Extends the lease of a running job, unless it was reaped."""
+        await self.client.zadd(
+            self.PROCESSING_KEY,
+            {job_id: time.time() + self.lease_timeout},
+            xx=True,
+        )
+
+    async def complete(self, job_id: str, result) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping={
+                "status": JobStatus.COMPLETED.value,
+                "result": json.dumps(result, cls=UniversalJSONEncoder),
+            })
+            pipe.expire(self._job_key(job_id), self.result_ttl)
+            pipe.zrem(self.PROCESSING_KEY, job_id)
+            await pipe.execute()
+
+    async def fail(self, job_id: str, error: str) -> bool:
+        """
+        Schedules a retry after an exponential backoff unless the job ran
+        out of retries, returns True if so.
+        """
+        key = self._job_key(job_id)
+        attempts = await self.client.hincrby(key, "attempts", 1)
+
+        if attempts <= self.max_retries:
+            retry_at = time.time() + self.retry_backoff * 2 ** (attempts - 1)
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={
+                    "status": JobStatus.QUEUED.value, "error": error
+                })
+                pipe.zrem(self.PROCESSING_KEY, job_id)
+                pipe.zadd(self.DELAYED_KEY, {job_id: retry_at})
+                await pipe.execute()
+            return True
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "status": JobStatus.FAILED.value, "error": error
+            })
+            pipe.expire(key, self.result_ttl)
+            pipe.zrem(self.PROCESSING_KEY, job_id)
+            await pipe.execute()
+        return False
+
+    async def promote_due(self) -> None:
+        """Moves retries whose backoff has passed back into the queue."""
+        now = time.time()
+        for job_id in await self.client.zrangebyscore(
+            self.DELAYED_KEY, "-inf", now
+        ):
+            priority = int(
+                await self.client.hget(self._job_key(job_id), "priority")
+            )
+            await self._take_due(
+                self.DELAYED_KEY, job_id, now,
+                lambda pipe: pipe.zadd(
+                    self.QUEUE_KEY, {job_id: self._score(priority)}
+                ),
+            )
+
+    async def requeue_expired(self) -> list[str]:
+        """
+        Fails the running jobs whose lease expired, e.g. because their
+        worker crashed, so they are retried. Returns their ids.
+        """
+        now = time.time()
+        reaped = []
+        for job_id in await self.client.zrangebyscore(
+            self.PROCESSING_KEY, "-inf", now
+        ):
+            if await self._take_due(self.PROCESSING_KEY, job_id, now):
+                await self.fail(job_id, "Worker lease expired")
+                reaped.append(job_id)
+        return reaped
+
+    async def _take_due(
+        self,
+        key: str,
+        job_id: str,
+        now: float,
+        then: t.Callable[[Pipeline], t.Any] | None = None,
+    ) -> bool:
+        """
+        Removes `job_id` from `key` if its score is still due, together
+        with the commands `then` queues. Only one worker gets True.
+        """
+        async with self.client.pipeline(transaction=True) as pipe:
+            await pipe.watch(key)
+            # Renewed, promoted or reaped since it was listed.
+            score = await pipe.zscore(key, job_id)
+            if score is None or score > now:
+                return False
+            pipe.multi()
+            pipe.zrem(key, job_id)
+            if then is not None:
+                then(pipe)
+            try:
+                await pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    @staticmethod
+    def _score(priority: int) -> float:
+        return time.time() - priority * PRIORITY_WEIGHT
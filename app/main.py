@@ -1,49 +1,76 @@
+import json
 import logging
-import os
-
-import redis
 import typing as t
 
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Depends
-
-from app.models import ReviewRequest, ReviewResponse
-from app.services import GitHubService, OpenAIService
-from app.usecase import CodeReviewUseCase
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from app.cache import get_redis_client
+from app.container import ServiceContainer
+from app.jobs import JobQueue
+from app.metrics import REGISTRY
+from app.models import (
+    BatchReviewRequest,
+    ReviewJob,
+    ReviewJobRequest,
+    ReviewRequest,
+    ReviewResponse,
+)
+from app.usecase import BatchReviewUseCase, CodeReviewUseCase
 
 logger = logging.getLogger(__name__)
 
 redis_client = None
+container: ServiceContainer | None = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> t.AsyncGenerator[None, None]:
-    global redis_client
-    redis_client = redis.from_url(
-        url=os.getenv("REDIS_URL"), decode_responses=True
-    )
-    logger.info("Redis connection established")
+    global redis_client, container
+    container = ServiceContainer.from_config()
+    redis_client = container.redis
+    await container.start()
+    logger.info("Services started")
 
     yield
 
-    redis_client.close()
-    logger.info("Redis connection closed")
+    await container.close()
+    container = None
 
 
-def get_github_service() -> GitHubService:
-    return GitHubService(api_key=os.getenv("GITHUB_API_KEY"))
+def get_container() -> ServiceContainer:
+    if container is None:
+        raise RuntimeError("Services are not initialized.")
+    return container
 
 
-def get_openai_service() -> OpenAIService:
-    return OpenAIService(api_key=os.getenv("OPENAI_API_KEY"))
+def get_job_queue() -> JobQueue:
+    return JobQueue(get_redis_client())
 
 
 def get_code_review_usecase(
-    github_service: GitHubService = Depends(get_github_service),
-    openai_service: OpenAIService = Depends(get_openai_service)
+    services: ServiceContainer = Depends(get_container)
 ) -> CodeReviewUseCase:
-    return CodeReviewUseCase(github_service, openai_service)
+    return CodeReviewUseCase(
+        services.github,
+        services.openai,
+        services.review_state,
+        services.review_cache,
+    )
+
+
+def get_batch_review_usecase(
+    use_batch_api: bool = False,
+    services: ServiceContainer = Depends(get_container)
+) -> BatchReviewUseCase:
+    return BatchReviewUseCase(CodeReviewUseCase(
+        services.github,
+        services.openai_batch if use_batch_api else services.openai,
+        services.review_state,
+        services.review_cache,
+    ))
 
 
 app = FastAPI(title="Auto-Review Tool", lifespan=lifespan)
@@ -58,7 +85,11 @@ async def review_code(
     use_case: CodeReviewUseCase = Depends(get_code_review_usecase),
 ) -> ReviewResponse:
     try:
-        result = await use_case.execute(
+        execute = (
+            use_case.execute_incremental if request.incremental
+            else use_case.execute
+        )
+        result = await execute(
             repo_url=request.github_repo_url,
             description=request.assignment_description,
             candidate_level=request.candidate_level.value
@@ -67,5 +98,87 @@ async def review_code(
             f"Review for {str(request.github_repo_url)} completed."
         )
         return result
+    except HTTPException:
+        # E.g. 404 for an empty repository or 504 past the deadline.
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/review/stream")
+async def review_code_stream(
+    request: ReviewRequest,
+    use_case: CodeReviewUseCase = Depends(get_code_review_usecase),
+) -> StreamingResponse:
+    async def events() -> t.AsyncIterator[str]:
+        try:
+            async for event, data in use_case.execute_stream(
+                repo_url=request.github_repo_url,
+                description=request.assignment_description,
+                candidate_level=request.candidate_level.value
+            ):
+                yield format_sse(event, data)
+            logger.info(
+                f"Streamed review for {str(request.github_repo_url)} completed."
+            )
+        except HTTPException as e:
+            yield format_sse("error", {"detail": e.detail})
+        except Exception as e:
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/review/batch")
+async def review_batch(
+    request: BatchReviewRequest,
+    use_case: BatchReviewUseCase = Depends(get_batch_review_usecase),
+) -> StreamingResponse:
+    """
+    Reviews many repositories at once and streams one JSON line per
+    requested review as it completes. With `?use_batch_api=true` the
+    completions are sent as OpenAI Batch API jobs.
+    """
+    async def results() -> t.AsyncIterator[str]:
+        async for result in use_case.execute(request.reviews):
+            yield result.model_dump_json() + "\n"
+        logger.info(f"Batch of {len(request.reviews)} reviews completed.")
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.post("/review/jobs", response_model=ReviewJob, status_code=202)
+async def enqueue_review(
+    request: ReviewJobRequest,
+    queue: JobQueue = Depends(get_job_queue),
+) -> ReviewJob:
+    job = await queue.enqueue(request)
+    logger.info(f"Review for {request.github_repo_url} queued as {job.id}.")
+    return job
+
+
+@app.get("/review/jobs/{job_id}", response_model=ReviewJob)
+async def get_review_job(
+    job_id: str,
+    queue: JobQueue = Depends(get_job_queue),
+) -> ReviewJob:
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of this process' metrics."""
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,206 @@
+import bisect
+import time
+import typing as t
+
+from contextlib import contextmanager
+
+# Seconds, from a fast cache hit to a long completion.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120
+)
+SIZE_BUCKETS = tuple(4 ** exponent for exponent in range(13))
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels.items()
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Minimal Prometheus metric: values are kept per label combination and
+    rendered in the text exposition format. Updates are plain dict
+    operations, cheap enough for the request path.
+    """
+
+    TYPE: str
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        registry: "Registry | None" = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], t.Any] = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> t.Iterator[tuple[str, dict[str, str], float]]:
+        for key, value in self._values.items():
+            yield self.name, self._labels(key), value
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+        lines += [
+            f"{name}{_format_labels(labels)} {_format_value(value)}"
+            for name, labels, value in self.samples()
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = LATENCY_BUCKETS,
+        registry: "Registry | None" = None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        if key not in self._values:
+            # Per-bucket counts (the last one is +Inf), sum.
+            self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        counts, _ = state = self._values[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> t.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self) -> t.Iterator[tuple[str, dict[str, str], float]]:
+        for key, (counts, total) in self._values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(bound)},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(
+            metric.render() for metric in self.metrics.values()
+        ) + "\n"
+
+
+REGISTRY = Registry()
+
+UPSTREAM_LATENCY = Histogram(
+    "codereview_upstream_request_duration_seconds",
+    "Duration of every request attempt to an upstream API.",
+    ["host", "status"],
+)
+UPSTREAM_RETRIES = Counter(
+    "codereview_upstream_retries_total",
+    "Requests resent to an upstream API.",
+    ["host"],
+)
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "codereview_upstream_concurrency_limit",
+    "Current adaptive limit of in-flight requests to an upstream API.",
+    ["host"],
+)
+CACHE_REQUESTS = Counter(
+    "codereview_cache_requests_total",
+    "Cache lookups by cache and result (hit, stale or miss).",
+    ["cache", "result"],
+)
+REVIEW_FILES = Histogram(
+    "codereview_review_files",
+    "Files fetched for a review.",
+    buckets=SIZE_BUCKETS,
+)
+REVIEW_BYTES = Histogram(
+    "codereview_review_bytes",
+    "Bytes of file content fetched for a review.",
+    buckets=SIZE_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "codereview_prompt_tokens",
+    "Tokens of every prompt sent to the LLM.",
+    buckets=SIZE_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "codereview_review_stage_duration_seconds",
+    "Duration of the stages of a review: fetch, prompt_build and llm.",
+    ["stage"],
+)
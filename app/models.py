@@ -1,9 +1,11 @@
+import ipaddress
 import re
 import typing as t
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, HttpUrl, field_validator
 
-from app.enums import CandidateLevel
+from app.configs import BatchConfig, JobQueueConfig
+from app.enums import CandidateLevel, JobStatus
 
 GITHUB_URL_PATTERN = r"^https://github\.com/[A-Za-z0-9._-]+/[A-Za-z0-9._-]+$"
 
@@ -12,6 +14,8 @@ class ReviewRequest(BaseModel):
     assignment_description: str
     github_repo_url: str
     candidate_level: CandidateLevel
+    # Reuse the previous review and only re-review files changed since.
+    incremental: bool = False
 
     @field_validator("github_repo_url")
     @classmethod
@@ -32,3 +36,56 @@ class ReviewResponse(BaseModel):
         }
 
 
+def is_internal_host(host: str) -> bool:
+    """Loopback, private and link-local addresses, e.g. cloud metadata."""
+    if host == "localhost" or host.endswith(".localhost"):
+        return True
+    try:
+        address = ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return not address.is_global
+
+
+class ReviewJobRequest(ReviewRequest):
+    priority: int = 0
+    # Receives the finished job, the worker posts to it.
+    callback_url: t.Optional[HttpUrl] = None
+
+    @field_validator("callback_url")
+    @classmethod
+    def validate_callback_url(
+        cls,
+        value: HttpUrl | None
+    ) -> HttpUrl | None:
+        if value is None:
+            return value
+        if JobQueueConfig.CALLBACK_HOSTS:
+            if value.host not in JobQueueConfig.CALLBACK_HOSTS:
+                raise ValueError(f"Callback host not allowed: {value.host}")
+        elif is_internal_host(value.host):
+            raise ValueError(f"Callback host not allowed: {value.host}")
+        return value
+
+
+class ReviewJob(BaseModel):
+    id: str
+    status: JobStatus
+    attempts: int = 0
+    result: t.Optional[ReviewResponse] = None
+    error: t.Optional[str] = None
+
+
+class BatchReviewRequest(BaseModel):
+    reviews: t.List[ReviewRequest] = Field(
+        min_length=1, max_length=BatchConfig.MAX_REVIEWS
+    )
+
+
+class BatchReviewResult(BaseModel):
+    # Position of the review in the batch request.
+    index: int
+    github_repo_url: str
+    status: JobStatus
+    result: t.Optional[ReviewResponse] = None
+    error: t.Optional[str] = None
@@ -0,0 +1,73 @@
+import re
+import typing as t
+
+from dataclasses import dataclass, field
+
+from app.services.github_service import File, FileList
+
+# Approximates BPE tokenizers offline: words split into pieces of up to four
+# characters, every punctuation mark is its own token.
+TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+FILE_TEMPLATE = "Filename: {name}\nContent:\n{content}...\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+
+@dataclass
+class PromptChunk:
+    files: FileList = field(default_factory=FileList)
+    tokens: int = 0
+    # Names of the whole files the chunk holds (parts of) in pack order.
+    paths: list[str] = field(default_factory=list)
+
+
+class PromptBuilder:
+    """
+    Packs files into chunks whose rendered size stays within a token budget.
+    Files keep their order; a file larger than the budget is split by lines
+    into numbered parts.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+
+    def pack(self, files: t.Iterable[File]) -> list[PromptChunk]:
+        chunks = [PromptChunk()]
+
+        for file in files:
+            for part in self._split(file):
+                tokens = estimate_tokens(
+                    FILE_TEMPLATE.format(name=part.name, content=part.content)
+                )
+                if chunks[-1].files and (
+                    chunks[-1].tokens + tokens > self.max_tokens
+                ):
+                    chunks.append(PromptChunk())
+                chunks[-1].files.append(part)
+                chunks[-1].tokens += tokens
+                if file.name not in chunks[-1].paths:
+                    chunks[-1].paths.append(file.name)
+
+        return chunks
+
+    def _split(self, file: File) -> list[File]:
+        if estimate_tokens(file.content) <= self.max_tokens:
+            return [file]
+
+        parts, lines, tokens = [], [], 0
+        for line in file.content.splitlines(keepends=True):
+            line_tokens = estimate_tokens(line)
+            if lines and tokens + line_tokens > self.max_tokens:
+                parts.append("".join(lines))
+                lines, tokens = [], 0
+            lines.append(line)
+            tokens += line_tokens
+        parts.append("".join(lines))
+
+        return [
+            File(name=f"{file.name} (part {index}/{len(parts)})", content=part)
+            for index, part in enumerate(parts, start=1)
+        ]
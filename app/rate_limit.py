@@ -0,0 +1,367 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from dataclasses import dataclass
+
+import httpx
+import redis.asyncio as redis
+
+from app.configs import GitHubConfig, OpenAIConfig
+from app.logger import get_logger
+
+# GitHub's primary limit for authenticated REST requests.
+DEFAULT_LIMIT = 5000
+DEFAULT_WINDOW = 60 * 60
+# OpenAI quotas are per minute.
+OPENAI_WINDOW = 60
+# OpenAI reset durations, e.g. "1s", "6m0s" or "20ms".
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 60 * 60}
+
+
+class GitHubRateLimitBudget:
+    """
+    Tracks the remaining GitHub quota of every token in a pool, shared by
+    all workers through Redis hashes "github:ratelimit:<token digest>".
+
+    A request reserves one unit from the token with the largest remaining
+    budget, so concurrent requests cannot overshoot the limit. Requests are
+    paced once a token runs low and wait for the reset when every token is
+    exhausted or blocked by a secondary rate limit (Retry-After).
+
+    Pacing hands out send times one interval apart from a schedule per
+    token ("<hash key>:pace"), so concurrent requests of all workers are
+    spread out instead of sleeping the same delay and firing together.
+    """
+
+    KEY_PREFIX = "github:ratelimit"
+
+    def __init__(
+        self,
+        tokens: list[str],
+        client: redis.Redis | None = None,
+        reserve: int = GitHubConfig.RATE_LIMIT_RESERVE,
+        slowdown_ratio: float = GitHubConfig.RATE_LIMIT_SLOWDOWN_RATIO,
+    ):
+        if not tokens:
+            raise ValueError("At least one GitHub token is required.")
+
+        self.tokens = tokens
+        self.client = client
+        self.reserve = reserve
+        self.slowdown_ratio = slowdown_ratio
+        self.logger = get_logger(self.__class__.__name__)
+        # Used when there is no Redis, e.g. for a single process.
+        self._local: dict[str, dict[str, float]] = {}
+        self._next_send: dict[str, float] = {}
+
+    def _key(self, token: str) -> str:
+        digest = hashlib.sha256(token.encode()).hexdigest()[:16]
+        return f"{self.KEY_PREFIX}:{digest}"
+
+    async def _load(self, token: str) -> dict[str, float]:
+        now = time.time()
+        fresh = {
+            "limit": DEFAULT_LIMIT,
+            "remaining": DEFAULT_LIMIT,
+            "reset": now + DEFAULT_WINDOW,
+            "blocked_until": 0,
+        }
+
+        if self.client is None:
+            state = self._local.setdefault(token, fresh)
+        else:
+            key = self._key(token)
+            stored = await self.client.hgetall(key)
+            if not stored:
+                await self.client.hset(key, mapping=fresh)
+                stored = await self.client.hgetall(key)
+            state = {name: float(value) for name, value in stored.items()}
+
+        if state["reset"] <= now:
+            # The window rolled over, assume a full quota until told otherwise.
+            state.update(
+                remaining=state["limit"], reset=now + DEFAULT_WINDOW
+            )
+            await self._save(token, state)
+        return state
+
+    async def _save(self, token: str, state: dict[str, float]) -> None:
+        if self.client is None:
+            self._local[token] = state
+        else:
+            await self.client.hset(self._key(token), mapping=state)
+
+    async def _reserve(self, token: str) -> bool:
+        if self.client is None:
+            state = self._local[token]
+            if state["remaining"] - 1 < self.reserve:
+                return False
+            state["remaining"] -= 1
+            return True
+
+        key = self._key(token)
+        remaining = await self.client.hincrbyfloat(key, "remaining", -1)
+        if remaining < self.reserve:
+            await self.client.hincrbyfloat(key, "remaining", 1)
+            return False
+        return True
+
+    async def acquire(self) -> str:
+        """Returns a token with budget left, waiting for one if necessary."""
+        while True:
+            now = time.time()
+            states = {token: await self._load(token) for token in self.tokens}
+            candidates = sorted(
+                (
+                    token for token, state in states.items()
+                    if state["blocked_until"] <= now
+                ),
+                key=lambda token: states[token]["remaining"],
+                reverse=True,
+            )
+
+            for token in candidates:
+                if await self._reserve(token):
+                    await self._pace(token, states[token], now)
+                    return token
+
+            wake_up = min(
+                self._available_at(state, now) for state in states.values()
+            )
+            delay = max(wake_up - now, 0.1)
+            self.logger.warning(
+                f"All GitHub tokens are exhausted, waiting {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    def _available_at(self, state: dict[str, float], now: float) -> float:
+        if state["blocked_until"] > now:
+            return state["blocked_until"]
+        if state["remaining"] - 1 < self.reserve:
+            return state["reset"]
+        # Lost a race for the last units, try again shortly.
+        return now
+
+    async def _pace(
+        self,
+        token: str,
+        state: dict[str, float],
+        now: float
+    ) -> None:
+        # Spread the rest of the quota evenly over what is left of the window.
+        if state["remaining"] >= state["limit"] * self.slowdown_ratio:
+            return
+        interval = (state["reset"] - now) / max(state["remaining"], 1)
+
+        if self.client is None:
+            send_at = max(self._next_send.get(token, 0), now)
+            self._next_send[token] = send_at + interval
+        else:
+            key = f"{self._key(token)}:pace"
+            async with self.client.pipeline(transaction=True) as pipe:
+                # Catch the schedule up after an idle spell, then take the
+                # next slot. One transaction, so no slot is handed out twice.
+                pipe.zadd(key, {"next": now}, gt=True)
+                pipe.zincrby(key, interval, "next")
+                pipe.expireat(key, math.ceil(state["reset"]))
+                _, next_send, _ = await pipe.execute()
+            send_at = next_send - interval
+
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    async def update(self, token: str, response: httpx.Response) -> None:
+        """Syncs the budget with the rate-limit headers of a response."""
+        state = await self._load(token)
+        headers = response.headers
+
+        if "X-RateLimit-Remaining" in headers:
+            remaining = float(headers["X-RateLimit-Remaining"])
+            reset = float(headers.get("X-RateLimit-Reset", state["reset"]))
+            if reset > state["reset"]:
+                state["remaining"] = remaining
+            else:
+                # Other in-flight reservations are not reflected yet.
+                state["remaining"] = min(state["remaining"], remaining)
+            state["reset"] = reset
+            state["limit"] = float(
+                headers.get("X-RateLimit-Limit", state["limit"])
+            )
+
+        if is_rate_limited(response) and "Retry-After" in headers:
+            state["blocked_until"] = time.time() + float(headers["Retry-After"])
+
+        await self._save(token, state)
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    return response.status_code == 429 or (
+        response.status_code == 403 and (
+            response.headers.get("X-RateLimit-Remaining") == "0"
+            or "Retry-After" in response.headers
+        )
+    )
+
+
+def parse_duration(value: str | None) -> float | None:
+    if not value:
+        return None
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+@dataclass
+class TokenBucket:
+    """Holds up to `capacity` units, refilled evenly over a minute."""
+
+    capacity: float
+    level: float
+    updated: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / OPENAI_WINDOW
+
+    def refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` is available, 0 if it is now."""
+        return max(amount - self.level, 0) / self.rate
+
+    def sync(self, limit: str | None, remaining: str | None) -> None:
+        if limit is not None:
+            self.capacity = float(limit)
+        if remaining is not None:
+            # Other in-flight reservations are not reflected yet.
+            self.level = min(self.level, float(remaining))
+
+
+@dataclass
+class OpenAIKey:
+    key: str
+    organization: str | None
+    requests: TokenBucket
+    tokens: TokenBucket
+    blocked_until: float = 0
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {"Authorization": f"Bearer {self.key}"}
+        if self.organization:
+            headers["OpenAI-Organization"] = self.organization
+        return headers
+
+    def delay(self, tokens: float, now: float) -> float:
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return max(
+            self.blocked_until - now,
+            self.requests.delay(1),
+            self.tokens.delay(tokens),
+        )
+
+
+class OpenAIKeyScheduler:
+    """
+    Admits OpenAI requests through a request (RPM) and a token (TPM)
+    bucket per key of a pool, so bursts are paced within the quotas
+    instead of running into 429s. A request is sent with the key that
+    can admit it and has the most tokens left, and waits for the first
+    one that can otherwise.
+
+    The buckets are kept per process. The x-ratelimit-* headers of every
+    response resync them with the usage of all processes sharing a key.
+    """
+
+    def __init__(
+        self,
+        keys: list[str],
+        rpm_limit: int = OpenAIConfig.RPM_LIMIT,
+        tpm_limit: int = OpenAIConfig.TPM_LIMIT,
+        completion_tokens: int = OpenAIConfig.COMPLETION_TOKENS,
+    ):
+        if not keys:
+            raise ValueError("At least one OpenAI key is required.")
+
+        now = time.monotonic()
+        self.keys = []
+        for entry in keys:
+            key, _, organization = entry.partition(":")
+            self.keys.append(OpenAIKey(
+                key=key,
+                organization=organization or None,
+                requests=TokenBucket(rpm_limit, rpm_limit, now),
+                tokens=TokenBucket(tpm_limit, tpm_limit, now),
+            ))
+        self.completion_tokens = completion_tokens
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def acquire(self, prompt_tokens: int) -> OpenAIKey:
+        """Reserves a request and its estimated tokens on a key."""
+        while True:
+            now = time.monotonic()
+            best, wait = None, math.inf
+            for key in self.keys:
+                # A prompt above the quota is admitted with a full bucket.
+                tokens = min(
+                    prompt_tokens + self.completion_tokens,
+                    key.tokens.capacity,
+                )
+                delay = key.delay(tokens, now)
+                wait = min(wait, delay)
+                if delay == 0 and (
+                    best is None or key.tokens.level > best.tokens.level
+                ):
+                    best, cost = key, tokens
+
+            if best is not None:
+                best.requests.level -= 1
+                best.tokens.level -= cost
+                return best
+
+            self.logger.debug(f"All OpenAI keys are busy, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    def update(self, key: OpenAIKey, response: httpx.Response) -> None:
+        """Syncs the key's buckets with the headers of a response."""
+        headers = response.headers
+        key.requests.sync(
+            headers.get("x-ratelimit-limit-requests"),
+            headers.get("x-ratelimit-remaining-requests"),
+        )
+        key.tokens.sync(
+            headers.get("x-ratelimit-limit-tokens"),
+            headers.get("x-ratelimit-remaining-tokens"),
+        )
+
+        if response.status_code == 429:
+            delay = retry_delay(headers)
+            key.blocked_until = time.monotonic() + delay
+            self.logger.warning(
+                f"OpenAI key ...{key.key[-4:]} is rate limited for"
+                f" {delay:.1f}s"
+            )
+
+
+def retry_delay(headers: httpx.Headers) -> float:
+    """When a rate-limited OpenAI key can be used again, in seconds."""
+    if "retry-after-ms" in headers:
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after", "").isdigit():
+        return float(headers["retry-after"])
+    # The reset of the exhausted quota.
+    for kind in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if reset is not None:
+                return reset
+    return 1.0
@@ -0,0 +1,247 @@
+import asyncio
+import collections
+import time
+import typing as t
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from app.configs import ResilienceConfig
+from app.enums import CircuitState
+from app.exceptions import DeadlineExceededError
+from app.metrics import UPSTREAM_CONCURRENCY_LIMIT
+
+# Absolute expiry (event loop time) of the current review, if any. Tasks
+# spawned inside the review inherit it.
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+def time_left() -> float | None:
+    """Seconds left before the current deadline, None without one."""
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    return expires - asyncio.get_running_loop().time()
+
+
+@asynccontextmanager
+async def deadline(seconds: float) -> t.AsyncIterator[None]:
+    """
+    Cancels the block after `seconds` and raises DeadlineExceededError.
+    Nested deadlines never extend an outer one.
+    """
+    expires = asyncio.get_running_loop().time() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        expires = min(expires, outer)
+
+    token = _deadline.set(expires)
+    try:
+        async with asyncio.timeout_at(expires):
+            yield
+    except TimeoutError:
+        raise DeadlineExceededError(f"Deadline of {seconds}s exceeded")
+    finally:
+        _deadline.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Fails fast once a host failed `failure_threshold` times in a row. After
+    `recovery_timeout` seconds one trial request is let through: success
+    closes the circuit again, failure keeps it open for another period.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = ResilienceConfig.CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = ResilienceConfig.CIRCUIT_RECOVERY_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_at: float | None = None
+
+    @property
+    def state(self) -> CircuitState:
+        if self.opened_at is None:
+            return CircuitState.CLOSED
+        if time.monotonic() - self.opened_at < self.recovery_timeout:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state is CircuitState.CLOSED:
+            return True
+        if state is CircuitState.OPEN:
+            return False
+
+        # A trial that never reported back (e.g. cancelled) is replaced
+        # after another recovery period.
+        now = time.monotonic()
+        if (
+            self.trial_at is None
+            or now - self.trial_at >= self.recovery_timeout
+        ):
+            self.trial_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        trial_failed = self.trial_at is not None
+        if trial_failed or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.trial_at = None
+
+
+class CircuitBreakerRegistry:
+    """One circuit breaker per upstream host, shared by the whole process."""
+
+    def __init__(
+        self,
+        failure_threshold: int = ResilienceConfig.CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = ResilienceConfig.CIRCUIT_RECOVERY_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(
+                self.failure_threshold, self.recovery_timeout
+            )
+        return self.breakers[host]
+
+
+circuit_breakers = CircuitBreakerRegistry()
+
+
+class AdaptiveLimiter:
+    """
+    Limits in-flight requests to one host with AIMD: every request that
+    completes at the usual latency while the limit is in use raises the
+    limit by 1/limit (about one per round trip), an overload (throttling,
+    server error or a slowdown) multiplies it by `backoff_ratio`.
+    Requests that started before a decrease do not decrease it again.
+
+    A slowdown is a recent latency average `latency_tolerance` times above
+    the long-term one. Both follow every successful response, so single
+    slow requests (large downloads, reduce calls) barely count and a
+    lasting shift in latency becomes the new normal after a few requests.
+    """
+
+    # Weights of a new sample in the recent and the long-term latency.
+    RECENT_SMOOTHING = 0.2
+    LONG_TERM_SMOOTHING = 0.01
+
+    def __init__(
+        self,
+        host: str,
+        initial_limit: int = ResilienceConfig.CONCURRENCY_INITIAL_LIMIT,
+        min_limit: int = ResilienceConfig.CONCURRENCY_MIN_LIMIT,
+        max_limit: int = ResilienceConfig.CONCURRENCY_MAX_LIMIT,
+        backoff_ratio: float = ResilienceConfig.CONCURRENCY_BACKOFF_RATIO,
+        latency_tolerance: float = (
+            ResilienceConfig.CONCURRENCY_LATENCY_TOLERANCE
+        ),
+    ):
+        self.host = host
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.recent_latency: float | None = None
+        self.latency: float | None = None
+        self.decreased_at = 0.0
+        self._waiters: collections.deque[asyncio.Future] = (
+            collections.deque()
+        )
+        UPSTREAM_CONCURRENCY_LIMIT.set(self.limit, host=host)
+
+    async def acquire(self) -> float:
+        """Waits for a free slot, returns the start time for `release`."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # A wake-up meant for this waiter goes to the next one.
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_up()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, overloaded: bool) -> None:
+        now = time.monotonic()
+        latency = now - started
+        in_use = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+
+        # Throttled and failed responses say nothing about the latency.
+        if not overloaded:
+            self._observe(latency)
+            overloaded = (
+                self.recent_latency > self.latency * self.latency_tolerance
+            )
+
+        if overloaded:
+            if started >= self.decreased_at:
+                self._set_limit(self.limit * self.backoff_ratio)
+                self.decreased_at = now
+        elif in_use:
+            self._set_limit(self.limit + 1 / self.limit)
+        self._wake_up()
+
+    def _observe(self, latency: float) -> None:
+        if self.latency is None:
+            self.recent_latency = self.latency = latency
+            return
+        self.recent_latency += (
+            (latency - self.recent_latency) * self.RECENT_SMOOTHING
+        )
+        self.latency += (latency - self.latency) * self.LONG_TERM_SMOOTHING
+
+    def _set_limit(self, limit: float) -> None:
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        UPSTREAM_CONCURRENCY_LIMIT.set(self.limit, host=self.host)
+
+    def _wake_up(self) -> None:
+        free = int(self.limit) - self.in_flight
+        for waiter in list(self._waiters):
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class ConcurrencyLimiterRegistry:
+    """One adaptive limiter per upstream host, shared by the process."""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.limiters: dict[str, AdaptiveLimiter] = {}
+
+    def get(self, host: str) -> AdaptiveLimiter:
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveLimiter(host, **self.settings)
+        return self.limiters[host]
+
+
+concurrency_limiters = ConcurrencyLimiterRegistry()
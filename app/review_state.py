@@ -0,0 +1,81 @@
+import dataclasses
+import hashlib
+import json
+
+import redis.asyncio as redis
+
+from dataclasses import dataclass
+
+from app.configs import ReviewStateConfig
+
+
+@dataclass
+class ReviewFragment:
+    """Review of one prompt chunk and the blobs (path -> SHA) it covered."""
+    files: dict[str, str]
+    review: str
+
+
+@dataclass
+class ReviewState:
+    sha: str
+    names: list[str]
+    fragments: list[ReviewFragment]
+    review: str
+
+    @property
+    def files(self) -> dict[str, str]:
+        return {
+            path: sha
+            for fragment in self.fragments
+            for path, sha in fragment.files.items()
+        }
+
+
+class ReviewStateStore:
+    """
+    Remembers, per repository and review parameters, the last reviewed
+    commit and the review of every chunk, so a later review only has to
+    redo the chunks whose files changed.
+    """
+
+    KEY_PREFIX = "review:state"
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        ttl: int = ReviewStateConfig.TTL,
+    ):
+        self.client = client
+        self.ttl = ttl
+
+    def key(
+        self,
+        repo_url: str,
+        description: str,
+        candidate_level: str
+    ) -> str:
+        digest = hashlib.md5(
+            f"{description}\n{candidate_level}".encode()
+        ).hexdigest()
+        return f"{self.KEY_PREFIX}:{repo_url}:{digest}"
+
+    async def get(self, key: str) -> ReviewState | None:
+        data = await self.client.get(key)
+        if data is None:
+            return None
+
+        state = json.loads(data)
+        return ReviewState(
+            sha=state["sha"],
+            names=state["names"],
+            fragments=[
+                ReviewFragment(**fragment) for fragment in state["fragments"]
+            ],
+            review=state["review"],
+        )
+
+    async def set(self, key: str, state: ReviewState) -> None:
+        await self.client.set(
+            key, json.dumps(dataclasses.asdict(state)), ex=self.ttl
+        )
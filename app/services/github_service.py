@@ -1,17 +1,37 @@
+import asyncio
+import hashlib
+import os
+import tarfile
+import tempfile
 import typing as t
 from linecache import cache
 
 import httpx
 
-from collections import UserList
+from collections import UserList, deque
 from dataclasses import dataclass
 
-from app.configs import GitHubConfig
+from app.cache import BlobCache, HttpResponseCache
+from app.configs import FileFilterConfig, GitHubConfig, ResilienceConfig
+from app.enums import GitHubFetchMode
 from app.exceptions import GitHubServiceError
+from app.filters import FileFilter, is_binary
+from app.rate_limit import GitHubRateLimitBudget
 from app.http_client import HttpClientWithInterceptors
-from app.interceptors import RetryInterceptor, LoggingInterceptor
+from app.interceptors import (
+    AdaptiveConcurrencyInterceptor,
+    CircuitBreakerInterceptor,
+    ConcurrencyLimitInterceptor,
+    HttpCacheInterceptor,
+    LoggingInterceptor,
+    MetricsInterceptor,
+    RateLimitBudgetInterceptor,
+    RetryInterceptor,
+    TracingInterceptor,
+)
 from app.interceptors.retry_strategies import RateLimitRetryStrategy
 from app.services import BaseService
+from app.tracing import tracer
 
 
 @dataclass
@@ -29,76 +49,456 @@ class GitHubContent(t.TypedDict):
     download_url: t.Optional[str]
 
 
+class GitTreeEntry(t.TypedDict):
+    path: str
+    mode: str
+    type: str
+    sha: str
+    size: int
+    url: str
+
+
 GitHubResponse = t.List[GitHubContent]
 
+# Receives progress events such as "files_discovered" and "file_fetched".
+ProgressCallback = t.Callable[[str, dict], None]
+
+
+def _ignore_progress(event: str, data: dict) -> None:
+    pass
+
 class FileList(UserList[File]):
 
     @property
     def names(self):
         return [file.name for file in self]
 
+    @property
+    def size(self) -> int:
+        """UTF-8 bytes of all contents."""
+        return sum(len(file.content.encode()) for file in self)
+
+    def close(self) -> None:
+        """Releases what backs the contents, nothing for a list in memory."""
+
+
+class SpilledFile(File):
+    """A file whose content stays in a spool file until it is read."""
+
+    def __init__(self, name: str, spool: t.BinaryIO, offset: int, size: int):
+        self.name = name
+        self._spool = spool
+        self._offset = offset
+        self._size = size
+
+    @property
+    def content(self) -> str:
+        self._spool.seek(self._offset)
+        return self._spool.read(self._size).decode()
+
+
+class SpooledFileList(FileList):
+    """
+    Keeps up to `max_memory_bytes` of file contents in memory and spills the
+    rest into an anonymous temporary file. Appending stops accepting files
+    at `max_bytes` in total, those are listed in `skipped`.
+    """
+
+    def __init__(
+        self,
+        files: t.Iterable[File] = (),
+        max_bytes: int = FileFilterConfig.MAX_TOTAL_SIZE,
+        max_memory_bytes: int = FileFilterConfig.MAX_MEMORY_BYTES,
+    ):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_size = 0
+        self.skipped: list[str] = []
+        self._size = 0
+        self._spool: t.BinaryIO | None = None
+        for file in files:
+            self.append(file)
+
+    @property
+    def size(self) -> int:
+        """Counted while appending, spilled contents are not read back."""
+        return self._size
+
+    def append(self, file: File) -> None:
+        content = file.content
+        data = content.encode()
+        if self._size + len(data) > self.max_bytes:
+            self.skipped.append(file.name)
+            return
+        self._size += len(data)
+
+        if self.memory_size + len(data) <= self.max_memory_bytes:
+            self.memory_size += len(data)
+            # A file spilled by another list must not outlive its spool.
+            super().append(File(name=file.name, content=content))
+            return
+
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile()
+        offset = self._spool.seek(0, os.SEEK_END)
+        self._spool.write(data)
+        super().append(SpilledFile(file.name, self._spool, offset, len(data)))
+
+    def close(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+
+
+@dataclass
+class Changeset:
+    # Added, modified and renamed files that pass the file filter.
+    files: FileList
+    # Paths that no longer belong to the review: deleted, renamed from, or
+    # changed into something the filter drops.
+    removed: list[str]
+
+
+def git_blob_sha(content: str) -> str:
+    """The SHA git (and GitHub) gives a blob with this content."""
+    data = content.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
 
 class GitHubService(BaseService):
     CONFIG = GitHubConfig
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        client: httpx.AsyncClient | None = None,
+        max_concurrency: int = GitHubConfig.MAX_CONCURRENT_REQUESTS,
+        fetch_mode: GitHubFetchMode = GitHubFetchMode(GitHubConfig.FETCH_MODE),
+        blob_cache: BlobCache | None = None,
+        file_filter: FileFilter | None = None,
+        rate_limit_budget: GitHubRateLimitBudget | None = None,
+        http_cache: HttpResponseCache | None = None,
+        max_memory_bytes: int = FileFilterConfig.MAX_MEMORY_BYTES
+    ):
         super().__init__()
         self.api_key = api_key
+        self.fetch_mode = fetch_mode
+        self.max_concurrency = max_concurrency
+        self.max_memory_bytes = max_memory_bytes
+        self.blob_cache = blob_cache
+        self.file_filter = file_filter or FileFilter()
+        # Bounds in-flight requests made with this token, by all reviews
+        # sharing the service.
+        self.semaphore = asyncio.Semaphore(max_concurrency)
         self.headers = {
             "Authorization": f"token {self.api_key}",
             "Accept": "application/vnd.github.v3+json",
             "User-Agent": "CodeReviewAI/1.0 (https://example.com)"
         }
-        self.http_client = HttpClientWithInterceptors([
-            LoggingInterceptor(),
-            RetryInterceptor(RateLimitRetryStrategy())
-        ])
+        interceptors = [LoggingInterceptor(), TracingInterceptor()]
+        if http_cache is not None:
+            # Revalidated responses (304) do not count against the quota.
+            interceptors.append(HttpCacheInterceptor(
+                http_cache, httpx.URL(self.CONFIG.API_URL).host
+            ))
+        interceptors.append(RetryInterceptor(RateLimitRetryStrategy(
+            backoff_factor=self.CONFIG.BACKOFF_FACTOR,
+            max_retries=self.CONFIG.MAX_RETRIES,
+        )))
+        if rate_limit_budget is not None:
+            # Inside the retries: every attempt picks a token again, so an
+            # exhausted token is only waited for once all of them are.
+            interceptors.append(RateLimitBudgetInterceptor(
+                rate_limit_budget, httpx.URL(self.CONFIG.API_URL).host
+            ))
+        # After pacing and retry backoff, only sending attempts hold a slot.
+        interceptors.append(ConcurrencyLimitInterceptor(self.semaphore))
+        interceptors.append(CircuitBreakerInterceptor())
+        if ResilienceConfig.ADAPTIVE_CONCURRENCY:
+            interceptors.append(AdaptiveConcurrencyInterceptor())
+        interceptors.append(MetricsInterceptor())
+        self.http_client = HttpClientWithInterceptors(
+            interceptors, client=client
+        )
+
+    async def execute(
+        self,
+        repo_url: str,
+        on_progress: ProgressCallback | None = None
+    ) -> FileList:
+        """
+        Collects the files of `iter_files`. Only `max_memory_bytes` of their
+        contents are kept in memory, close the list to drop the rest.
+        """
+        files = SpooledFileList(
+            max_bytes=self.file_filter.max_total_size,
+            max_memory_bytes=self.max_memory_bytes,
+        )
+        try:
+            async for file in self.iter_files(repo_url, on_progress):
+                files.append(file)
+        except BaseException:
+            files.close()
+            raise
+
+        if files.skipped:
+            self.logger.warning(
+                f"Skipped {len(files.skipped)} files over the"
+                f" {files.max_bytes} bytes review limit"
+            )
+        return files
 
-    async def execute(self, repo_url: str) -> FileList:
+    async def iter_files(
+        self,
+        repo_url: str,
+        on_progress: ProgressCallback | None = None
+    ) -> t.AsyncIterator[File]:
+        """Yields the selected files in review order as they arrive."""
         repo_name = repo_url.split("github.com/")[1]
-        url = f"{self.CONFIG.API_URL}/repos/{repo_name}/contents/"
-        return await self._fetch_contents_recursive(url)
+        on_progress = on_progress or _ignore_progress
 
-    async def _fetch_contents_recursive(self, url: str) -> FileList:
-        request = httpx.Request(
-            method="GET",
-            url=url,
-            headers=self.headers
+        if self.fetch_mode is GitHubFetchMode.TREES:
+            files = self._fetch_tree(repo_name, on_progress)
+        elif self.fetch_mode is GitHubFetchMode.TARBALL:
+            files = self._iter_tarball(repo_name, on_progress)
+        else:
+            url = f"{self.CONFIG.API_URL}/repos/{repo_name}/contents/"
+            files = self._download(
+                await self._list_contents_recursive(url),
+                lambda item: self._fetch_file_content(item["download_url"]),
+                on_progress
+            )
+        async for file in files:
+            yield file
+
+    async def head_sha(self, repo_url: str) -> str:
+        """Returns the SHA of the latest commit on the default branch."""
+        repo_name = repo_url.split("github.com/")[1]
+        response = await self._send(
+            f"{self.CONFIG.API_URL}/repos/{repo_name}/commits/HEAD"
         )
-        response = await self.http_client.send(request)
+        if response.status_code != 200:
+            raise GitHubServiceError(
+                f"GitHub API error: {response.status_code} - {response.text}"
+            )
+        return response.json()["sha"]
 
+    async def fetch_changes(
+        self,
+        repo_url: str,
+        base: str,
+        head: str
+    ) -> Changeset | None:
+        """
+        Downloads only the files changed between two commits, using the
+        compare API. Returns None when the diff is too large to be listed
+        completely and the repository has to be fetched in full.
+        """
+        repo_name = repo_url.split("github.com/")[1]
+        response = await self._send(
+            f"{self.CONFIG.API_URL}/repos/{repo_name}/compare/{base}...{head}"
+        )
+        if response.status_code == 404:
+            # The base commit is gone, e.g. after a force push.
+            return None
         if response.status_code != 200:
             raise GitHubServiceError(
                 f"GitHub API error: {response.status_code} - {response.text}"
             )
 
-        files = []
-        contents = response.json()
+        changed = response.json().get("files", [])
+        if len(changed) >= self.CONFIG.COMPARE_MAX_FILES:
+            return None
+
+        removed = [
+            item["previous_filename"] for item in changed
+            if "previous_filename" in item
+        ]
+        entries = []
+        for item in changed:
+            # The compare API does not report sizes, they are checked below.
+            entry = {"path": item["filename"], "size": 0, "sha": item["sha"]}
+            if item["status"] == "removed" or self.file_filter.is_excluded(
+                entry
+            ):
+                removed.append(item["filename"])
+            else:
+                entries.append(entry)
+
+        contents = await self._fetch_blobs(repo_name, entries)
+        files = FileList()
+        for entry, content in zip(entries, contents):
+            size = len(content.encode())
+            if is_binary(content) or self.file_filter.is_excluded(
+                {"path": entry["path"], "size": size}
+            ):
+                removed.append(entry["path"])
+            else:
+                files.append(File(name=entry["path"], content=content))
+        return Changeset(files=files, removed=removed)
 
+    async def fetch_files(
+        self,
+        repo_url: str,
+        shas: dict[str, str]
+    ) -> FileList:
+        """Downloads known files by the SHA of their blob."""
+        repo_name = repo_url.split("github.com/")[1]
+        entries = [{"path": path, "sha": sha} for path, sha in shas.items()]
+        contents = await self._fetch_blobs(repo_name, entries)
+        return FileList(
+            File(name=entry["path"], content=content)
+            for entry, content in zip(entries, contents)
+        )
+
+    async def _fetch_blobs(
+        self,
+        repo_name: str,
+        entries: list[dict]
+    ) -> list[str]:
+        url = f"{self.CONFIG.API_URL}/repos/{repo_name}/git/blobs"
+        return await asyncio.gather(*(
+            self._cached_blob(
+                entry["sha"],
+                lambda entry=entry: self._fetch_blob(f"{url}/{entry['sha']}"),
+                path=entry["path"]
+            )
+            for entry in entries
+        ))
+
+    async def _send(
+        self,
+        url: str,
+        headers: dict[str, str] | None = None
+    ) -> httpx.Response:
+        request = httpx.Request(
+            method="GET",
+            url=url,
+            headers={**self.headers, **(headers or {})}
+        )
+        return await self.http_client.send(request)
+
+    async def _list_contents_recursive(self, url: str) -> GitHubResponse:
+        with tracer.start_span("github.list_directory", url=url) as span:
+            response = await self._send(url)
+            if response.status_code != 200:
+                raise GitHubServiceError(
+                    f"GitHub API error:"
+                    f" {response.status_code} - {response.text}"
+                )
+
+            contents: GitHubResponse = response.json()
+            span.set_attribute("entries", len(contents))
+
+            # Excluded trees are never listed, they would only cost
+            # requests against the rate budget.
+            directories = [
+                item for item in contents
+                if item["type"] == "dir"
+                and not self.file_filter.is_excluded_directory(item["path"])
+            ]
+            # Directories are listed concurrently, gather keeps the order.
+            listings = dict(zip(
+                (item["path"] for item in directories),
+                await asyncio.gather(*(
+                    self._list_contents_recursive(item["url"])
+                    for item in directories
+                )),
+            ))
+        files = []
         for item in contents:
             if item["type"] == "file":
-                files.append(
-                    File(
-                        name=item["path"],
-                        content=await self._fetch_file_content(
-                            item["download_url"]
-                        )
-                    )
-                )
+                files.append(item)
             elif item["type"] == "dir":
-                files.extend(
-                    await self._fetch_contents_recursive(item["url"])
+                files.extend(listings.get(item["path"], []))
+        return files
+
+    async def _download(
+        self,
+        entries: t.List[GitHubContent] | t.List[GitTreeEntry],
+        fetch: t.Callable[[t.Any], t.Awaitable[str]],
+        on_progress: ProgressCallback
+    ) -> t.AsyncIterator[File]:
+        """
+        Filters and ranks listed files on their metadata, then downloads
+        only the selected ones concurrently and yields them in rank order.
+        Downloads run at most a window of files ahead of the consumer, so
+        a slow consumer does not pile up contents in memory.
+        """
+        gitattributes = None
+        for entry in entries:
+            if entry["path"] == ".gitattributes":
+                gitattributes = await self._cached_blob(
+                    entry["sha"], lambda: fetch(entry)
                 )
+                break
 
-        return FileList(files)
+        selected = self.file_filter.select(entries, gitattributes)
+        self.logger.info(
+            f"Selected {len(selected)} of {len(entries)} files for review"
+        )
+        on_progress("files_discovered", {
+            "listed": len(entries),
+            "selected": [entry["path"] for entry in selected],
+        })
+
+        async def download(entry) -> str:
+            content = await self._cached_blob(
+                entry["sha"], lambda: fetch(entry), path=entry["path"]
+            )
+            on_progress("file_fetched", {"name": entry["path"]})
+            return content
+
+        window = 2 * self.max_concurrency
+        pending: deque[tuple[str, asyncio.Task[str]]] = deque()
+        try:
+            for entry in selected:
+                pending.append(
+                    (entry["path"], asyncio.ensure_future(download(entry)))
+                )
+                if len(pending) < window:
+                    continue
+                name, task = pending.popleft()
+                content = await task
+                if not is_binary(content):
+                    yield File(name=name, content=content)
+
+            while pending:
+                name, task = pending.popleft()
+                content = await task
+                if not is_binary(content):
+                    yield File(name=name, content=content)
+        finally:
+            # Failed or abandoned: nothing may be left downloading.
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(
+                *(task for _, task in pending), return_exceptions=True
+            )
+
+    async def _cached_blob(
+        self,
+        sha: str,
+        fetch: t.Callable[[], t.Awaitable[str]],
+        path: str | None = None
+    ) -> str:
+        with tracer.start_span(
+            "github.fetch_file", sha=sha, path=path
+        ) as span:
+            content = None
+            if self.blob_cache is not None:
+                content = await self.blob_cache.get(sha)
+            span.set_attribute("cache_hit", content is not None)
+
+            if content is None:
+                content = await fetch()
+                if self.blob_cache is not None:
+                    await self.blob_cache.set(sha, content)
+            span.set_attribute("bytes", len(content))
+            return content
 
     async def _fetch_file_content(self, download_url: str) -> str:
-        request = httpx.Request(
-            method="GET",
-            url=download_url,
-            headers=self.headers
-        )
-        response = await self.http_client.send(request)
+        response = await self._send(download_url)
         if response.status_code != 200:
             raise GitHubServiceError(
                 f"Error fetching file content:"
@@ -106,6 +506,160 @@ class GitHubService(BaseService):
             )
         return response.text
 
+    async def _fetch_tree(
+        self,
+        repo_name: str,
+        on_progress: ProgressCallback
+    ) -> t.AsyncIterator[File]:
+        """
+        Lists the whole repository with a single recursive Git Trees call
+        and downloads the blobs concurrently.
+        """
+        with tracer.start_span("github.list_tree", repo=repo_name):
+            response = await self._send(
+                f"{self.CONFIG.API_URL}/repos/{repo_name}"
+                f"/git/trees/HEAD?recursive=1"
+            )
+        if response.status_code != 200:
+            raise GitHubServiceError(
+                f"GitHub API error: {response.status_code} - {response.text}"
+            )
+
+        tree = response.json()
+        if tree.get("truncated"):
+            # GitHub caps recursive trees, the tarball always has everything.
+            files = self._iter_tarball(repo_name, on_progress)
+        else:
+            blobs: t.List[GitTreeEntry] = [
+                entry for entry in tree["tree"] if entry["type"] == "blob"
+            ]
+            files = self._download(
+                blobs,
+                lambda entry: self._fetch_blob(entry["url"]),
+                on_progress
+            )
+        async for file in files:
+            yield file
+
+    async def _fetch_blob(self, url: str) -> str:
+        response = await self._send(
+            url, headers={"Accept": "application/vnd.github.raw"}
+        )
+        if response.status_code != 200:
+            raise GitHubServiceError(
+                f"Error fetching blob:"
+                f" {response.status_code} - {response.text}"
+            )
+        return response.text
+
+    async def _iter_tarball(
+        self,
+        repo_name: str,
+        on_progress: ProgressCallback
+    ) -> t.AsyncIterator[File]:
+        files = await self._fetch_tarball(repo_name, on_progress)
+        try:
+            for file in files:
+                yield file
+        finally:
+            files.close()
+
+    async def _fetch_tarball(
+        self,
+        repo_name: str,
+        on_progress: ProgressCallback
+    ) -> FileList:
+        """
+        Downloads the default branch as one tarball into a temporary file
+        and unpacks the selected files from it into a spooled list.
+        """
+        with tempfile.TemporaryFile() as archive:
+            response = await self._send(
+                f"{self.CONFIG.API_URL}/repos/{repo_name}/tarball"
+            )
+            if response.is_redirect:
+                # The signed codeload URL must not receive our token.
+                response = await self._download_to(
+                    response.headers["Location"], archive
+                )
+            elif response.status_code == 200:
+                archive.write(response.content)
+
+            if response.status_code != 200:
+                raise GitHubServiceError(
+                    f"Error fetching tarball: {response.status_code}"
+                )
+
+            # Decompression is CPU bound, keep it off the event loop.
+            with tracer.start_span(
+                "github.unpack_tarball", bytes=archive.tell()
+            ) as span:
+                listed, files = await asyncio.to_thread(
+                    self._unpack_tarball, archive
+                )
+                span.set_attribute("files", len(files))
+
+        # Everything arrives at once, report it after unpacking.
+        on_progress("files_discovered", {
+            "listed": listed, "selected": files.names
+        })
+        for name in files.names:
+            on_progress("file_fetched", {"name": name})
+        return files
+
+    async def _download_to(
+        self,
+        url: str,
+        file: t.BinaryIO
+    ) -> httpx.Response:
+        """Streams a successful response body from `url` into `file`."""
+        response = await self.http_client.send(
+            httpx.Request("GET", url), stream=True
+        )
+        try:
+            if response.status_code == 200:
+                async for chunk in response.aiter_bytes():
+                    file.write(chunk)
+        finally:
+            await response.aclose()
+        return response
+
+    def _unpack_tarball(
+        self,
+        archive: t.BinaryIO
+    ) -> tuple[int, SpooledFileList]:
+        """Returns the number of files in the archive and the selected ones."""
+        archive.seek(0)
+        with tarfile.open(fileobj=archive, mode="r:*") as tar:
+            members = {
+                # Drop the "<owner>-<repo>-<sha>/" root directory.
+                member.name.partition("/")[2]: member
+                for member in tar.getmembers() if member.isfile()
+            }
+
+            def read(path: str) -> str:
+                content = tar.extractfile(members[path]).read()
+                return content.decode("utf-8", errors="replace")
+
+            selected = self.file_filter.select(
+                [
+                    {"path": path, "size": member.size}
+                    for path, member in members.items()
+                ],
+                read(".gitattributes") if ".gitattributes" in members else None
+            )
+            # One member in memory at a time, the rest spills to disk.
+            files = SpooledFileList(
+                max_bytes=self.file_filter.max_total_size,
+                max_memory_bytes=self.max_memory_bytes,
+            )
+            for entry in selected:
+                content = read(entry["path"])
+                if not is_binary(content):
+                    files.append(File(name=entry["path"], content=content))
+
+        return len(members), files
+
     async def parse(self, response: GitHubResponse) -> FileList:
         files = []
 
@@ -1,14 +1,32 @@
+import asyncio
 import httpx
+import json
 import logging
+import typing as t
 
+from app.batch import CompletionBatcher, LocalBatchBackend
 from app.exceptions import OpenAIServiceError
 from app.logger import get_logger
+from app.metrics import PROMPT_TOKENS, STAGE_DURATION
 
 from app.services.github_service import FileList
-from app.configs import OpenAIConfig
-from app.interceptors import LoggingInterceptor, RetryInterceptor
+from app.configs import OpenAIConfig, ResilienceConfig
+from app.prompt import PromptBuilder, PromptChunk, estimate_tokens
+from app.interceptors import (
+    AdaptiveConcurrencyInterceptor,
+    CircuitBreakerInterceptor,
+    ConcurrencyLimitInterceptor,
+    LoggingInterceptor,
+    MetricsInterceptor,
+    OpenAIKeySchedulerInterceptor,
+    RetryInterceptor,
+    TracingInterceptor,
+)
+from app.interceptors.openai_key_scheduler import TOKENS_EXTENSION
 from app.interceptors.retry_strategies import DefaultRetryStrategy
+from app.rate_limit import OpenAIKeyScheduler
 from app.services import BaseService
+from app.tracing import tracer
 
 from app.http_client import HttpClientWithInterceptors
 
@@ -19,7 +37,14 @@ logger = logging.getLogger(__name__)
 class OpenAIService(BaseService):
     CONFIG = OpenAIConfig
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        client: httpx.AsyncClient | None = None,
+        batch: bool = False,
+        scheduler: OpenAIKeyScheduler | None = None,
+        semaphore: asyncio.Semaphore | None = None
+    ):
         super().__init__()
         self.api_key = api_key
         self.headers = {
@@ -27,15 +52,39 @@ class OpenAIService(BaseService):
             "Content-Type": "application/json"
         }
         self.logger = get_logger(__name__)
-        self.http_client = HttpClientWithInterceptors([
+        # Shared by every review made with this service, and with other
+        # services that are handed the same one.
+        self.semaphore = semaphore or asyncio.Semaphore(
+            self.CONFIG.MAX_CONCURRENT_REQUESTS
+        )
+        interceptors = [
             LoggingInterceptor(),
+            TracingInterceptor(),
             RetryInterceptor(
                 strategy=DefaultRetryStrategy(
                     max_retries=self.CONFIG.MAX_RETRIES,
                     backoff_factor=self.CONFIG.BACKOFF_FACTOR
                 ),
-            )
-        ])
+            ),
+        ]
+        if scheduler is not None:
+            # Inside the retries, every attempt counts against a quota.
+            interceptors.append(OpenAIKeySchedulerInterceptor(scheduler))
+        # After the key scheduler and retry backoff, only requests actually
+        # in flight hold a slot.
+        interceptors.append(ConcurrencyLimitInterceptor(self.semaphore))
+        interceptors.append(CircuitBreakerInterceptor())
+        if ResilienceConfig.ADAPTIVE_CONCURRENCY:
+            interceptors.append(AdaptiveConcurrencyInterceptor())
+        interceptors.append(MetricsInterceptor())
+        self.http_client = HttpClientWithInterceptors(
+            interceptors, client=client
+        )
+        # Completions are collected into jobs in the Batch API format.
+        self.batcher = (
+            CompletionBatcher(LocalBatchBackend(self._send)) if batch
+            else None
+        )
 
     async def execute(
         self,
@@ -43,24 +92,208 @@ class OpenAIService(BaseService):
         files: FileList,
         candidate_level: str
     ) -> str:
-        prompt = self._generate_prompt(description, files, candidate_level)
+        prompt = await self._build_final_prompt(
+            description, files, candidate_level
+        )
+        return await self._complete(prompt)
+
+    async def execute_stream(
+        self,
+        description: str,
+        files: FileList,
+        candidate_level: str
+    ) -> t.AsyncIterator[str]:
+        """Yields the review as content deltas while it is generated."""
+        prompt = await self._build_final_prompt(
+            description, files, candidate_level
+        )
+        async for delta in self._stream_completion(prompt):
+            yield delta
+
+    async def _build_final_prompt(
+        self,
+        description: str,
+        files: FileList,
+        candidate_level: str
+    ) -> str:
+        """
+        Returns the prompt of the last completion: the whole review for a
+        repository that fits the budget, otherwise the reduce step over
+        concurrently reviewed chunks.
+        """
         self.logger.info(
             f"Starting analysis for candidate level: {candidate_level}"
         )
 
+        chunks = self.pack(description, files)
+        if len(chunks) == 1:
+            return self._generate_prompt(description, files, candidate_level)
+
+        # Map: review every chunk on its own, then reduce into one review.
+        self.logger.info(f"Reviewing {len(chunks)} chunks")
+        reviews = await self.review_chunks(
+            description, chunks, candidate_level
+        )
+        return await self._build_reduce_prompt(
+            description, reviews, candidate_level
+        )
+
+    def pack(self, description: str, files: FileList) -> list[PromptChunk]:
+        with STAGE_DURATION.time(stage="prompt_build"):
+            builder = PromptBuilder(
+                self.CONFIG.MAX_PROMPT_TOKENS - estimate_tokens(description)
+            )
+            return builder.pack(files)
+
+    async def review_chunks(
+        self,
+        description: str,
+        chunks: list[PromptChunk],
+        candidate_level: str,
+        total: int | None = None
+    ) -> list[str]:
+        """
+        Reviews chunks concurrently. `total` is the number of parts of the
+        whole repository when only the last ones are (re)reviewed.
+        """
+        total = total or len(chunks)
+        if total == 1:
+            return [await self._complete(self._generate_prompt(
+                description, chunks[0].files, candidate_level
+            ))]
+
+        start = total - len(chunks) + 1
+        # Chunk prompts are only built once they can be sent.
+        slots = asyncio.Semaphore(self.CONFIG.CHUNK_CONCURRENCY)
+
+        async def review(index: int, chunk: PromptChunk) -> str:
+            async with slots:
+                return await self._complete(self._generate_chunk_prompt(
+                    description, chunk, index, total, candidate_level
+                ))
+
+        return list(await asyncio.gather(*(
+            review(index, chunk)
+            for index, chunk in enumerate(chunks, start=start)
+        )))
+
+    async def merge_reviews(
+        self,
+        description: str,
+        reviews: list[str],
+        candidate_level: str
+    ) -> str:
+        if len(reviews) == 1:
+            return reviews[0]
+        return await self._reduce(description, reviews, candidate_level)
+
+    async def _build_reduce_prompt(
+        self,
+        description: str,
+        reviews: list[str],
+        candidate_level: str
+    ) -> str:
+        prompt = self._generate_reduce_prompt(
+            description, reviews, candidate_level
+        )
+        if len(reviews) > 1 and (
+            estimate_tokens(prompt) > self.CONFIG.MAX_PROMPT_TOKENS
+        ):
+            # Too many partial reviews for one call, reduce them in halves.
+            half = len(reviews) // 2
+            reviews = await asyncio.gather(
+                self._reduce(description, reviews[:half], candidate_level),
+                self._reduce(description, reviews[half:], candidate_level),
+            )
+            prompt = self._generate_reduce_prompt(
+                description, reviews, candidate_level
+            )
+        return prompt
+
+    async def _reduce(
+        self,
+        description: str,
+        reviews: list[str],
+        candidate_level: str
+    ) -> str:
+        return await self._complete(await self._build_reduce_prompt(
+            description, reviews, candidate_level
+        ))
+
+    def _body(self, prompt: str, stream: bool = False) -> dict:
         data = {
             "model": self.CONFIG.MODEL,
             "messages": [{"role": "user", "content": prompt}]
         }
+        if stream:
+            data["stream"] = True
+        return data
 
-        request = httpx.Request(
+    @staticmethod
+    def _estimate(prompt: str) -> int:
+        tokens = estimate_tokens(prompt)
+        PROMPT_TOKENS.observe(tokens)
+        return tokens
+
+    def _request(
+        self,
+        body: dict,
+        tokens: int | None = None
+    ) -> httpx.Request:
+        return httpx.Request(
             method="POST",
             url=self.CONFIG.API_URL,
             headers=self.headers,
-            json=data
+            json=body,
+            # Spares the key scheduler estimating the prompt again.
+            extensions={TOKENS_EXTENSION: tokens} if tokens else None,
         )
-        response = await self.http_client.send(request)
-        return self.parse(response.json())
+
+    async def _send(
+        self,
+        body: dict,
+        tokens: int | None = None
+    ) -> httpx.Response:
+        return await self.http_client.send(self._request(body, tokens))
+
+    async def _complete(self, prompt: str) -> str:
+        with tracer.start_span("openai.completion") as span:
+            tokens = self._estimate(prompt)
+            if self.batcher is not None:
+                data = await self.batcher.complete(self._body(prompt))
+            else:
+                data = (await self._send(self._body(prompt), tokens)).json()
+            for name, value in data.get("usage", {}).items():
+                span.set_attribute(f"usage.{name}", value)
+            return self.parse(data)
+
+    async def _stream_completion(self, prompt: str) -> t.AsyncIterator[str]:
+        response = await self.http_client.send(
+            self._request(
+                self._body(prompt, stream=True), self._estimate(prompt)
+            ),
+            stream=True
+        )
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                raise OpenAIServiceError(
+                    f"OpenAI API error: {response.status_code}"
+                    f" - {response.text}"
+                )
+
+            # Server-sent events, one "data: {json}" line per delta.
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line.removeprefix("data:").strip()
+                if payload == "[DONE]":
+                    break
+                delta = self.parse_delta(json.loads(payload))
+                if delta:
+                    yield delta
+        finally:
+            await response.aclose()
 
     def _generate_prompt(
         self,
@@ -76,6 +309,37 @@ class OpenAIService(BaseService):
         Review the code based on best practices, issues, and areas for improvement.
         """
 
+    def _generate_chunk_prompt(
+        self,
+        description: str,
+        chunk: PromptChunk,
+        index: int,
+        total: int,
+        candidate_level: str
+    ) -> str:
+        return f"""
+        Assignment: {description}
+        Candidate Level: {candidate_level}
+        This is part {index} of {total} of the repository.
+        Files: 
+        {''.join([f"Filename: {file.name}\nContent:\n{file.content}...\n\n" for file in chunk.files])}
+        Review this part of the code based on best practices, issues, and areas for improvement.
+        """
+
+    def _generate_reduce_prompt(
+        self,
+        description: str,
+        reviews: list[str],
+        candidate_level: str
+    ) -> str:
+        return f"""
+        Assignment: {description}
+        Candidate Level: {candidate_level}
+        Partial reviews: 
+        {''.join([f"Part {index}:\n{review}\n\n" for index, review in enumerate(reviews, start=1)])}
+        Merge the partial reviews of the repository parts into a single review.
+        """
+
     @staticmethod
     def parse(response: dict):
         try:
@@ -84,3 +348,12 @@ class OpenAIService(BaseService):
             raise OpenAIServiceError(
                 f"Invalid OpenAI API response structure: {e}"
             )
+
+    @staticmethod
+    def parse_delta(chunk: dict) -> str | None:
+        try:
+            return chunk["choices"][0]["delta"].get("content")
+        except (KeyError, IndexError) as e:
+            raise OpenAIServiceError(
+                f"Invalid OpenAI API stream chunk structure: {e}"
+            )
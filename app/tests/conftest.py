@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import io
+import json
+import tarfile
+
+import httpx
+import pytest
+
+from ..configs import GitHubConfig
+from ..services.github_service import git_blob_sha
+
+
+class FakeGitHub:
+    """In-process stand-in for the GitHub REST API used by GitHubService."""
+
+    def __init__(self, files: dict[str, str], latency: float = 0.0):
+        self.files = files
+        self.latency = latency
+        self.calls: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.not_modified = 0
+        self.snapshots: dict[str, dict[str, str]] = {}
+        self.commit()
+
+    def commit(self) -> str:
+        """Records the current files as the new HEAD commit."""
+        self.head = hashlib.sha1(
+            json.dumps(self.files, sort_keys=True).encode()
+        ).hexdigest()
+        self.snapshots[self.head] = dict(self.files)
+        return self.head
+
+    def sha(self, path: str) -> str:
+        if path in self.files:
+            return git_blob_sha(self.files[path])
+        return hashlib.sha1(path.encode()).hexdigest()
+
+    def _compare(self, base: str) -> list[dict]:
+        before, after = self.snapshots[base], self.files
+        changed = []
+        for path in sorted(before.keys() | after.keys()):
+            if path not in after:
+                status = "removed"
+            elif path not in before:
+                status = "added"
+            elif before[path] != after[path]:
+                status = "modified"
+            else:
+                continue
+            changed.append({
+                "filename": path,
+                "status": status,
+                "sha": git_blob_sha(after.get(path, before.get(path))),
+            })
+        return changed
+
+    def _listing(self, directory: str) -> list[dict]:
+        prefix = f"{directory}/" if directory else ""
+        entries: dict[str, dict] = {}
+        for path, content in self.files.items():
+            if not path.startswith(prefix):
+                continue
+            head, _, rest = path[len(prefix):].partition("/")
+            full_path = f"{prefix}{head}"
+            entries[full_path] = {
+                "type": "dir" if rest else "file",
+                "path": full_path,
+                "sha": self.sha(full_path),
+                "size": 0 if rest else len(content.encode()),
+                "url": (
+                    f"{GitHubConfig.API_URL}/repos/fake/repo/contents/"
+                    f"{full_path}"
+                ),
+                "download_url": (
+                    None if rest else f"https://raw.fake/{full_path}"
+                ),
+            }
+        return [entries[path] for path in sorted(entries)]
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.url.path)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return self._conditional(request, self.route(request))
+        finally:
+            self.in_flight -= 1
+
+    def _conditional(
+        self,
+        request: httpx.Request,
+        response: httpx.Response
+    ) -> httpx.Response:
+        # Like GitHub, API responses carry an ETag and can be revalidated.
+        if request.url.host == "raw.fake" or response.status_code != 200:
+            return response
+        etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return httpx.Response(304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return response
+
+    def _tree(self) -> dict:
+        blobs = [
+            {
+                "path": path,
+                "mode": "100644",
+                "type": "blob",
+                "sha": self.sha(path),
+                "size": len(content.encode()),
+                "url": (
+                    f"{GitHubConfig.API_URL}/repos/fake/repo/git/blobs/"
+                    f"{self.sha(path)}"
+                ),
+            }
+            for path, content in self.files.items()
+        ]
+        return {"sha": "HEAD", "tree": blobs, "truncated": False}
+
+    def _tarball(self) -> bytes:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for path, content in self.files.items():
+                data = content.encode()
+                info = tarfile.TarInfo(f"fake-repo-abc123/{path}")
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+
+    def route(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.url.host == "raw.fake":
+            return httpx.Response(200, text=self.files[path.lstrip("/")])
+        if request.url.host == "codeload.fake":
+            return httpx.Response(200, content=self._tarball())
+
+        if path == "/repos/fake/repo/git/trees/HEAD":
+            return httpx.Response(200, json=self._tree())
+        if path.startswith("/repos/fake/repo/git/blobs/"):
+            by_sha = {self.sha(name): name for name in self.files}
+            return httpx.Response(
+                200, text=self.files[by_sha[path.rsplit("/", 1)[1]]]
+            )
+        if path == "/repos/fake/repo/commits/HEAD":
+            return httpx.Response(200, json={"sha": self.head})
+        if path.startswith("/repos/fake/repo/compare/"):
+            base, _, _ = path.rsplit("/", 1)[1].partition("...")
+            if base not in self.snapshots:
+                return httpx.Response(404, json={"message": "Not Found"})
+            return httpx.Response(200, json={"files": self._compare(base)})
+        if path == "/repos/fake/repo/tarball":
+            return httpx.Response(
+                302, headers={"Location": "https://codeload.fake/fake/repo"}
+            )
+
+        contents_prefix = "/repos/fake/repo/contents"
+        if path.startswith(contents_prefix):
+            return httpx.Response(
+                200,
+                json=self._listing(path[len(contents_prefix):].strip("/"))
+            )
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture
+def fake_github() -> FakeGitHub:
+    return FakeGitHub(
+        {
+            "README.md": "# Fake",
+            "main.py": "print('hello')",
+            "pkg/__init__.py": "",
+            "pkg/core.py": "def core(): pass",
+            "pkg/sub/util.py": "def util(): pass",
+            "tests/test_core.py": "def test(): pass",
+        },
+        latency=0.01,
+    )
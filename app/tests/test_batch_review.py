@@ -0,0 +1,184 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from ..batch import (
+    CompletionBatcher,
+    LocalBatchBackend,
+    batch_input,
+    parse_batch_output,
+)
+from ..enums import JobStatus
+from ..exceptions import UseCaseException
+from ..main import app, get_batch_review_usecase
+from ..models import ReviewRequest, ReviewResponse
+from ..services import OpenAIService
+from ..usecase import BatchReviewUseCase
+from .test_openai_service import FakeChatCompletions, make_files
+
+
+class StubReviewUseCase:
+    def __init__(self, delays: dict[str, float] | None = None):
+        self.delays = delays or {}
+        self.reviewed: list[str] = []
+
+    async def execute(self, repo_url, description, candidate_level):
+        self.reviewed.append(repo_url)
+        await asyncio.sleep(self.delays.get(repo_url, 0))
+        if repo_url.endswith("missing"):
+            raise UseCaseException(
+                status_code=404, detail="No files found in repository."
+            )
+        return ReviewResponse(review=f"Review of {repo_url}", files=[])
+
+
+def review_request(repo: str, **kwargs) -> ReviewRequest:
+    return ReviewRequest(
+        github_repo_url=f"https://github.com/example/{repo}",
+        assignment_description=kwargs.pop("description", "Task"),
+        candidate_level="Junior",
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_reviews_duplicates_once():
+    stub = StubReviewUseCase()
+    requests = [
+        review_request("repo"),
+        review_request("other"),
+        review_request("Repo"),
+    ]
+
+    results = [
+        result async for result in BatchReviewUseCase(stub).execute(requests)
+    ]
+
+    assert sorted(stub.reviewed) == [
+        "https://github.com/example/other",
+        "https://github.com/example/repo",
+    ]
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    duplicate = next(result for result in results if result.index == 2)
+    assert duplicate.github_repo_url == "https://github.com/example/Repo"
+    assert duplicate.result.review == (
+        "Review of https://github.com/example/repo"
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_yields_results_as_they_complete():
+    stub = StubReviewUseCase(delays={"https://github.com/example/slow": 0.05})
+    requests = [review_request("slow"), review_request("missing")]
+
+    results = [
+        result async for result in BatchReviewUseCase(stub).execute(requests)
+    ]
+
+    assert [result.index for result in results] == [1, 0]
+    assert results[0].status is JobStatus.FAILED
+    assert "No files found" in results[0].error
+    assert results[1].status is JobStatus.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_batch_groups_requests_by_assignment():
+    stub = StubReviewUseCase()
+    requests = [
+        review_request("a", description="Task B"),
+        review_request("b", description="Task A"),
+        review_request("c", description="Task B"),
+    ]
+
+    [_ async for _ in BatchReviewUseCase(stub, 1).execute(requests)]
+
+    assert stub.reviewed == [
+        "https://github.com/example/b",
+        "https://github.com/example/a",
+        "https://github.com/example/c",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_review_batch_endpoint_streams_json_lines():
+    app.dependency_overrides[get_batch_review_usecase] = (
+        lambda: BatchReviewUseCase(StubReviewUseCase())
+    )
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post("/review/batch", json={
+                "reviews": [
+                    review_request(repo).model_dump(mode="json")
+                    for repo in ("one", "two")
+                ]
+            })
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert {line["status"] for line in lines} == {"completed"}
+
+
+def test_batch_input_round_trips_through_output_format():
+    lines = [
+        json.loads(line)
+        for line in batch_input({"request-1": {"model": "m"}}).splitlines()
+    ]
+
+    assert lines == [{
+        "custom_id": "request-1",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": "m"},
+    }]
+    assert parse_batch_output(
+        '{"custom_id": "request-1", "error": null}\n'
+    ) == {"request-1": {"custom_id": "request-1", "error": None}}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_completions_run_as_one_batch():
+    bodies = []
+
+    async def send(body: dict) -> httpx.Response:
+        bodies.append(body)
+        return httpx.Response(200, json={"echo": body["n"]})
+
+    backend = LocalBatchBackend(send)
+    runs = []
+    run = backend.run
+
+    async def counting_run(input_file: str) -> str:
+        runs.append(input_file)
+        return await run(input_file)
+
+    backend.run = counting_run
+    batcher = CompletionBatcher(backend, max_wait=0.01)
+
+    results = await asyncio.gather(
+        *(batcher.complete({"n": n}) for n in range(3))
+    )
+
+    assert results == [{"echo": 0}, {"echo": 1}, {"echo": 2}]
+    assert len(runs) == 1
+    assert len(bodies) == 3
+
+
+@pytest.mark.asyncio
+async def test_openai_service_reviews_through_batch_api():
+    stub = FakeChatCompletions()
+
+    async with stub.client() as client:
+        service = OpenAIService(api_key="fake_key", client=client, batch=True)
+        service.batcher.max_wait = 0.01
+        review = await service.execute("Task", make_files(2), "Junior")
+
+    assert review == "Review #1"
+    assert len(stub.prompts) == 1
@@ -1,17 +1,342 @@
-from app.cache import redis_cache
+import asyncio
+import json
+import time
 
+import fakeredis
+import pytest
 
-async def test_redis_cache_decorator(mocker):
+from app.cache import (
+    BlobCache,
+    CachedReview,
+    LRUByteCache,
+    ModelCodec,
+    ReviewResultCache,
+    SingleFlight,
+)
+from app.models import ReviewResponse
+from app.services import GitHubService, OpenAIService
+from app.usecase import CodeReviewUseCase
 
-    @redis_cache(ttl=60)
-    async def some_cached_function(arg1, /, *, kwarg1=""):
-        return arg1
+from app.tests.test_openai_service import FakeChatCompletions
 
-    mock_redis = mocker.patch("app.main.redis_client")
-    mock_redis.get.return_value = None
-    mock_redis.set.return_value = None
 
-    result = await some_cached_function("arg1", kwarg1="value")
+@pytest.fixture
+def fake_redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
 
-    assert result == "arg1"
-    mock_redis.set.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_misses(fake_redis):
+    calls = 0
+
+    async def review():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"review": "ok"}
+
+    single_flight = SingleFlight()
+    results = await asyncio.gather(*(
+        single_flight.do(fake_redis, "review", review, 60) for _ in range(5)
+    ))
+
+    assert calls == 1
+    assert results == [{"review": "ok"}] * 5
+    assert json.loads(await fake_redis.get("review")) == {"review": "ok"}
+    assert await fake_redis.keys("review:lock") == []
+
+
+@pytest.mark.asyncio
+async def test_single_flight_waits_for_other_worker(fake_redis, mocker):
+    compute = mocker.AsyncMock(return_value={"review": "mine"})
+    # Another worker already holds the lock for this key.
+    await fake_redis.set("review:lock", "other-worker")
+
+    waiter = asyncio.create_task(
+        SingleFlight().do(fake_redis, "review", compute, 60)
+    )
+    while (await fake_redis.pubsub_numsub("review:done"))[0][1] == 0:
+        await asyncio.sleep(0.01)
+
+    await fake_redis.publish("review:done", json.dumps({"review": "theirs"}))
+
+    assert await waiter == {"review": "theirs"}
+    compute.assert_not_awaited()
+
+
+async def compute_slowly(result: str) -> str:
+    await asyncio.sleep(10)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_over_to_other_workers(fake_redis):
+    leader_worker, other_worker = SingleFlight(), SingleFlight()
+    leader = asyncio.create_task(
+        leader_worker.do(fake_redis, "key", lambda: compute_slowly("a"), 60)
+    )
+    while not await fake_redis.exists("key:lock"):
+        await asyncio.sleep(0.01)
+
+    async def compute():
+        return "b"
+
+    follower = asyncio.create_task(
+        other_worker.do(fake_redis, "key", compute, 60)
+    )
+    while (await fake_redis.pubsub_numsub("key:done"))[0][1] == 0:
+        await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await asyncio.wait_for(follower, 1) == "b"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert not await fake_redis.exists("key:lock")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_its_followers(fake_redis):
+    flight = SingleFlight()
+    leader = asyncio.create_task(
+        flight.do(fake_redis, "key", lambda: compute_slowly("a"), 60)
+    )
+    await asyncio.sleep(0.01)
+
+    async def compute():
+        return "b"
+
+    follower = asyncio.create_task(flight.do(fake_redis, "key", compute, 60))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    # The follower takes over as the new leader.
+    assert await asyncio.wait_for(follower, 1) == "b"
+    assert await fake_redis.get("key") == '"b"'
+
+
+def test_lru_byte_cache_evicts_least_recently_used():
+    cache = LRUByteCache(max_bytes=10)
+    cache.set("a", "1234")
+    cache.set("b", "5678")
+    assert cache.get("a") == "1234"
+
+    cache.set("c", "90ab")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1234"
+    assert cache.size == 8
+    assert cache.stats.evictions == 1
+    assert cache.stats.evicted_bytes == 4
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_blob_cache_is_shared_through_redis(fake_redis):
+    await BlobCache(fake_redis).set("abc123", "print('hi')")
+
+    other_worker = BlobCache(fake_redis)
+
+    assert await other_worker.get("abc123") == "print('hi')"
+    assert await other_worker.get("missing") is None
+    assert other_worker.stats.hits == 1
+    assert other_worker.stats.misses == 1
+    assert len(other_worker.memory) == 1
+
+
+def test_review_cache_keys_ignore_trivial_differences():
+    cache = ReviewResultCache(None)
+    key = cache.key(
+        "https://github.com/Fake/Repo", "abc", "Build  a\nTODO app", "Junior"
+    )
+
+    assert key == cache.key(
+        "https://github.com/fake/repo", "abc", "build a todo app ", "Junior"
+    )
+    assert key != cache.key(
+        "https://github.com/fake/repo", "def", "Build a TODO app", "Junior"
+    )
+    assert key != cache.key(
+        "https://github.com/fake/repo", "abc", "Build a TODO app", "Senior"
+    )
+    assert key != ReviewResultCache(None, version="2").key(
+        "https://github.com/fake/repo", "abc", "Build a TODO app", "Junior"
+    )
+
+
+@pytest.mark.asyncio
+async def test_review_cache_serves_stale_results_while_refreshing(fake_redis):
+    cache = ReviewResultCache(fake_redis, level_ttls={"Junior": 0})
+    reviews = iter(["first", "second"])
+
+    async def compute():
+        return ReviewResponse(review=next(reviews), files=[])
+
+    first = await cache.get_or_compute("key", "Junior", compute)
+    stale = await cache.get_or_compute("key", "Junior", compute)
+    await asyncio.gather(*cache._refreshes)
+    refreshed = await cache.get_or_compute("key", "Junior", compute)
+
+    assert first.review == stale.review == "first"
+    assert refreshed.review == "second"
+    assert await fake_redis.ttl("key") == cache.stale_ttl
+
+
+@pytest.mark.asyncio
+async def test_refresh_waits_for_other_workers_new_result(fake_redis):
+    cache = ReviewResultCache(fake_redis, level_ttls={"Junior": 0})
+
+    async def compute():
+        return ReviewResponse(review="mine", files=[])
+
+    await cache.get_or_compute("key", "Junior", compute)
+    # Another worker is already refreshing the expired entry.
+    await fake_redis.set("key:lock", "other-worker")
+    stale = await cache.get_or_compute("key", "Junior", compute)
+    for _ in range(100):
+        if (await fake_redis.pubsub_numsub("key:done"))[0][1]:
+            break
+        await asyncio.sleep(0.01)
+
+    theirs = CachedReview(
+        result=ReviewResponse(review="theirs", files=[]),
+        stored_at=time.time(),
+        ttl=0,
+    )
+    await fake_redis.publish("key:done", cache.codec.encode(theirs))
+    await asyncio.gather(*cache._refreshes)
+
+    assert stale.review == "mine"
+    assert cache.memory.get("key").result.review == "theirs"
+
+
+@pytest.mark.asyncio
+async def test_review_is_cached_until_repository_changes(
+    fake_github, fake_redis
+):
+    stub = FakeChatCompletions()
+
+    async def review(description):
+        async with fake_github.client() as github, stub.client() as openai:
+            use_case = CodeReviewUseCase(
+                GitHubService(api_key="fake_key", client=github),
+                OpenAIService(api_key="fake_key", client=openai),
+                result_cache=ReviewResultCache(fake_redis),
+            )
+            return await use_case.execute(
+                repo_url="https://github.com/fake/repo",
+                description=description,
+                candidate_level="Junior",
+            )
+
+    first = await review("Build a TODO app")
+    second = await review("build a  TODO app")
+    fake_github.files["main.py"] += "\nprint('bye')"
+    fake_github.commit()
+    third = await review("Build a TODO app")
+
+    assert first == second
+    assert third.review != first.review
+    assert len(stub.prompts) == 2
+
+
+def test_model_codec_compresses_large_models():
+    codec = ModelCodec(ReviewResponse, compress_threshold=100)
+    small = ReviewResponse(review="Fine", files=["main.py"])
+    large = ReviewResponse(
+        review="Looks fine. " * 200,
+        files=[f"pkg/module_{index}.py" for index in range(100)],
+    )
+
+    assert codec.encode(small).startswith("j")
+    assert codec.encode(large).startswith("z")
+    assert len(codec.encode(large)) < len(large.model_dump_json()) / 4
+    assert codec.decode(codec.encode(small)) == small
+    assert codec.decode(codec.encode(large)) == large
+    with pytest.raises(ValueError):
+        codec.decode('{"review": "Fine", "files": []}')
+
+
+@pytest.mark.asyncio
+async def test_review_cache_serves_hot_entries_from_memory(
+    fake_redis, mocker
+):
+    cache = ReviewResultCache(fake_redis)
+    compute = mocker.AsyncMock(
+        return_value=ReviewResponse(review="Fine", files=["main.py"])
+    )
+    await cache.get_or_compute("key", "Junior", compute)
+
+    lookups = mocker.spy(fake_redis, "get")
+    hot = await cache.get_or_compute("key", "Junior", compute)
+    other_worker = await ReviewResultCache(fake_redis).get_or_compute(
+        "key", "Junior", compute
+    )
+
+    assert hot == other_worker == compute.return_value
+    assert isinstance(hot, ReviewResponse)
+    assert lookups.call_count == 1
+    compute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_replaced_review_is_dropped_from_other_workers(fake_redis):
+    first, second = (
+        ReviewResultCache(fake_redis, level_ttls={"Junior": 0})
+        for _ in range(2)
+    )
+    await first.start()
+    reviews = iter(["old", "new", "newer"])
+
+    async def compute():
+        return ReviewResponse(review=next(reviews), files=[])
+
+    try:
+        await first.get_or_compute("key", "Junior", compute)
+        await second.get_or_compute("key", "Junior", compute)
+        await asyncio.gather(*second._refreshes)
+        async with asyncio.timeout(1):
+            while first.memory.get("key") is not None:
+                await asyncio.sleep(0.01)
+        result = await first.get_or_compute("key", "Junior", compute)
+        await asyncio.gather(*first._refreshes)
+    finally:
+        await first.stop()
+
+    assert result.review == "new"
+    assert isinstance(first.memory.get("key"), CachedReview)
+
+
+@pytest.mark.asyncio
+async def test_only_replacing_leader_publishes_invalidation(
+    fake_redis, mocker
+):
+    cache = ReviewResultCache(fake_redis, level_ttls={"Junior": 0})
+    reviews = iter(["old", "new"])
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return ReviewResponse(review=next(reviews), files=[])
+
+    publish = mocker.spy(fake_redis, "publish")
+    encode = mocker.spy(cache.codec, "encode")
+    # A first computation, with concurrent followers in this process.
+    await asyncio.gather(*(
+        cache.get_or_compute("key", "Junior", compute) for _ in range(3)
+    ))
+    invalidations = [
+        call for call in publish.call_args_list
+        if call.args[0] == cache.INVALIDATION_CHANNEL
+    ]
+    assert invalidations == []
+    assert encode.call_count == 1
+
+    await cache.get_or_compute("key", "Junior", compute)
+    await asyncio.gather(*cache._refreshes)
+    invalidations = [
+        call for call in publish.call_args_list
+        if call.args[0] == cache.INVALIDATION_CHANNEL
+    ]
+    assert len(invalidations) == 1
+    assert encode.call_count == 2
+    assert cache.memory.get("key").result.review == "new"
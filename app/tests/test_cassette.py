@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from ..cassette import Cassette, RecordingTransport, ReplayTransport
+from ..configs import HttpClientConfig
+from ..exceptions import CassetteMissError
+from ..http_client import create_http_client
+
+
+async def slow_upstream(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(0.1)
+    if request.url.path == "/stream":
+        return httpx.Response(200, content=sse_events())
+    if request.headers.get("if-none-match") == '"abc"':
+        return httpx.Response(304, headers={"etag": '"abc"'})
+    return httpx.Response(
+        200,
+        headers={"etag": '"abc"'},
+        json={"path": request.url.path, "body": request.content.decode()},
+    )
+
+
+async def sse_events():
+    for index in range(3):
+        await asyncio.sleep(0.05)
+        yield f"data: {index}\n\n".encode()
+
+
+async def record(path: str) -> None:
+    transport = RecordingTransport(
+        Cassette(path), httpx.MockTransport(slow_upstream)
+    )
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://upstream:8001"
+    ) as client:
+        await client.get("/repos/example/repo", headers={"authorization": "x"})
+        await client.post("/chat", content=b"first")
+        async with client.stream("GET", "/stream") as response:
+            await response.aread()
+
+
+@pytest.mark.asyncio
+async def test_replay_serves_recorded_responses(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    await record(path)
+
+    async with httpx.AsyncClient(
+        transport=ReplayTransport(Cassette.load(path), latency_scale=0),
+        base_url="http://localhost:9999",
+    ) as client:
+        started = time.perf_counter()
+        repo = await client.get("/repos/example/repo")
+        chat = await client.post("/chat", content=b"first")
+        stream = await client.get("/stream")
+        elapsed = time.perf_counter() - started
+
+        with pytest.raises(CassetteMissError):
+            await client.post("/chat", content=b"second")
+
+    assert repo.headers["etag"] == '"abc"'
+    assert repo.json() == {"path": "/repos/example/repo", "body": ""}
+    assert chat.json()["body"] == "first"
+    assert stream.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    assert elapsed < 0.05
+    with open(path, "rb") as file:
+        assert b"authorization" not in file.read()
+
+
+@pytest.mark.asyncio
+async def test_replay_scales_recorded_latency(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    await record(path)
+    cassette = Cassette.load(path)
+
+    async with httpx.AsyncClient(
+        transport=ReplayTransport(cassette, latency_scale=0.5),
+        base_url="http://upstream:8001",
+    ) as client:
+        started = time.perf_counter()
+        async with client.stream("GET", "/stream") as response:
+            arrivals = [
+                time.perf_counter() - started
+                async for _ in response.aiter_raw()
+            ]
+
+    assert len(arrivals) == 3
+    # Recorded: headers after ~0.1s, then a chunk every ~0.05s.
+    assert 0.05 <= arrivals[0] < 0.1
+    assert arrivals[-1] - arrivals[0] >= 0.045
+
+
+@pytest.mark.asyncio
+async def test_replay_tells_revalidations_from_plain_requests(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    await record(path)
+    transport = RecordingTransport(
+        Cassette(path), httpx.MockTransport(slow_upstream)
+    )
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://upstream:8001"
+    ) as client:
+        await client.get(
+            "/repos/example/repo", headers={"if-none-match": '"abc"'}
+        )
+
+    async with httpx.AsyncClient(
+        transport=ReplayTransport(Cassette.load(path), latency_scale=0),
+        base_url="http://upstream:8001",
+    ) as client:
+        revalidated = await client.get(
+            "/repos/example/repo", headers={"if-none-match": '"abc"'}
+        )
+        fetched = await client.get("/repos/example/repo")
+
+    assert revalidated.status_code == 304
+    assert fetched.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_http_client_replays_from_configured_cassette(tmp_path, mocker):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    await record(path)
+    mocker.patch.object(HttpClientConfig, "CASSETTE_MODE", "replay")
+    mocker.patch.object(HttpClientConfig, "CASSETTE_PATH", path)
+    mocker.patch.object(HttpClientConfig, "CASSETTE_LATENCY_SCALE", 0.0)
+
+    async with create_http_client() as client:
+        response = await client.post("http://upstream/chat", content=b"first")
+
+    assert response.json()["body"] == "first"
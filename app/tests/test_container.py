@@ -0,0 +1,69 @@
+import fakeredis
+import httpx
+import pytest
+
+from ..configs import GitHubConfig, OpenAIConfig
+from ..container import ServiceContainer
+from ..main import get_batch_review_usecase, get_code_review_usecase
+
+
+def make_container(handler) -> ServiceContainer:
+    return ServiceContainer(
+        fakeredis.FakeAsyncRedis(decode_responses=True),
+        httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+@pytest.mark.asyncio
+async def test_requests_share_the_container_services():
+    services = make_container(lambda request: httpx.Response(200))
+
+    first = get_code_review_usecase(services)
+    second = get_code_review_usecase(services)
+    batch = get_batch_review_usecase(use_batch_api=True, services=services)
+
+    assert first is not second
+    assert first.github_service is second.github_service is services.github
+    assert first.openai_service is services.openai
+    assert batch.review.openai_service is services.openai_batch
+    assert services.openai_batch.batcher is not None
+    assert services.openai_batch.semaphore is services.openai.semaphore
+    await services.close()
+
+
+@pytest.mark.asyncio
+async def test_services_take_keys_from_config(mocker):
+    mocker.patch.object(GitHubConfig, "API_KEYS", ["gh-a", "gh-b"])
+    mocker.patch.object(OpenAIConfig, "API_KEYS", ["sk-a:org-a", "sk-b"])
+    services = make_container(lambda request: httpx.Response(200))
+
+    assert services.github.api_key == "gh-a"
+    assert services.openai.api_key == services.openai_batch.api_key == "sk-a"
+    assert [key.key for key in services.openai_scheduler.keys] == [
+        "sk-a", "sk-b"
+    ]
+    await services.close()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_connects_to_api_origins():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.host == "api.openai.com":
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(200)
+
+    services = make_container(handler)
+    await services.warm_up(connections=2)
+
+    assert sorted(
+        (request.method, str(request.url)) for request in requests
+    ) == [
+        ("HEAD", "https://api.github.com/"),
+        ("HEAD", "https://api.github.com/"),
+        ("HEAD", "https://api.openai.com/"),
+        ("HEAD", "https://api.openai.com/"),
+    ]
+    await services.close()
@@ -0,0 +1,147 @@
+import pytest
+
+from ..enums import GitHubFetchMode
+from ..filters import FileFilter, is_binary, parse_gitattributes
+from ..services.github_service import GitHubService
+
+
+def entry(path: str, size: int = 100) -> dict:
+    return {"path": path, "size": size}
+
+
+@pytest.mark.parametrize(
+    "path, size, excluded",
+    [
+        ("app/main.py", 100, False),
+        ("poetry.lock", 100, True),
+        ("frontend/package-lock.json", 100, True),
+        ("frontend/node_modules/react/index.js", 100, True),
+        ("static/app.min.js", 100, True),
+        ("docs/logo.png", 100, True),
+        ("app/big_fixture.py", 10_000_000, True),
+        ("app/builder.py", 100, False),
+        ("build/lib/app.py", 100, True),
+    ],
+)
+def test_file_filter_excludes_noise(path, size, excluded):
+    assert FileFilter().is_excluded(entry(path, size)) is excluded
+
+
+def test_gitattributes_generated_patterns_are_excluded():
+    gitattributes = (
+        "# comments and blank lines are ignored\n"
+        "\n"
+        "api/generated/** linguist-generated=true\n"
+        "*.gen.go linguist-generated\n"
+        "docs/** -linguist-generated\n"
+    )
+
+    assert parse_gitattributes(gitattributes) == [
+        "api/generated/**", "*.gen.go"
+    ]
+
+    selected = FileFilter().select(
+        [
+            entry("api/generated/client.py"),
+            entry("pkg/models.gen.go"),
+            entry("docs/index.md"),
+            entry("main.py"),
+        ],
+        gitattributes,
+    )
+    assert [item["path"] for item in selected] == ["main.py", "docs/index.md"]
+
+
+def test_file_filter_ranks_and_caps_files():
+    selected = FileFilter(max_files=3).select([
+        entry("tests/test_app.py"),
+        entry("setup.cfg"),
+        entry("src/service/core.py"),
+        entry("main.py"),
+        entry("README.md"),
+    ])
+
+    assert [item["path"] for item in selected] == [
+        "main.py", "README.md", "src/service/core.py"
+    ]
+
+
+def test_file_filter_caps_total_size():
+    selected = FileFilter(max_total_size=250).select([
+        entry("main.py", 100),
+        entry("README.md", 200),
+        entry("src/core.py", 100),
+        entry("tests/test_core.py", 100),
+    ])
+
+    # The README no longer fits, smaller files after it still do.
+    assert [item["path"] for item in selected] == [
+        "main.py", "src/core.py"
+    ]
+
+
+def test_is_binary():
+    assert is_binary("GIF89a\x00\x01")
+    assert not is_binary("print('hello')")
+
+
+@pytest.mark.parametrize(
+    "fetch_mode",
+    [
+        GitHubFetchMode.CONTENTS,
+        GitHubFetchMode.TREES,
+        GitHubFetchMode.TARBALL,
+    ],
+)
+@pytest.mark.asyncio
+async def test_excluded_files_are_never_downloaded(fake_github, fetch_mode):
+    fake_github.files.update({
+        "poetry.lock": "[[package]]",
+        "node_modules/left-pad/index.js": "module.exports = 1",
+        "gen/api.py": "# generated",
+        ".gitattributes": "gen/** linguist-generated\n",
+        "logo.dat": "PNG\x00\x00",
+    })
+
+    async with fake_github.client() as client:
+        service = GitHubService(
+            api_key="fake_key", client=client, fetch_mode=fetch_mode
+        )
+        files = await service.execute("https://github.com/fake/repo")
+
+    assert files.names == [
+        "main.py",
+        "pkg/__init__.py",
+        "pkg/core.py",
+        "README.md",
+        "pkg/sub/util.py",
+        "tests/test_core.py",
+    ]
+    # The six reviewed files plus .gitattributes and the sniffed binary.
+    downloads = [
+        call for call in fake_github.calls
+        if "/contents" not in call and "/trees/" not in call
+    ]
+    assert len(downloads) == (2 if fetch_mode is GitHubFetchMode.TARBALL else 8)
+
+
+@pytest.mark.asyncio
+async def test_excluded_directories_are_never_listed(fake_github):
+    fake_github.files.update({
+        "node_modules/left-pad/index.js": "module.exports = 1",
+        "web/build/lib/bundle.js": "var a = 1",
+    })
+
+    async with fake_github.client() as client:
+        service = GitHubService(
+            api_key="fake_key",
+            client=client,
+            fetch_mode=GitHubFetchMode.CONTENTS,
+        )
+        files = await service.execute("https://github.com/fake/repo")
+
+    assert "web/build/lib/bundle.js" not in files.names
+    listed = [call for call in fake_github.calls if "/contents" in call]
+    assert listed and not any(
+        "node_modules" in call or "/build" in call for call in listed
+    )
@@ -160,25 +160,29 @@ async def test_openai_service_generate_review(mocker):
         ),
         candidate_level="Junior",
     )
-@pytest.mark.parametrize(
-    "attempt, expected_retry, expected_delay",
-    [
-        (1, True, 1),
-        (2, True, 2),
-        (3, True, 4),
-        (4, False, 0),
-    ],
-)
 
-async def test_exponential_backoff_strategy(mocker, attempt, expected_retry, expected_delay):
-    strategy = DefaultRetryStrategy(max_retries=3)
 
-    mock_response = mocker.Mock()
+@pytest.mark.parametrize("max_retries", [1, 3])
+@pytest.mark.asyncio
+async def test_exponential_backoff_strategy(max_retries):
+    strategy = DefaultRetryStrategy(
+        max_retries=max_retries, base_delay=1, max_delay=10
+    )
+    request = httpx.Request("GET", "https://example.com/")
+    response = httpx.Response(503, request=request)
 
-    retry, delay = await strategy.should_retry(mock_response, attempt)
+    previous = strategy.base_delay
+    for attempt in range(max_retries):
+        retry, delay = await strategy.should_retry(response, attempt)
+
+        # Drawn between the base delay and a multiple of the previous one.
+        assert retry is True
+        assert strategy.base_delay <= delay <= min(
+            strategy.max_delay, previous * strategy.backoff_factor
+        )
+        previous = delay
 
-    assert retry == expected_retry
-    assert delay == expected_delay
+    assert await strategy.should_retry(response, max_retries) == (False, 0)
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,208 @@
+import fakeredis
+import pytest
+
+from ..cache import BlobCache, HttpResponseCache
+from ..enums import GitHubFetchMode
+from ..services.github_service import (
+    File,
+    GitHubService,
+    SpilledFile,
+    SpooledFileList,
+)
+from ..usecase import observe_files
+
+RANKED_FILES = [
+    "main.py",
+    "pkg/__init__.py",
+    "pkg/core.py",
+    "README.md",
+    "pkg/sub/util.py",
+    "tests/test_core.py",
+]
+
+
+@pytest.mark.asyncio
+async def test_fetch_returns_files_ranked_by_importance(fake_github):
+    async with fake_github.client() as client:
+        service = GitHubService(api_key="fake_key", client=client)
+        files = await service.execute("https://github.com/fake/repo")
+
+    assert files.names == RANKED_FILES
+    assert files[-1].content == "def test(): pass"
+
+
+@pytest.mark.parametrize("fetch_mode", list(GitHubFetchMode))
+@pytest.mark.asyncio
+async def test_fetch_spills_contents_beyond_memory_limit(
+    fake_github, mocker, fetch_mode
+):
+    async with fake_github.client() as client:
+        service = GitHubService(
+            api_key="fake_key",
+            client=client,
+            fetch_mode=fetch_mode,
+            max_memory_bytes=0,
+        )
+        files = await service.execute("https://github.com/fake/repo")
+
+    assert files.names == RANKED_FILES
+    assert all(
+        isinstance(file, SpilledFile) for file in files if file.content
+    )
+    assert files[-1].content == "def test(): pass"
+
+    content = mocker.patch.object(
+        SpilledFile, "content", new_callable=mocker.PropertyMock
+    )
+    observe_files(files)
+    # The byte count is kept while spilling, nothing is read back.
+    content.assert_not_called()
+    assert files.size == sum(
+        len(fake_github.files[name].encode()) for name in RANKED_FILES
+    )
+    files.close()
+
+
+def test_spooled_file_list_caps_size():
+    files = SpooledFileList(
+        [File("a.py", "a" * 4), File("b.py", "b" * 4), File("c.py", "c" * 4)],
+        max_bytes=10,
+        max_memory_bytes=4,
+    )
+
+    assert files.names == ["a.py", "b.py"]
+    assert files.skipped == ["c.py"]
+    assert not isinstance(files[0], SpilledFile)
+    assert isinstance(files[1], SpilledFile)
+    assert files[1].content == "bbbb"
+    files.close()
+
+
+@pytest.mark.asyncio
+async def test_fetch_bounds_in_flight_requests(fake_github):
+    fake_github.files.update(
+        {f"bulk/file_{index}.py": "x = 1" for index in range(30)}
+    )
+
+    async with fake_github.client() as client:
+        service = GitHubService(
+            api_key="fake_key", client=client, max_concurrency=4
+        )
+        files = await service.execute("https://github.com/fake/repo")
+
+    assert len(files) == 36
+    assert 1 < fake_github.max_in_flight <= 4
+
+
+@pytest.mark.parametrize(
+    "fetch_mode, expected_calls",
+    [
+        (GitHubFetchMode.CONTENTS, 10),
+        (GitHubFetchMode.TREES, 7),
+        (GitHubFetchMode.TARBALL, 2),
+    ],
+)
+@pytest.mark.asyncio
+async def test_fetch_modes_return_same_snapshot(
+    fake_github, fetch_mode, expected_calls
+):
+    async with fake_github.client() as client:
+        service = GitHubService(
+            api_key="fake_key", client=client, fetch_mode=fetch_mode
+        )
+        files = await service.execute("https://github.com/fake/repo")
+
+    assert files.names == RANKED_FILES
+    assert [file.content for file in files] == [
+        fake_github.files[name] for name in files.names
+    ]
+    assert len(fake_github.calls) == expected_calls
+
+
+@pytest.mark.parametrize(
+    "fetch_mode, expected_listing_calls",
+    [
+        (GitHubFetchMode.CONTENTS, 4),
+        (GitHubFetchMode.TREES, 1),
+    ],
+)
+@pytest.mark.asyncio
+async def test_unchanged_blobs_are_not_downloaded_twice(
+    fake_github, fetch_mode, expected_listing_calls
+):
+    blob_cache = BlobCache()
+
+    async with fake_github.client() as client:
+        service = GitHubService(
+            api_key="fake_key",
+            client=client,
+            fetch_mode=fetch_mode,
+            blob_cache=blob_cache,
+        )
+        first = await service.execute("https://github.com/fake/repo")
+        fake_github.calls.clear()
+        second = await service.execute("https://github.com/fake/repo")
+
+    assert first == second
+    assert len(fake_github.calls) == expected_listing_calls
+    assert blob_cache.stats.hits == len(second)
+    assert blob_cache.stats.misses == len(first)
+
+
+@pytest.mark.asyncio
+async def test_listings_are_revalidated_with_etags(fake_github):
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async with fake_github.client() as client:
+        first = await GitHubService(
+            api_key="fake_key",
+            client=client,
+            http_cache=HttpResponseCache(redis_client),
+        ).execute("https://github.com/fake/repo")
+        # A fresh memory tier, as in another worker sharing the same Redis.
+        http_cache = HttpResponseCache(redis_client)
+        second = await GitHubService(
+            api_key="fake_key",
+            client=client,
+            http_cache=http_cache,
+        ).execute("https://github.com/fake/repo")
+
+    assert first == second
+    assert fake_github.not_modified == 4
+    assert http_cache.stats.hits == 4
+
+
+@pytest.mark.asyncio
+async def test_http_cache_leaves_file_contents_to_blob_cache(fake_github):
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async with fake_github.client() as client:
+        for _ in range(2):
+            await GitHubService(
+                api_key="fake_key",
+                client=client,
+                fetch_mode=GitHubFetchMode.TREES,
+                http_cache=HttpResponseCache(redis_client),
+            ).execute("https://github.com/fake/repo")
+
+    # Only the tree listing was stored and revalidated, not the blobs.
+    assert fake_github.not_modified == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_reports_progress(fake_github):
+    events = []
+
+    async with fake_github.client() as client:
+        service = GitHubService(api_key="fake_key", client=client)
+        await service.execute(
+            "https://github.com/fake/repo",
+            on_progress=lambda event, data: events.append((event, data)),
+        )
+
+    assert events[0] == (
+        "files_discovered", {"listed": 6, "selected": RANKED_FILES}
+    )
+    assert sorted(data["name"] for _, data in events[1:]) == sorted(
+        RANKED_FILES
+    )
@@ -0,0 +1,54 @@
+import httpx
+import pytest
+
+from ..http_client import HttpClientWithInterceptors, create_http_client
+from ..interceptors import LoggingInterceptor, RetryInterceptor
+from ..interceptors.retry_strategies import DefaultRetryStrategy
+
+
+@pytest.mark.asyncio
+async def test_interceptors_share_app_client():
+    handled = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        handled.append(request.url)
+        return httpx.Response(200, text="ok")
+
+    client = create_http_client(transport=httpx.MockTransport(handler))
+    http_client = HttpClientWithInterceptors(
+        [LoggingInterceptor(), RetryInterceptor(DefaultRetryStrategy())],
+        client=client,
+    )
+
+    for _ in range(3):
+        response = await http_client.send(
+            httpx.Request("GET", "https://example.com/file")
+        )
+        assert response.status_code == 200
+
+    assert len(handled) == 3
+    assert not client.is_closed
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_retry_interceptor_resends_through_chain():
+    statuses = iter([500, 502, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses))
+
+    async with create_http_client(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        http_client = HttpClientWithInterceptors(
+            [RetryInterceptor(DefaultRetryStrategy(
+                max_retries=3, base_delay=0.01, max_delay=0.01
+            ))],
+            client=client,
+        )
+        response = await http_client.send(
+            httpx.Request("GET", "https://example.com/")
+        )
+
+    assert response.status_code == 200
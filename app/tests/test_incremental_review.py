@@ -0,0 +1,109 @@
+import fakeredis
+import pytest
+
+from ..configs import OpenAIConfig
+from ..review_state import ReviewStateStore
+from ..services import GitHubService, OpenAIService
+from ..usecase import CodeReviewUseCase
+from .test_openai_service import FakeChatCompletions
+
+REPO_URL = "https://github.com/fake/repo"
+
+
+@pytest.fixture
+def review(fake_github, monkeypatch):
+    # Every file gets a chunk of its own, the partial reviews fit into one.
+    for path in fake_github.files:
+        fake_github.files[path] = "\n".join(
+            f"value_{line} = compute({line})" for line in range(30)
+        ) + f"\n# {path}"
+    fake_github.commit()
+    monkeypatch.setattr(OpenAIConfig, "MAX_PROMPT_TOKENS", 300)
+    stub = FakeChatCompletions()
+    state = ReviewStateStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    async def run():
+        async with fake_github.client() as github, stub.client() as openai:
+            use_case = CodeReviewUseCase(
+                GitHubService(api_key="fake_key", client=github),
+                OpenAIService(api_key="fake_key", client=openai),
+                state,
+            )
+            return await use_case.execute_incremental(
+                repo_url=REPO_URL, description="Task", candidate_level="Junior"
+            )
+
+    run.stub = stub
+    return run
+
+
+@pytest.mark.asyncio
+async def test_unchanged_repository_is_not_reviewed_again(
+    fake_github, review
+):
+    first = await review()
+    assert len(review.stub.prompts) == len(first.files) + 1
+
+    fake_github.calls.clear()
+    review.stub.prompts.clear()
+    second = await review()
+
+    assert second == first
+    assert fake_github.calls == ["/repos/fake/repo/commits/HEAD"]
+    assert review.stub.prompts == []
+
+
+@pytest.mark.asyncio
+async def test_only_changed_files_are_fetched_and_reviewed(
+    fake_github, review
+):
+    first = await review()
+
+    base = fake_github.head
+    fake_github.files["pkg/core.py"] += "\nreturn 42"
+    fake_github.commit()
+    fake_github.calls.clear()
+    review.stub.prompts.clear()
+    second = await review()
+
+    assert second.files == first.files
+    assert fake_github.calls == [
+        "/repos/fake/repo/commits/HEAD",
+        f"/repos/fake/repo/compare/{base}...{fake_github.head}",
+        f"/repos/fake/repo/git/blobs/{fake_github.sha('pkg/core.py')}",
+    ]
+    # The changed chunk and the merge, reusing the other chunks' reviews.
+    chunk_prompt, merge_prompt = review.stub.prompts
+    assert "return 42" in chunk_prompt
+    assert f"Part {len(first.files)}:" in merge_prompt
+
+
+@pytest.mark.asyncio
+async def test_added_and_removed_files_update_the_review(fake_github, review):
+    await review()
+
+    del fake_github.files["tests/test_core.py"]
+    fake_github.files["pkg/extra.py"] = "def extra(): return 1"
+    fake_github.commit()
+    review.stub.prompts.clear()
+    result = await review()
+
+    assert "tests/test_core.py" not in result.files
+    assert result.files[-1] == "pkg/extra.py"
+    assert len(review.stub.prompts) == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_base_commit_falls_back_to_full_review(
+    fake_github, review
+):
+    first = await review()
+
+    fake_github.snapshots.clear()
+    fake_github.files["main.py"] += "\nprint('bye')"
+    fake_github.commit()
+    review.stub.prompts.clear()
+    second = await review()
+
+    assert second.files == first.files
+    assert len(review.stub.prompts) == len(first.files) + 1
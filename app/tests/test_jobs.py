@@ -0,0 +1,264 @@
+import asyncio
+import time
+
+import fakeredis
+import httpx
+import pydantic
+import pytest
+import redis.asyncio as redis
+
+from ..configs import JobQueueConfig
+from ..enums import JobStatus
+from ..jobs import JobQueue
+from ..main import app, get_job_queue
+from ..models import ReviewJobRequest, ReviewResponse
+from ..worker import ReviewWorker
+
+
+def job_request(repo: str, **kwargs) -> ReviewJobRequest:
+    return ReviewJobRequest(
+        github_repo_url=f"https://github.com/example/{repo}",
+        assignment_description="Task",
+        candidate_level="Junior",
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def queue() -> JobQueue:
+    return JobQueue(
+        fakeredis.FakeAsyncRedis(decode_responses=True),
+        max_retries=1,
+        retry_backoff=0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_jobs_are_dequeued_first(queue):
+    low = await queue.enqueue(job_request("low"))
+    first_normal = await queue.enqueue(job_request("a", priority=1))
+    second_normal = await queue.enqueue(job_request("b", priority=1))
+    urgent = await queue.enqueue(job_request("urgent", priority=5))
+
+    assert [await queue.dequeue() for _ in range(4)] == [
+        urgent.id, first_normal.id, second_normal.id, low.id
+    ]
+    assert (await queue.get(urgent.id)).status is JobStatus.RUNNING
+    assert await queue.dequeue(timeout=0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_worker_completes_job_and_calls_webhook(queue, mocker):
+    use_case = mocker.AsyncMock()
+    use_case.execute.return_value = ReviewResponse(
+        review="LGTM", files=["main.py"]
+    )
+    callbacks = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        callbacks.append(request)
+        return httpx.Response(204)
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        job = await queue.enqueue(
+            job_request("repo", callback_url="https://hooks.example/done")
+        )
+        worker = ReviewWorker(queue, use_case, client)
+        assert await worker.process_next()
+
+    finished = await queue.get(job.id)
+    assert finished.status is JobStatus.COMPLETED
+    assert finished.result == ReviewResponse(review="LGTM", files=["main.py"])
+    use_case.execute.assert_awaited_once_with(
+        repo_url="https://github.com/example/repo",
+        description="Task",
+        candidate_level="Junior",
+    )
+    assert str(callbacks[0].url) == "https://hooks.example/done"
+    assert b'"status":"completed"' in callbacks[0].content
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_then_fails_job(queue, mocker):
+    use_case = mocker.AsyncMock()
+    use_case.execute.side_effect = RuntimeError("GitHub is down")
+    job = await queue.enqueue(job_request("repo"))
+    worker = ReviewWorker(queue, use_case)
+
+    assert await worker.process_next()
+    assert (await queue.get(job.id)).status is JobStatus.QUEUED
+
+    assert await worker.process_next()
+    failed = await queue.get(job.id)
+    assert failed.status is JobStatus.FAILED
+    assert failed.attempts == 2
+    assert failed.error == "GitHub is down"
+    assert not await worker.process_next(timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_failed_job_waits_out_its_backoff(queue):
+    queue.retry_backoff = 0.1
+    job = await queue.enqueue(job_request("repo"))
+    assert await queue.dequeue() == job.id
+
+    assert await queue.fail(job.id, "GitHub is down")
+    assert (await queue.get(job.id)).status is JobStatus.QUEUED
+    assert await queue.dequeue(timeout=0.01) is None
+
+    await asyncio.sleep(0.1)
+    assert await queue.dequeue(timeout=0.01) == job.id
+
+
+@pytest.mark.asyncio
+async def test_job_of_crashed_worker_is_requeued(queue):
+    queue.lease_timeout = 0.05
+    job = await queue.enqueue(job_request("repo"))
+    # The worker dies right after taking the job.
+    assert await queue.dequeue() == job.id
+    assert await queue.requeue_expired() == []
+
+    await asyncio.sleep(0.05)
+    assert await queue.requeue_expired() == [job.id]
+    assert await queue.requeue_expired() == []
+    requeued = await queue.get(job.id)
+    assert requeued.status is JobStatus.QUEUED
+    assert requeued.error == "Worker lease expired"
+    assert await queue.dequeue(timeout=0.01) == job.id
+
+
+@pytest.mark.asyncio
+async def test_worker_renews_lease_of_long_job(queue, mocker):
+    queue.lease_timeout = 0.06
+
+    async def review(**kwargs) -> ReviewResponse:
+        await asyncio.sleep(0.2)
+        return ReviewResponse(review="LGTM", files=[])
+
+    use_case = mocker.AsyncMock()
+    use_case.execute.side_effect = review
+    job = await queue.enqueue(job_request("repo"))
+    worker = ReviewWorker(queue, use_case)
+
+    running = asyncio.create_task(worker.process_next())
+    started = time.monotonic()
+    while not running.done():
+        assert await queue.requeue_expired() == []
+        await asyncio.sleep(0.01)
+
+    assert time.monotonic() - started >= 0.2
+    assert (await queue.get(job.id)).status is JobStatus.COMPLETED
+    assert await queue.client.zcard(queue.PROCESSING_KEY) == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_keeps_running_through_redis_errors(queue, mocker):
+    mocker.patch("app.worker.ERROR_DELAY", 0)
+    stop = asyncio.Event()
+    outcomes = iter([redis.ConnectionError("down"), None])
+
+    async def process_next():
+        outcome = next(outcomes)
+        if outcome is not None:
+            raise outcome
+        stop.set()
+        return False
+
+    worker = ReviewWorker(queue, mocker.AsyncMock(), concurrency=1)
+    mocker.patch.object(worker, "process_next", side_effect=process_next)
+    mocker.patch.object(
+        queue, "requeue_expired", side_effect=redis.ConnectionError("down")
+    )
+
+    await asyncio.wait_for(worker.run(stop), 1)
+
+    assert worker.process_next.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_skips_job_whose_request_is_gone(queue, mocker):
+    use_case = mocker.AsyncMock()
+    job = await queue.enqueue(job_request("repo"))
+    await queue.client.delete(queue._job_key(job.id))
+
+    assert await ReviewWorker(queue, use_case).process_next()
+
+    use_case.execute.assert_not_awaited()
+    assert await queue.client.zcard(queue.PROCESSING_KEY) == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_keeps_renewing_after_a_failed_renewal(queue, mocker):
+    queue.lease_timeout = 0.03
+
+    async def review(**kwargs) -> ReviewResponse:
+        await asyncio.sleep(0.1)
+        return ReviewResponse(review="LGTM", files=[])
+
+    use_case = mocker.AsyncMock()
+    use_case.execute.side_effect = review
+    renew = mocker.patch.object(
+        queue, "renew", side_effect=redis.ConnectionError("down")
+    )
+    job = await queue.enqueue(job_request("repo"))
+
+    assert await ReviewWorker(queue, use_case).process_next()
+
+    assert renew.await_count >= 2
+    assert (await queue.get(job.id)).status is JobStatus.COMPLETED
+
+
+@pytest.mark.parametrize("callback_url", [
+    "ftp://hooks.example/done",
+    "http://localhost:8000/admin",
+    "http://127.0.0.1/",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/",
+    "http://10.0.0.5/hook",
+])
+def test_callback_url_must_be_public_http(callback_url):
+    with pytest.raises(pydantic.ValidationError):
+        job_request("repo", callback_url=callback_url)
+
+
+def test_callback_url_must_match_allowlist(mocker):
+    mocker.patch.object(JobQueueConfig, "CALLBACK_HOSTS", ["hooks.example"])
+
+    assert str(
+        job_request("repo", callback_url="https://hooks.example/done")
+        .callback_url
+    ) == "https://hooks.example/done"
+    with pytest.raises(pydantic.ValidationError):
+        job_request("repo", callback_url="https://other.example/done")
+
+
+@pytest.mark.asyncio
+async def test_job_endpoints(queue):
+    app.dependency_overrides[get_job_queue] = lambda: queue
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            created = await client.post("/review/jobs", json={
+                "github_repo_url": "https://github.com/example/repo",
+                "assignment_description": "Task",
+                "candidate_level": "Junior",
+                "priority": 2,
+            })
+            job_id = created.json()["id"]
+            polled = await client.get(f"/review/jobs/{job_id}")
+            missing = await client.get("/review/jobs/unknown")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert created.status_code == 202
+    assert polled.json() == {
+        "id": job_id,
+        "status": "queued",
+        "attempts": 0,
+        "result": None,
+        "error": None,
+    }
+    assert missing.status_code == 404
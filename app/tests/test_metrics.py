@@ -0,0 +1,134 @@
+import asyncio
+
+import fakeredis
+import httpx
+import pytest
+
+from ..cache import ReviewResultCache
+from ..http_client import HttpClientWithInterceptors
+from ..interceptors import MetricsInterceptor, RetryInterceptor
+from ..interceptors.retry_strategies import DefaultRetryStrategy
+from ..main import app
+from ..metrics import (
+    CACHE_REQUESTS,
+    STAGE_DURATION,
+    UPSTREAM_LATENCY,
+    UPSTREAM_RETRIES,
+    Counter,
+    Histogram,
+    Registry,
+)
+from ..models import ReviewResponse
+from ..services import GitHubService, OpenAIService
+from ..usecase import CodeReviewUseCase
+from .test_openai_service import FakeChatCompletions
+
+
+def test_registry_renders_text_format():
+    registry = Registry()
+    requests = Counter("requests_total", "Requests.", ["host"], registry)
+    latency = Histogram(
+        "latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry
+    )
+
+    requests.inc(host='a"b')
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{host="a\\"b"} 1.0\n'
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1.0\n'
+        'latency_seconds_bucket{le="1.0"} 2.0\n'
+        'latency_seconds_bucket{le="+Inf"} 2.0\n'
+        "latency_seconds_sum 0.55\n"
+        "latency_seconds_count 2.0\n"
+    )
+
+
+@pytest.mark.asyncio
+async def test_interceptors_record_latency_and_retries():
+    statuses = iter([503, 200])
+    client = HttpClientWithInterceptors(
+        [
+            RetryInterceptor(
+                DefaultRetryStrategy(base_delay=0.01, max_delay=0.01)
+            ),
+            MetricsInterceptor(),
+        ],
+        client=httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(next(statuses))
+        )),
+    )
+    retries = UPSTREAM_RETRIES.get(host="metrics.test")
+
+    await client.send(httpx.Request("GET", "https://metrics.test/"))
+
+    assert UPSTREAM_RETRIES.get(host="metrics.test") == retries + 1
+    assert UPSTREAM_LATENCY.count(host="metrics.test", status="503") == 1
+    assert UPSTREAM_LATENCY.count(host="metrics.test", status="200") == 1
+
+
+@pytest.mark.asyncio
+async def test_review_stages_are_exposed(fake_github):
+    stages = {
+        stage: STAGE_DURATION.count(stage=stage)
+        for stage in ("fetch", "prompt_build", "llm")
+    }
+    stub = FakeChatCompletions()
+
+    async with fake_github.client() as github, stub.client() as openai:
+        await CodeReviewUseCase(
+            GitHubService(api_key="fake_key", client=github),
+            OpenAIService(api_key="fake_key", client=openai),
+        ).execute(
+            repo_url="https://github.com/fake/repo",
+            description="Task",
+            candidate_level="Junior",
+        )
+
+    for stage, count in stages.items():
+        assert STAGE_DURATION.count(stage=stage) == count + 1
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert (
+        'codereview_review_stage_duration_seconds_count{stage="fetch"}'
+        in response.text
+    )
+    assert 'codereview_upstream_request_duration_seconds_count{host=' in (
+        response.text
+    )
+
+
+@pytest.mark.asyncio
+async def test_review_cache_counts_hits_stale_and_misses():
+    lookups = {
+        result: CACHE_REQUESTS.get(cache="review", result=result)
+        for result in ("hit", "stale", "miss")
+    }
+    cache = ReviewResultCache(
+        fakeredis.FakeAsyncRedis(decode_responses=True),
+        level_ttls={"Junior": 0},
+    )
+
+    async def compute():
+        return ReviewResponse(review="LGTM", files=[])
+
+    await cache.get_or_compute("stale", "Junior", compute)
+    await cache.get_or_compute("stale", "Junior", compute)
+    await cache.get_or_compute("fresh", "Senior", compute)
+    await cache.get_or_compute("fresh", "Senior", compute)
+    await asyncio.gather(*cache._refreshes)
+
+    assert {
+        result: CACHE_REQUESTS.get(cache="review", result=result) - count
+        for result, count in lookups.items()
+    } == {"hit": 1, "stale": 1, "miss": 2}
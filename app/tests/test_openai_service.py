@@ -0,0 +1,132 @@
+import json
+
+import httpx
+import pytest
+
+from ..configs import OpenAIConfig
+from ..prompt import PromptBuilder, estimate_tokens
+from ..services import OpenAIService
+from ..services.github_service import File, FileList
+
+
+class FakeChatCompletions:
+    """Local stand-in for the chat-completions endpoint."""
+
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        prompt = json.loads(request.content)["messages"][0]["content"]
+        self.prompts.append(prompt)
+        if "Merge the partial reviews" in prompt:
+            content = "Merged review"
+        else:
+            content = f"Review #{len(self.prompts)}"
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": content}}]}
+        )
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+
+def make_files(count: int, lines: int = 20) -> FileList:
+    return FileList(
+        File(
+            name=f"module_{index}.py",
+            content="\n".join(
+                f"value_{line} = compute({line})" for line in range(lines)
+            )
+        )
+        for index in range(count)
+    )
+
+
+def test_prompt_builder_respects_budget():
+    files = make_files(10)
+    budget = estimate_tokens(files[0].content) * 3
+
+    chunks = PromptBuilder(budget).pack(files)
+
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= budget for chunk in chunks)
+    assert [file.name for chunk in chunks for file in chunk.files] == (
+        files.names
+    )
+
+
+def test_prompt_builder_splits_oversized_file():
+    [file] = make_files(1, lines=200)
+
+    chunks = PromptBuilder(estimate_tokens(file.content) // 3).pack([file])
+
+    parts = [part for chunk in chunks for part in chunk.files]
+    assert len(parts) >= 3
+    assert parts[0].name == f"module_0.py (part 1/{len(parts)})"
+    assert "".join(part.content for part in parts) == file.content
+
+
+@pytest.mark.asyncio
+async def test_small_repository_is_reviewed_in_one_call():
+    stub = FakeChatCompletions()
+
+    async with stub.client() as client:
+        service = OpenAIService(api_key="fake_key", client=client)
+        review = await service.execute("Task", make_files(3), "Junior")
+
+    assert review == "Review #1"
+    assert len(stub.prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_large_repository_is_reviewed_in_chunks(mocker):
+    files = make_files(12)
+    mocker.patch.object(
+        OpenAIConfig,
+        "MAX_PROMPT_TOKENS",
+        estimate_tokens(files[0].content) * 4 + estimate_tokens("Task"),
+    )
+    stub = FakeChatCompletions()
+
+    async with stub.client() as client:
+        service = OpenAIService(api_key="fake_key", client=client)
+        review = await service.execute("Task", files, "Junior")
+
+    assert review == "Merged review"
+    map_prompts = stub.prompts[:-1]
+    assert len(map_prompts) >= 3
+    assert all("part" in prompt for prompt in map_prompts)
+    assert "Merge the partial reviews" in stub.prompts[-1]
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_relays_deltas():
+    prompts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        prompts.append(body)
+        events = [
+            {"choices": [{"delta": {"role": "assistant"}}]},
+            {"choices": [{"delta": {"content": "Good "}}]},
+            {"choices": [{"delta": {"content": "job"}}]},
+            {"choices": [{"delta": {}, "finish_reason": "stop"}]},
+        ]
+        stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        return httpx.Response(
+            200,
+            text=stream + "data: [DONE]\n\n",
+            headers={"Content-Type": "text/event-stream"},
+        )
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        service = OpenAIService(api_key="fake_key", client=client)
+        deltas = [
+            delta async for delta in
+            service.execute_stream("Task", make_files(2), "Junior")
+        ]
+
+    assert deltas == ["Good ", "job"]
+    assert prompts[0]["stream"] is True
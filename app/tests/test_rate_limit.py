@@ -0,0 +1,378 @@
+import asyncio
+import time
+from collections import Counter
+
+import fakeredis
+import httpx
+import pytest
+
+from ..http_client import HttpClientWithInterceptors
+from ..interceptors import (
+    ConcurrencyLimitInterceptor,
+    RateLimitBudgetInterceptor,
+)
+from ..rate_limit import (
+    GitHubRateLimitBudget,
+    OpenAIKeyScheduler,
+    parse_duration,
+)
+from ..configs import GitHubConfig
+from ..services import GitHubService, OpenAIService
+from .test_openai_service import make_files
+
+
+def github_response(status: int = 200, **headers) -> httpx.Response:
+    return httpx.Response(status, headers={
+        name.replace("_", "-"): str(value) for name, value in headers.items()
+    })
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.mark.asyncio
+async def test_budget_is_shared_between_workers(redis_client):
+    reset = int(time.time()) + 600
+    first_worker, second_worker = (
+        GitHubRateLimitBudget(
+            ["token-a"], redis_client, reserve=0, slowdown_ratio=0
+        )
+        for _ in range(2)
+    )
+
+    token = await first_worker.acquire()
+    await first_worker.update(token, github_response(
+        X_RateLimit_Remaining=3, X_RateLimit_Reset=reset
+    ))
+
+    assert await second_worker.acquire() == "token-a"
+    state = await second_worker._load("token-a")
+    assert state["remaining"] == 2
+    assert state["reset"] == reset
+    # Tokens are never stored in Redis.
+    assert not any("token-a" in key for key in await redis_client.keys())
+
+
+@pytest.mark.asyncio
+async def test_budget_rotates_to_token_with_most_remaining(redis_client):
+    reset = int(time.time()) + 600
+    budget = GitHubRateLimitBudget(
+        ["token-a", "token-b"], redis_client, reserve=10
+    )
+    await budget.update("token-a", github_response(
+        X_RateLimit_Remaining=10, X_RateLimit_Reset=reset
+    ))
+    await budget.update("token-b", github_response(
+        X_RateLimit_Remaining=4000, X_RateLimit_Reset=reset
+    ))
+
+    assert {await budget.acquire() for _ in range(5)} == {"token-b"}
+
+
+@pytest.mark.asyncio
+async def test_budget_waits_for_reset_when_exhausted(mocker):
+    sleep = mocker.patch("app.rate_limit.asyncio.sleep")
+    reset = time.time() + 30
+    budget = GitHubRateLimitBudget(["token-a"], reserve=0)
+    await budget.update("token-a", github_response(
+        X_RateLimit_Remaining=0, X_RateLimit_Reset=reset
+    ))
+
+    async def reset_window(delay):
+        budget._local["token-a"]["reset"] = time.time() - 1
+
+    sleep.side_effect = reset_window
+
+    assert await budget.acquire() == "token-a"
+    assert 29 < sleep.await_args_list[0].args[0] <= 30
+
+
+@pytest.mark.asyncio
+async def test_budget_paces_requests_when_running_low(mocker):
+    sleep = mocker.patch("app.rate_limit.asyncio.sleep")
+    budget = GitHubRateLimitBudget(["token-a"], reserve=0)
+    await budget.update("token-a", github_response(
+        X_RateLimit_Limit=5000,
+        X_RateLimit_Remaining=100,
+        X_RateLimit_Reset=int(time.time()) + 990,
+    ))
+
+    await budget.acquire()
+    sleep.assert_not_awaited()
+    await budget.acquire()
+
+    sleep.assert_awaited_once()
+    assert 9 < sleep.await_args.args[0] <= 10
+
+
+@pytest.mark.asyncio
+async def test_paced_requests_of_all_workers_are_spread_out(
+    redis_client, mocker
+):
+    sleep = mocker.patch("app.rate_limit.asyncio.sleep")
+    workers = [
+        GitHubRateLimitBudget(["token-a"], redis_client, reserve=0)
+        for _ in range(2)
+    ]
+    await workers[0].update("token-a", github_response(
+        X_RateLimit_Limit=5000,
+        X_RateLimit_Remaining=100,
+        X_RateLimit_Reset=int(time.time()) + 1000,
+    ))
+
+    await asyncio.gather(*(worker.acquire() for worker in workers * 2))
+
+    delays = sorted(call.args[0] for call in sleep.await_args_list)
+    # One request goes now, the others one interval (~10s) apart.
+    assert len(delays) == 3
+    assert [round(delay / 10) for delay in delays] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_secondary_limit_switches_token(redis_client):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "token token-a":
+            return github_response(403, Retry_After=60)
+        return github_response(200, X_RateLimit_Remaining=4999)
+
+    budget = GitHubRateLimitBudget(
+        ["token-a", "token-b"], redis_client, reserve=0, slowdown_ratio=0
+    )
+    # token-a looks best until GitHub pushes back.
+    await budget.update("token-b", github_response(
+        X_RateLimit_Remaining=4000, X_RateLimit_Reset=int(time.time()) + 600
+    ))
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        http_client = HttpClientWithInterceptors(
+            [RateLimitBudgetInterceptor(budget, "api.github.com")],
+            client=client,
+        )
+        first = await http_client.send(
+            httpx.Request("GET", "https://api.github.com/repos/a/b")
+        )
+        second = await http_client.send(
+            httpx.Request("GET", "https://api.github.com/repos/a/b")
+        )
+
+    assert first.status_code == second.status_code == 200
+    assert seen == ["token token-a", "token token-b", "token token-b"]
+    assert (await budget._load("token-a"))["blocked_until"] > time.time()
+
+
+@pytest.mark.asyncio
+async def test_github_service_switches_from_exhausted_token(redis_client):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "token token-a":
+            return github_response(
+                403,
+                X_RateLimit_Remaining=0,
+                X_RateLimit_Reset=int(time.time()) + 3,
+            )
+        return github_response(200, X_RateLimit_Remaining=3999)
+
+    budget = GitHubRateLimitBudget(
+        ["token-a", "token-b"], redis_client, reserve=0, slowdown_ratio=0
+    )
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        service = GitHubService(
+            api_key="token-a", client=client, rate_limit_budget=budget
+        )
+        started = time.monotonic()
+        response = await service._send(f"{GitHubConfig.API_URL}/repos/a/b")
+
+    assert response.status_code == 200
+    assert time.monotonic() - started < 1
+    assert seen == ["token token-a", "token token-b"]
+
+
+@pytest.mark.asyncio
+async def test_paced_request_does_not_hold_a_connection_slot():
+    budget = GitHubRateLimitBudget(["token-a"], reserve=0)
+    await budget.update("token-a", github_response(
+        X_RateLimit_Limit=5000,
+        X_RateLimit_Remaining=10,
+        X_RateLimit_Reset=time.time() + 3,
+    ))
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: github_response())
+    ) as client:
+        service = GitHubService(
+            api_key="token-a",
+            client=client,
+            max_concurrency=1,
+            rate_limit_budget=budget,
+        )
+        api_url = f"{GitHubConfig.API_URL}/repos/a/b"
+        # The second API request is paced for ~0.3s.
+        paced = asyncio.gather(service._send(api_url), service._send(api_url))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await service._send("https://raw.fake/main.py")
+        elapsed = time.monotonic() - started
+        await paced
+
+    assert elapsed < 0.1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_balances_burst_over_keys():
+    scheduler = OpenAIKeyScheduler(
+        ["key-a", "key-b:org-b"], rpm_limit=5, completion_tokens=0
+    )
+
+    started = time.perf_counter()
+    keys = await asyncio.gather(
+        *(scheduler.acquire(10) for _ in range(10))
+    )
+
+    # Both quotas are used in full before anything has to wait.
+    assert time.perf_counter() - started < 0.1
+    assert Counter(key.key for key in keys) == {"key-a": 5, "key-b": 5}
+    assert scheduler.keys[1].headers == {
+        "Authorization": "Bearer key-b",
+        "OpenAI-Organization": "org-b",
+    }
+
+
+@pytest.mark.asyncio
+async def test_scheduler_admits_by_estimated_tokens():
+    scheduler = OpenAIKeyScheduler(
+        ["key-a", "key-b"], tpm_limit=6000, completion_tokens=1000
+    )
+
+    first = await scheduler.acquire(4000)
+    second = await scheduler.acquire(4000)
+    third = asyncio.create_task(scheduler.acquire(4000))
+    await asyncio.sleep(0.05)
+
+    assert first is not second
+    # 5000 tokens each, neither key has them left for another minute.
+    assert not third.done()
+    third.cancel()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_resyncs_from_openai_headers():
+    scheduler = OpenAIKeyScheduler(["key-a", "key-b"], completion_tokens=0)
+    key_a, key_b = scheduler.keys
+
+    scheduler.update(key_a, httpx.Response(200, headers={
+        "x-ratelimit-limit-requests": "10000",
+        "x-ratelimit-remaining-requests": "9999",
+        "x-ratelimit-limit-tokens": "2000000",
+        "x-ratelimit-remaining-tokens": "1500000",
+    }))
+    scheduler.update(key_b, httpx.Response(429, headers={
+        "x-ratelimit-remaining-tokens": "0",
+        "x-ratelimit-reset-tokens": "1m30s",
+    }))
+
+    assert key_a.requests.capacity == 10000
+    assert key_a.tokens.capacity == 2000000
+    assert key_a.tokens.level <= 1500000
+    assert key_b.blocked_until - time.monotonic() > 89
+    assert [await scheduler.acquire(100) for _ in range(3)] == [key_a] * 3
+    assert parse_duration("6m0.5s") == 360.5
+    assert parse_duration("20ms") == 0.02
+
+
+@pytest.mark.asyncio
+async def test_request_waiting_for_quota_does_not_hold_a_slot():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "LGTM"}}]
+        })
+
+    scheduler = OpenAIKeyScheduler(
+        ["key-a"], tpm_limit=1000, completion_tokens=0
+    )
+    # The only key has no tokens left for the next minute.
+    await scheduler.acquire(1000)
+    semaphore = asyncio.Semaphore(1)
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        paced = OpenAIService(
+            api_key="key-a",
+            client=client,
+            scheduler=scheduler,
+            semaphore=semaphore,
+        )
+        other = OpenAIService(
+            api_key="key-b", client=client, semaphore=semaphore
+        )
+        waiting = asyncio.create_task(paced._send({}, tokens=1000))
+        await asyncio.sleep(0.05)
+        response = await asyncio.wait_for(other._send({}), 1)
+        waiting.cancel()
+
+    assert response.status_code == 200
+    assert not waiting.done() or waiting.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_holds_its_slot_until_closed():
+    async def body():
+        yield b"data"
+
+    semaphore = asyncio.Semaphore(1)
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=body())
+        )
+    ) as client:
+        http_client = HttpClientWithInterceptors(
+            [ConcurrencyLimitInterceptor(semaphore)], client=client
+        )
+        response = await http_client.send(
+            httpx.Request("GET", "https://api.test/stream"), stream=True
+        )
+        assert semaphore.locked()
+        assert await response.aread() == b"data"
+        await response.aclose()
+        assert not semaphore.locked()
+
+        await http_client.send(httpx.Request("GET", "https://api.test/"))
+        assert not semaphore.locked()
+
+
+@pytest.mark.asyncio
+async def test_openai_service_fails_over_to_other_key():
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "Bearer key-a":
+            return httpx.Response(429, headers={"retry-after-ms": "60000"})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "LGTM"}}]
+        })
+
+    scheduler = OpenAIKeyScheduler(["key-a", "key-b"])
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handler)
+    ) as client:
+        service = OpenAIService(
+            api_key="unused", client=client, scheduler=scheduler
+        )
+        reviews = [
+            await service.execute("Task", make_files(1), "Junior")
+            for _ in range(2)
+        ]
+
+    assert reviews == ["LGTM", "LGTM"]
+    assert seen == ["Bearer key-a", "Bearer key-b", "Bearer key-b"]
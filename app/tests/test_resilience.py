@@ -0,0 +1,292 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from ..configs import ResilienceConfig
+from ..enums import CircuitState
+from ..exceptions import CircuitOpenError, DeadlineExceededError
+from ..http_client import HttpClientWithInterceptors
+from ..interceptors import (
+    AdaptiveConcurrencyInterceptor,
+    CircuitBreakerInterceptor,
+    RetryInterceptor,
+)
+from ..interceptors.retry_strategies import DefaultRetryStrategy
+from ..main import app, get_code_review_usecase
+from ..metrics import UPSTREAM_CONCURRENCY_LIMIT
+from ..resilience import (
+    AdaptiveLimiter,
+    CircuitBreakerRegistry,
+    ConcurrencyLimiterRegistry,
+    deadline,
+)
+from ..usecase import with_deadline
+
+
+def make_client(handler, *interceptors) -> HttpClientWithInterceptors:
+    return HttpClientWithInterceptors(
+        list(interceptors),
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+@pytest.mark.asyncio
+async def test_backoff_uses_decorrelated_jitter():
+    strategy = DefaultRetryStrategy(
+        backoff_factor=3, max_retries=10, base_delay=1, max_delay=20
+    )
+    response = httpx.Response(
+        503, request=httpx.Request("GET", "https://example.com")
+    )
+
+    delays = [
+        (await strategy.should_retry(response, attempt))[1]
+        for attempt in range(10)
+    ]
+
+    assert all(1 <= delay <= 20 for delay in delays)
+    assert all(
+        delay <= previous * 3 for previous, delay in zip(delays, delays[1:])
+    )
+    assert len(set(delays)) > 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honored():
+    strategy = DefaultRetryStrategy(base_delay=0.01, max_delay=0.01)
+    response = httpx.Response(
+        429,
+        headers={"Retry-After": "7"},
+        request=httpx.Request("GET", "https://example.com"),
+    )
+
+    assert await strategy.should_retry(response, 0) == (True, 7)
+    assert await strategy.should_retry(response, 3) == (False, 0)
+
+
+@pytest.mark.asyncio
+async def test_transport_errors_are_retried():
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(200)
+
+    client = make_client(handler, RetryInterceptor(
+        DefaultRetryStrategy(base_delay=0.01, max_delay=0.01)
+    ))
+    response = await client.send(httpx.Request("GET", "https://example.com"))
+
+    assert response.status_code == 200
+    assert len(attempts) == 3
+
+
+@pytest.mark.asyncio
+async def test_retries_stop_at_the_deadline():
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        return httpx.Response(503, headers={"Retry-After": "10"})
+
+    client = make_client(handler, RetryInterceptor(DefaultRetryStrategy()))
+    async with deadline(1):
+        response = await client.send(
+            httpx.Request("GET", "https://example.com")
+        )
+
+    assert response.status_code == 503
+    assert len(attempts) == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_slow_work():
+    with pytest.raises(DeadlineExceededError):
+        async with deadline(0.01):
+            await asyncio.sleep(1)
+
+
+class SlowReviewUseCase:
+
+    @with_deadline
+    async def execute(self, repo_url, description, candidate_level):
+        await asyncio.sleep(1)
+
+
+@pytest.mark.asyncio
+async def test_review_endpoint_answers_504_past_the_deadline(mocker):
+    mocker.patch.object(ResilienceConfig, "REVIEW_DEADLINE", 0.05)
+    app.dependency_overrides[get_code_review_usecase] = SlowReviewUseCase
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post("/review", json={
+                "github_repo_url": "https://github.com/example/repo",
+                "assignment_description": "Task",
+                "candidate_level": "Junior",
+            })
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Deadline of 0.05s exceeded"}
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_recovers():
+    healthy = False
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        return httpx.Response(200 if healthy else 500)
+
+    breakers = CircuitBreakerRegistry(
+        failure_threshold=3, recovery_timeout=0.05
+    )
+    client = make_client(handler, CircuitBreakerInterceptor(breakers))
+    request = httpx.Request("GET", "https://example.com")
+
+    for _ in range(3):
+        await client.send(request)
+    assert breakers.get("example.com").state is CircuitState.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await client.send(request)
+    assert len(attempts) == 3
+
+    await asyncio.sleep(0.05)
+    healthy = True
+    assert (await client.send(request)).status_code == 200
+    assert breakers.get("example.com").state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_trial_reopens_the_circuit():
+    breakers = CircuitBreakerRegistry(
+        failure_threshold=1, recovery_timeout=0.05
+    )
+    client = make_client(
+        lambda request: httpx.Response(502),
+        CircuitBreakerInterceptor(breakers),
+    )
+    request = httpx.Request("GET", "https://example.com")
+
+    await client.send(request)
+    await asyncio.sleep(0.05)
+    assert breakers.get("example.com").state is CircuitState.HALF_OPEN
+
+    await client.send(request)
+    assert breakers.get("example.com").state is CircuitState.OPEN
+
+
+class CapacityStub:
+    """Upstream that serves `capacity` requests at once and 503s beyond."""
+
+    def __init__(self, capacity: int, latency: float = 0.01):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            return httpx.Response(503)
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency)
+            return httpx.Response(200)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_follows_upstream_capacity():
+    stub = CapacityStub(capacity=4)
+    limiters = ConcurrencyLimiterRegistry(initial_limit=4, max_limit=64)
+    client = make_client(
+        stub.handler, AdaptiveConcurrencyInterceptor(limiters)
+    )
+    limiter = limiters.get("example.com")
+    limits = []
+
+    async def load(seconds: float) -> None:
+        stop = time.monotonic() + seconds
+
+        async def worker() -> None:
+            while time.monotonic() < stop:
+                await client.send(httpx.Request("GET", "https://example.com"))
+                limits.append(limiter.limit)
+
+        limits.clear()
+        await asyncio.gather(*(worker() for _ in range(32)))
+
+    await load(0.3)
+    # 32 callers, but far fewer requests than that reach the upstream.
+    assert max(limits) < 9
+
+    stub.capacity = 16
+    await load(0.3)
+    assert max(limits) > 12
+
+    stub.capacity = 2
+    rejected = stub.rejected
+    await load(0.3)
+    assert limiter.limit < 4
+    # Without backing off, nearly all of the 32 callers would be rejected.
+    assert stub.rejected - rejected < len(limits) / 2
+    assert UPSTREAM_CONCURRENCY_LIMIT.get(host="example.com") == (
+        limiter.limit
+    )
+
+
+@pytest.mark.asyncio
+async def test_latency_spike_backs_off_once():
+    limiter = AdaptiveLimiter("example.com", initial_limit=8)
+
+    for _ in range(5):
+        limiter.release(await limiter.acquire() - 0.01, overloaded=False)
+    slow = [await limiter.acquire() - 1 for _ in range(4)]
+    for started in slow:
+        limiter.release(started, overloaded=False)
+
+    # The other slow requests started before the decrease.
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_recovers_after_lasting_latency_shift(mocker):
+    clock = mocker.patch("app.resilience.time.monotonic", return_value=0.0)
+    limiter = AdaptiveLimiter("example.com", initial_limit=8, max_limit=64)
+    limits = []
+
+    async def calls(count: int, latency: float) -> None:
+        # Rounds of as many concurrent calls as the limit allows.
+        while count > 0:
+            started = [
+                await limiter.acquire()
+                for _ in range(min(int(limiter.limit), count))
+            ]
+            clock.return_value += latency
+            for start in started:
+                limiter.release(start, overloaded=False)
+            limits.append(limiter.limit)
+            count -= len(started)
+
+    await calls(20, 0.1)
+    before = limiter.limit
+    limits.clear()
+    await calls(200, 1.0)
+
+    # Backed off on the shift, then grew past where it was.
+    assert min(limits) <= before / 2
+    assert limiter.limit > before
+    # The slower latency became the new normal.
+    assert limiter.latency > 0.5
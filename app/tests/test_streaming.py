@@ -0,0 +1,77 @@
+import httpx
+import pytest
+
+from ..main import app, get_code_review_usecase
+from ..services.github_service import File, FileList
+from ..usecase import CodeReviewUseCase
+
+
+class StubGitHubService:
+    async def execute(self, repo_url, on_progress=None):
+        files = FileList([
+            File(name="main.py", content="print(1)"),
+            File(name="util.py", content="x = 1"),
+        ])
+        on_progress("files_discovered", {"listed": 2, "selected": files.names})
+        for name in files.names:
+            on_progress("file_fetched", {"name": name})
+        return files
+
+
+class StubOpenAIService:
+    async def execute_stream(self, description, files, candidate_level):
+        for delta in ["Looks ", "fine"]:
+            yield delta
+
+
+@pytest.mark.asyncio
+async def test_execute_stream_yields_progress_then_review():
+    use_case = CodeReviewUseCase(StubGitHubService(), StubOpenAIService())
+
+    events = [
+        event async for event in use_case.execute_stream(
+            repo_url="https://github.com/example/repo",
+            description="Task",
+            candidate_level="Junior",
+        )
+    ]
+
+    assert [name for name, _ in events] == [
+        "files_discovered",
+        "file_fetched",
+        "file_fetched",
+        "review_started",
+        "review_delta",
+        "review_delta",
+        "done",
+    ]
+    assert "".join(
+        data["content"] for name, data in events if name == "review_delta"
+    ) == "Looks fine"
+
+
+@pytest.mark.asyncio
+async def test_review_stream_endpoint_sends_server_sent_events():
+    app.dependency_overrides[get_code_review_usecase] = (
+        lambda: CodeReviewUseCase(StubGitHubService(), StubOpenAIService())
+    )
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post("/review/stream", json={
+                "github_repo_url": "https://github.com/example/repo",
+                "assignment_description": "Task",
+                "candidate_level": "Junior",
+            })
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'event: review_delta\ndata: {"content": "Looks "}\n\n' in (
+        response.text
+    )
+    assert response.text.endswith(
+        'event: done\ndata: {"files": ["main.py", "util.py"]}\n\n'
+    )
@@ -0,0 +1,105 @@
+import json
+
+import httpx
+import pytest
+
+from ..http_client import HttpClientWithInterceptors
+from ..interceptors import RetryInterceptor, TracingInterceptor
+from ..interceptors.retry_strategies import DefaultRetryStrategy
+from ..services import GitHubService, OpenAIService
+from ..tracing import FileSpanExporter, InMemorySpanExporter, Tracer, tracer
+from ..usecase import CodeReviewUseCase
+from .test_openai_service import FakeChatCompletions
+
+
+@pytest.fixture
+def spans(monkeypatch) -> list:
+    exporter = InMemorySpanExporter()
+    monkeypatch.setattr(tracer, "exporter", exporter)
+    return exporter.spans
+
+
+@pytest.mark.asyncio
+async def test_review_is_traced_end_to_end(fake_github, spans):
+    stub = FakeChatCompletions()
+
+    async with fake_github.client() as github, stub.client() as openai:
+        await CodeReviewUseCase(
+            GitHubService(api_key="fake_key", client=github),
+            OpenAIService(api_key="fake_key", client=openai),
+        ).execute(
+            repo_url="https://github.com/fake/repo",
+            description="Task",
+            candidate_level="Junior",
+        )
+
+    by_id = {span.span_id: span for span in spans}
+    [root] = [span for span in spans if span.parent_id is None]
+    assert root.name == "review"
+    assert root.attributes["files"] == 6
+    assert {span.trace_id for span in spans} == {root.trace_id}
+    assert all(span.parent_id in by_id for span in spans if span is not root)
+
+    listings = {
+        span.attributes["url"].rsplit("contents/", 1)[1]: span
+        for span in spans if span.name == "github.list_directory"
+    }
+    assert listings["pkg/sub"].parent_id == listings["pkg"].span_id
+    assert listings["pkg"].parent_id == listings[""].span_id
+
+    files = [span for span in spans if span.name == "github.fetch_file"]
+    assert sorted(span.attributes["path"] for span in files) == sorted(
+        fake_github.files
+    )
+    assert all(span.attributes["bytes"] >= 0 for span in files)
+
+    [completion] = [span for span in spans if span.name == "openai.completion"]
+    [request] = [
+        span for span in spans if span.parent_id == completion.span_id
+    ]
+    assert request.attributes["http.host"] == "api.openai.com"
+    assert request.attributes["http.status_code"] == 200
+
+
+@pytest.mark.asyncio
+async def test_request_span_records_retries_and_bytes():
+    statuses = iter([502, 200])
+    exporter = InMemorySpanExporter()
+    client = HttpClientWithInterceptors(
+        [
+            TracingInterceptor(Tracer(exporter)),
+            RetryInterceptor(
+                DefaultRetryStrategy(base_delay=0.01, max_delay=0.01)
+            ),
+        ],
+        client=httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(next(statuses), text="hello")
+        )),
+    )
+
+    await client.send(
+        httpx.Request("GET", "https://example.com/archive?token=secret")
+    )
+
+    [span] = exporter.spans
+    assert span.attributes["http.url"] == "https://example.com/archive"
+    assert span.attributes["http.retries"] == 1
+    assert span.attributes["http.status_code"] == 200
+    assert span.attributes["http.response_bytes"] == 5
+    assert span.status == "ok"
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    file_tracer = Tracer(FileSpanExporter(str(path)))
+
+    with file_tracer.start_span("parent"):
+        with pytest.raises(ValueError):
+            with file_tracer.start_span("child", size=3):
+                raise ValueError("boom")
+
+    child, parent = map(json.loads, path.read_text().splitlines())
+    assert child["parent_id"] == parent["span_id"]
+    assert child["status"] == "error"
+    assert child["attributes"]["size"] == 3
+    assert parent["duration_ms"] >= child["duration_ms"]
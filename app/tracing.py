@@ -0,0 +1,141 @@
+import json
+import secrets
+import sys
+import time
+import typing as t
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from app.configs import TracingConfig
+
+# Span of the code currently running. Tasks started inside a span (e.g. by
+# asyncio.gather) inherit it as their parent.
+_current_span: ContextVar["Span | None"] = ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    start_time: int = field(default_factory=time.time_ns)
+    end_time: int | None = None
+    attributes: dict[str, t.Any] = field(default_factory=dict)
+    status: str = "ok"
+
+    @property
+    def duration_ms(self) -> float | None:
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1_000_000
+
+    def set_attribute(self, name: str, value: t.Any) -> None:
+        self.attributes[name] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class SpanExporter:
+    """Receives every span once it has ended. The base class drops them."""
+
+    def export(self, span: Span) -> None:
+        pass
+
+
+class StreamSpanExporter(SpanExporter):
+    """Writes spans as JSON lines, to the console by default."""
+
+    def __init__(self, stream: t.TextIO = sys.stdout):
+        self.stream = stream
+
+    def export(self, span: Span) -> None:
+        self.stream.write(json.dumps(span.to_dict(), default=str) + "\n")
+        self.stream.flush()
+
+
+class FileSpanExporter(StreamSpanExporter):
+
+    def __init__(self, path: str):
+        super().__init__(open(path, "a", encoding="utf-8"))
+
+
+class InMemorySpanExporter(SpanExporter):
+
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+def create_exporter(
+    kind: str = TracingConfig.EXPORTER,
+    path: str = TracingConfig.FILE,
+) -> SpanExporter:
+    if kind == "console":
+        return StreamSpanExporter()
+    if kind == "file":
+        return FileSpanExporter(path)
+    return SpanExporter()
+
+
+class Tracer:
+
+    def __init__(self, exporter: SpanExporter | None = None):
+        self.exporter = exporter or SpanExporter()
+
+    @contextmanager
+    def start_span(self, name: str, **attributes: t.Any) -> t.Iterator[Span]:
+        """
+        Opens a span as a child of the current one, or as the root of a new
+        trace. Exceptions mark the span as failed and are re-raised.
+        """
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.set_attribute("error", repr(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time_ns()
+            self.exporter.export(span)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def set_attribute(name: str, value: t.Any) -> None:
+    """Annotates the current span, if there is one."""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attribute(name, value)
+
+
+tracer = Tracer(create_exporter())
@@ -1,38 +1,391 @@
-from app.cache import redis_cache
-from app.exceptions import UseCaseException
-from app.models import ReviewResponse
+import asyncio
+import typing as t
+
+from functools import wraps
+
+from app.cache import ReviewResultCache
+from app.configs import BatchConfig, ResilienceConfig
+from app.exceptions import (
+    DeadlineExceededError,
+    GitHubServiceError,
+    UseCaseException,
+)
+from app.logger import get_logger
+from app.metrics import REVIEW_BYTES, REVIEW_FILES, STAGE_DURATION
+from app.enums import JobStatus
+from app.models import BatchReviewResult, ReviewRequest, ReviewResponse
+from app.resilience import deadline
+from app.review_state import ReviewFragment, ReviewState, ReviewStateStore
 from app.services.openai_service import OpenAIService
-from app.services.github_service import GitHubService
+from app.tracing import set_attribute, tracer
+from app.services.github_service import (
+    FileList,
+    GitHubService,
+    git_blob_sha,
+)
+
+
+def observe_files(files: FileList) -> None:
+    REVIEW_FILES.observe(len(files))
+    REVIEW_BYTES.observe(files.size)
+
+
+def with_deadline(func):
+    """Bounds a whole review, retries and backoff included."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            async with deadline(ResilienceConfig.REVIEW_DEADLINE):
+                return await func(*args, **kwargs)
+        except DeadlineExceededError as e:
+            raise UseCaseException(status_code=504, detail=str(e))
+
+    return wrapper
 
 
 class CodeReviewUseCase:
     def __init__(
         self,
         github_service: GitHubService,
-        openai_service: OpenAIService
+        openai_service: OpenAIService,
+        review_state: ReviewStateStore | None = None,
+        result_cache: ReviewResultCache | None = None
     ):
         self.github_service = github_service
         self.openai_service = openai_service
+        self.review_state = review_state
+        self.result_cache = result_cache
+        self.logger = get_logger(self.__class__.__name__)
 
-    @redis_cache(ttl=60)
+    @with_deadline
     async def execute(
         self,
         repo_url: str,
         description: str,
         candidate_level: str
     ) -> ReviewResponse:
-        files = await self.github_service.execute(repo_url)
-        if not files:
-            raise UseCaseException(
-                status_code=404,
-                detail="No files found in repository."
+        """
+        Reviews the repository, or serves the cached review of its latest
+        commit.
+        """
+        with tracer.start_span(
+            "review", repo_url=repo_url, candidate_level=candidate_level
+        ):
+            if self.result_cache is None:
+                return await self._review(
+                    repo_url, description, candidate_level
+                )
+
+            head = await self.github_service.head_sha(repo_url)
+            return await self.result_cache.get_or_compute(
+                self.result_cache.key(
+                    repo_url, head, description, candidate_level
+                ),
+                candidate_level,
+                lambda: self._review(repo_url, description, candidate_level),
             )
 
-        review = await self.openai_service.execute(
-            description, files, candidate_level
-        )
+    @with_deadline
+    async def _review(
+        self,
+        repo_url: str,
+        description: str,
+        candidate_level: str
+    ) -> ReviewResponse:
+        with STAGE_DURATION.time(stage="fetch"):
+            files = await self.github_service.execute(repo_url)
+        try:
+            observe_files(files)
+            set_attribute("files", len(files))
+            if not files:
+                raise UseCaseException(
+                    status_code=404,
+                    detail="No files found in repository."
+                )
+
+            with STAGE_DURATION.time(stage="llm"):
+                review = await self.openai_service.execute(
+                    description, files, candidate_level
+                )
+        finally:
+            files.close()
 
         return ReviewResponse(
             review=review,
             files=files.names
         )
+
+    @with_deadline
+    async def execute_incremental(
+        self,
+        repo_url: str,
+        description: str,
+        candidate_level: str
+    ) -> ReviewResponse:
+        """
+        Reviews only what changed since the last review of the repository:
+        changed files are fetched through the compare API, the chunks that
+        hold them are reviewed again and merged with the cached reviews of
+        the untouched chunks.
+        """
+        if self.review_state is None:
+            return await self.execute(
+                repo_url=repo_url,
+                description=description,
+                candidate_level=candidate_level
+            )
+
+        with tracer.start_span(
+            "review",
+            repo_url=repo_url,
+            candidate_level=candidate_level,
+            incremental=True,
+        ):
+            return await self._review_changes(
+                repo_url, description, candidate_level
+            )
+
+    async def _review_changes(
+        self,
+        repo_url: str,
+        description: str,
+        candidate_level: str
+    ) -> ReviewResponse:
+        key = self.review_state.key(repo_url, description, candidate_level)
+        with STAGE_DURATION.time(stage="fetch"):
+            head = await self.github_service.head_sha(repo_url)
+            state = await self.review_state.get(key)
+            if state is not None and state.sha == head:
+                return ReviewResponse(review=state.review, files=state.names)
+
+            update = None
+            if state is not None:
+                try:
+                    update = await self._fetch_update(repo_url, state, head)
+                except GitHubServiceError as e:
+                    self.logger.warning(f"Incremental fetch failed: {e}")
+
+            if update is None:
+                files = await self.github_service.execute(repo_url)
+                names, kept = files.names, []
+            else:
+                files, names, kept = update
+        try:
+            observe_files(files)
+            if not names:
+                raise UseCaseException(
+                    status_code=404,
+                    detail="No files found in repository."
+                )
+
+            shas = {file.name: git_blob_sha(file.content) for file in files}
+            chunks = (
+                self.openai_service.pack(description, files) if files else []
+            )
+            self.logger.info(
+                f"Reviewing {len(chunks)} chunks, reusing {len(kept)}"
+            )
+            with STAGE_DURATION.time(stage="llm"):
+                reviews = await self.openai_service.review_chunks(
+                    description, chunks, candidate_level,
+                    total=len(kept) + len(chunks)
+                ) if chunks else []
+
+                fragments = kept + [
+                    ReviewFragment(
+                        files={path: shas[path] for path in chunk.paths},
+                        review=review,
+                    )
+                    for chunk, review in zip(chunks, reviews)
+                ]
+                review = await self.openai_service.merge_reviews(
+                    description,
+                    [fragment.review for fragment in fragments],
+                    candidate_level
+                )
+
+            await self.review_state.set(key, ReviewState(
+                sha=head, names=names, fragments=fragments, review=review
+            ))
+            return ReviewResponse(review=review, files=names)
+        finally:
+            files.close()
+
+    async def _fetch_update(
+        self,
+        repo_url: str,
+        state: ReviewState,
+        head: str
+    ) -> tuple[FileList, list[str], list[ReviewFragment]] | None:
+        """
+        Returns the files to review again, the names of all reviewed files
+        and the fragments that are still valid, or None if the repository
+        has to be reviewed in full.
+        """
+        changes = await self.github_service.fetch_changes(
+            repo_url, state.sha, head
+        )
+        if changes is None:
+            return None
+
+        dirty = set(changes.files.names) | set(changes.removed)
+        kept = [
+            fragment for fragment in state.fragments
+            if not dirty & fragment.files.keys()
+        ]
+        # Untouched files that shared a chunk with a changed one.
+        kept_paths = {path for fragment in kept for path in fragment.files}
+        stale = {
+            path: sha for path, sha in state.files.items()
+            if path not in dirty and path not in kept_paths
+        }
+        fetched = changes.files + await self.github_service.fetch_files(
+            repo_url, stale
+        )
+
+        # Modified files keep their place, added ones go last.
+        removed = set(changes.removed)
+        names = [name for name in state.names if name not in removed]
+        names += [name for name in changes.files.names if name not in names]
+        files = FileList(
+            sorted(fetched, key=lambda file: names.index(file.name))
+        )
+        return files, names, kept
+
+    async def execute_stream(
+        self,
+        repo_url: str,
+        description: str,
+        candidate_level: str
+    ) -> t.AsyncIterator[tuple[str, dict]]:
+        """
+        Yields (event, data) pairs: GitHub progress while files are fetched,
+        then the review as "review_delta" events and a final "done".
+        """
+        events: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue()
+        fetch = asyncio.create_task(
+            self.github_service.execute(
+                repo_url,
+                on_progress=lambda event, data: events.put_nowait(
+                    (event, data)
+                )
+            )
+        )
+        fetch.add_done_callback(lambda _: events.put_nowait(None))
+
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            files = await fetch
+        finally:
+            fetch.cancel()
+
+        try:
+            if not files:
+                raise UseCaseException(
+                    status_code=404,
+                    detail="No files found in repository."
+                )
+
+            yield "review_started", {"files": files.names}
+            async for delta in self.openai_service.execute_stream(
+                description, files, candidate_level
+            ):
+                yield "review_delta", {"content": delta}
+            yield "done", {"files": files.names}
+        finally:
+            files.close()
+
+
+class BatchReviewUseCase:
+    """
+    Reviews many repositories with one use case, so the concurrency limits
+    of its services are shared by the whole batch. Duplicate requests are
+    reviewed once.
+    """
+
+    def __init__(
+        self,
+        review: CodeReviewUseCase,
+        max_concurrency: int = BatchConfig.MAX_CONCURRENT_REVIEWS
+    ):
+        self.review = review
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def execute(
+        self,
+        requests: list[ReviewRequest]
+    ) -> t.AsyncIterator[BatchReviewResult]:
+        """Yields a result for every request as soon as it is reviewed."""
+        # Requests for the same assignment run back to back: the prompts
+        # start with it, so the LLM provider can reuse the cached prefix.
+        order = sorted(
+            range(len(requests)),
+            key=lambda index: (
+                requests[index].assignment_description,
+                requests[index].candidate_level.value,
+            )
+        )
+        reviews: dict[tuple, asyncio.Task] = {}
+        indexes: dict[tuple, list[int]] = {}
+        for index in order:
+            request = requests[index]
+            key = (
+                # GitHub owner and repository names are case-insensitive.
+                request.github_repo_url.lower(),
+                request.assignment_description,
+                request.candidate_level,
+                request.incremental,
+            )
+            indexes.setdefault(key, []).append(index)
+            if key not in reviews:
+                reviews[key] = asyncio.create_task(
+                    self._review(key, request)
+                )
+        self.logger.info(
+            f"Reviewing {len(reviews)} repositories"
+            f" for {len(requests)} requests"
+        )
+
+        try:
+            for review in asyncio.as_completed(reviews.values()):
+                key, result = await review
+                for index in indexes[key]:
+                    yield result.model_copy(update={
+                        "index": index,
+                        "github_repo_url": requests[index].github_repo_url,
+                    })
+        finally:
+            for task in reviews.values():
+                task.cancel()
+
+    async def _review(
+        self,
+        key: tuple,
+        request: ReviewRequest
+    ) -> tuple[tuple, BatchReviewResult]:
+        result = BatchReviewResult(
+            index=-1,
+            github_repo_url=request.github_repo_url,
+            status=JobStatus.COMPLETED,
+        )
+        execute = (
+            self.review.execute_incremental if request.incremental
+            else self.review.execute
+        )
+        async with self.semaphore:
+            try:
+                response = await execute(
+                    repo_url=request.github_repo_url,
+                    description=request.assignment_description,
+                    candidate_level=request.candidate_level.value
+                )
+                result.result = response
+            except Exception as e:
+                self.logger.error(
+                    f"Review of {request.github_repo_url} failed: {e}"
+                )
+                result.status = JobStatus.FAILED
+                result.error = str(e)
+        return key, result
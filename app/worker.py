@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import signal
+
+import httpx
+
+from app.configs import JobQueueConfig
+from app.jobs import JobQueue
+from app.logger import get_logger
+from app.usecase import CodeReviewUseCase
+
+logger = get_logger(__name__)
+
+# Pause of a consumer after an unexpected error, e.g. Redis being down.
+ERROR_DELAY = 1.0
+
+
+class ReviewWorker:
+    """Consumes review jobs from the queue with bounded concurrency."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        use_case: CodeReviewUseCase,
+        http_client: httpx.AsyncClient | None = None,
+        concurrency: int = JobQueueConfig.CONCURRENCY,
+        reap_interval: float = JobQueueConfig.REAP_INTERVAL,
+    ):
+        self.queue = queue
+        self.use_case = use_case
+        self.http_client = http_client
+        self.concurrency = concurrency
+        self.reap_interval = reap_interval
+
+    async def run(self, stop: asyncio.Event) -> None:
+        async def consume() -> None:
+            while not stop.is_set():
+                try:
+                    await self.process_next()
+                except Exception as e:
+                    # E.g. Redis is unreachable, keep the other jobs going.
+                    logger.error(f"Processing a job failed: {e!r}")
+                    await self._pause(stop, ERROR_DELAY)
+
+        logger.info(f"Worker started with concurrency {self.concurrency}")
+        await asyncio.gather(
+            self.reap(stop),
+            *(consume() for _ in range(self.concurrency)),
+        )
+        logger.info("Worker stopped")
+
+    async def reap(self, stop: asyncio.Event) -> None:
+        """Retries the jobs of workers that stopped renewing their lease."""
+        while not stop.is_set():
+            try:
+                for job_id in await self.queue.requeue_expired():
+                    logger.warning(f"Job {job_id} lost its worker.")
+            except Exception as e:
+                logger.error(f"Reaping expired jobs failed: {e!r}")
+            await self._pause(stop, self.reap_interval)
+
+    @staticmethod
+    async def _pause(stop: asyncio.Event, delay: float) -> None:
+        """Sleeps for `delay`, returning early once the worker stops."""
+        try:
+            await asyncio.wait_for(stop.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def process_next(self, timeout: float = 1.0) -> bool:
+        """Runs one job, returns False if none arrived within `timeout`."""
+        job_id = await self.queue.dequeue(timeout)
+        if job_id is None:
+            return False
+
+        request = await self.queue.get_request(job_id)
+        if request is None:
+            logger.warning(f"Job {job_id} is gone, skipping it.")
+            await self.queue.release(job_id)
+            return True
+
+        lease = asyncio.create_task(self._keep_lease(job_id))
+        try:
+            execute = (
+                self.use_case.execute_incremental if request.incremental
+                else self.use_case.execute
+            )
+            result = await execute(
+                repo_url=request.github_repo_url,
+                description=request.assignment_description,
+                candidate_level=request.candidate_level.value
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            if await self.queue.fail(job_id, str(e)):
+                return True
+        else:
+            await self.queue.complete(job_id, result)
+            logger.info(f"Job {job_id} completed.")
+        finally:
+            lease.cancel()
+
+        if request.callback_url:
+            await self._notify(str(request.callback_url), job_id)
+        return True
+
+    async def _keep_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_timeout / 3)
+            try:
+                await self.queue.renew(job_id)
+            except Exception as e:
+                # Tried again next time, the lease may expire meanwhile.
+                logger.warning(
+                    f"Renewing the lease of job {job_id} failed: {e!r}"
+                )
+
+    async def _notify(self, callback_url: str, job_id: str) -> None:
+        job = await self.queue.get(job_id)
+        try:
+            await self.http_client.post(
+                callback_url,
+                content=job.model_dump_json(),
+                headers={"Content-Type": "application/json"},
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"Callback for job {job_id} failed: {e}")
+
+
+async def main(concurrency: int) -> None:
+    from app import main as app_main
+
+    # Reuses the API's lifespan so clients and caches are set up the same.
+    async with app_main.lifespan(app_main.app):
+        services = app_main.get_container()
+        worker = ReviewWorker(
+            JobQueue(services.redis),
+            app_main.get_code_review_usecase(services),
+            services.http_client,
+            concurrency,
+        )
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await worker.run(stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Review job worker.")
+    parser.add_argument(
+        "--concurrency", type=int, default=JobQueueConfig.CONCURRENCY
+    )
+    asyncio.run(main(parser.parse_args().concurrency))
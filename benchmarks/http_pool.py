@@ -0,0 +1,74 @@
+"""
+Per-review wall time with a one-off client per request (the old
+`RetryInterceptor` behaviour) versus the pooled, app-scoped client.
+
+    python -m benchmarks.http_pool --files 400 --reviews 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks.stub_server import StubServer, build_github_app
+
+
+async def review_wall_times(
+    client_factory, reviews: int
+) -> list[float]:
+    from app.services import GitHubService
+
+    timings = []
+    client = client_factory()
+    try:
+        for _ in range(reviews):
+            service = GitHubService(api_key="bench", client=client)
+            started = time.perf_counter()
+            await service.execute("https://github.com/bench/repo")
+            timings.append(time.perf_counter() - started)
+    finally:
+        if client is not None:
+            await client.aclose()
+    return timings
+
+
+def summarize(timings: list[float]) -> dict:
+    return {
+        "mean_s": round(statistics.mean(timings), 4),
+        "min_s": round(min(timings), 4),
+        "max_s": round(max(timings), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--reviews", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with StubServer(
+        build_github_app(files=args.files, latency=args.latency)
+    ) as server:
+        os.environ["GITHUB_API_URL"] = server.url
+
+        from app.http_client import create_http_client
+
+        per_request = asyncio.run(
+            review_wall_times(lambda: None, args.reviews)
+        )
+        pooled = asyncio.run(
+            review_wall_times(create_http_client, args.reviews)
+        )
+
+    print(json.dumps({
+        "files": args.files,
+        "reviews": args.reviews,
+        "per_request_client": summarize(per_request),
+        "pooled_client": summarize(pooled),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Event-loop latency while `/review` requests hit the review cache concurrently,
+comparing the blocking redis client with `redis.asyncio`. Redis is a local
+fakeredis TCP server, GitHub/OpenAI are replaced with in-process stubs.
+
+The reviews are computed before the measured run and the cache keeps
+nothing in memory, so every request reads its review from Redis.
+
+    python -m benchmarks.redis_cache_load --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+import httpx
+import redis
+import redis.asyncio
+
+from fakeredis import TcpFakeServer
+
+from app.services.github_service import File, FileList
+
+
+class StubGitHubService:
+    async def head_sha(self, repo_url: str) -> str:
+        await asyncio.sleep(0.005)
+        return "HEAD"
+
+    async def execute(self, repo_url: str) -> FileList:
+        await asyncio.sleep(0.005)
+        return FileList([File(name="main.py", content="print('hi')")])
+
+
+class StubOpenAIService:
+    async def execute(self, description, files, candidate_level) -> str:
+        await asyncio.sleep(0.005)
+        return "LGTM"
+
+
+class BlockingRedis:
+    """Awaitable facade over the sync client, i.e. the previous behaviour."""
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    async def get(self, *args, **kwargs):
+        return self.client.get(*args, **kwargs)
+
+    async def set(self, *args, **kwargs):
+        return self.client.set(*args, **kwargs)
+
+
+async def probe_loop_lag(stop: asyncio.Event, interval: float = 0.001):
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    return lags
+
+
+async def run_load(
+    client,
+    warm_client: redis.asyncio.Redis,
+    requests: int,
+    concurrency: int,
+) -> dict:
+    import app.main
+    from app.cache import ReviewResultCache
+    from app.usecase import CodeReviewUseCase
+
+    def use_case(redis_client) -> CodeReviewUseCase:
+        return CodeReviewUseCase(
+            StubGitHubService(),
+            StubOpenAIService(),
+            result_cache=ReviewResultCache(
+                redis_client, max_memory_bytes=0
+            ),
+        )
+
+    # Half of the requests repeat a repo, all of them are cached upfront.
+    warm = use_case(warm_client)
+    for index in range(0, requests, 2):
+        await warm.execute(
+            repo_url=f"https://github.com/bench/r{index // 2}",
+            description="Benchmark",
+            candidate_level="Junior",
+        )
+    await warm_client.aclose()
+
+    app.main.app.dependency_overrides[app.main.get_code_review_usecase] = (
+        lambda: use_case(client)
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app.main.app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as http:
+        async def review(index: int) -> None:
+            async with semaphore:
+                response = await http.post("/review", json={
+                    # Two requests per repo, both served from Redis.
+                    "github_repo_url": f"https://github.com/bench/r{index // 2}",
+                    "assignment_description": "Benchmark",
+                    "candidate_level": "Junior",
+                })
+                response.raise_for_status()
+
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_loop_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(review(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        lags = await probe
+
+    if isinstance(client, redis.asyncio.Redis):
+        await client.aclose()
+
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "loop_lag_mean_ms": round(statistics.mean(lags) * 1000, 3),
+        "loop_lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 3),
+        "loop_lag_max_ms": round(lags[-1] * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    server = TcpFakeServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    def async_client(db: int) -> redis.asyncio.Redis:
+        return redis.asyncio.Redis(
+            host=host, port=port, db=db, decode_responses=True
+        )
+
+    try:
+        blocking = asyncio.run(run_load(
+            BlockingRedis(redis.Redis(
+                host=host, port=port, db=0, decode_responses=True
+            )),
+            async_client(0),
+            args.requests,
+            args.concurrency,
+        ))
+        non_blocking = asyncio.run(run_load(
+            async_client(1),
+            async_client(1),
+            args.requests,
+            args.concurrency,
+        ))
+    finally:
+        server.shutdown()
+
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "sync_redis": blocking,
+        "async_redis": non_blocking,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+End-to-end load test of `/review` (or `/review/stream` with --stream),
+served by uvicorn, against local fake GitHub and OpenAI servers and a
+fakeredis TCP server.
+Runs offline and prints a JSON report (throughput, latency percentiles,
+upstream call counts, memory peak) meant to be compared across commits.
+
+    python -m benchmarks.review_load --requests 200 --concurrency 20 \
+        --files 400 --github-latency 0.02 --openai-latency 0.5 \
+        --output bench.json
+
+With --openai-rpm/--openai-tpm the fake OpenAI enforces per-key quotas,
+spread the load over a pool with --openai-keys:
+
+    python -m benchmarks.review_load --requests 60 --openai-keys 3 \
+        --openai-rpm 20
+
+With --cassette the upstream traffic is recorded, and with --replay
+also given it is served from that cassette instead of the stubs (their
+call counts stay at zero), with latencies scaled by --latency-scale:
+
+    python -m benchmarks.review_load --files 2000 --cassette big.jsonl.gz
+    python -m benchmarks.review_load --files 2000 --cassette big.jsonl.gz \
+        --replay --latency-scale 0
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+
+import httpx
+
+from fakeredis import TcpFakeServer
+
+from benchmarks.stub_server import (
+    StubServer,
+    build_github_app,
+    build_openai_app,
+)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    index = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def summarize_ms(timings: list[float]) -> dict:
+    if not timings:
+        return {}
+    timings = sorted(timings)
+    return {
+        "mean": round(statistics.mean(timings) * 1000, 2),
+        "p50": round(percentile(timings, 50) * 1000, 2),
+        "p95": round(percentile(timings, 95) * 1000, 2),
+        "p99": round(percentile(timings, 99) * 1000, 2),
+        "max": round(timings[-1] * 1000, 2),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(args: argparse.Namespace, base_url: str) -> dict:
+    latencies, first_bytes, errors = [], [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        timeout=None,
+        limits=httpx.Limits(max_connections=args.concurrency),
+    ) as http:
+        async def review(index: int) -> None:
+            nonlocal errors
+            payload = {
+                # Requests beyond --distinct-repos repeat a repository.
+                "github_repo_url": (
+                    "https://github.com/bench/"
+                    f"repo{index % args.distinct_repos}"
+                ),
+                "assignment_description": "Benchmark",
+                "candidate_level": "Junior",
+            }
+            async with semaphore:
+                started = time.perf_counter()
+                if args.stream:
+                    async with http.stream(
+                        "POST", "/review/stream", json=payload
+                    ) as response:
+                        first_byte = None
+                        async for _ in response.aiter_bytes():
+                            if first_byte is None:
+                                first_byte = time.perf_counter() - started
+                        first_bytes.append(first_byte)
+                else:
+                    response = await http.post("/review", json=payload)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*map(review, range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "errors": errors,
+        "latency_ms": summarize_ms(latencies),
+        "first_byte_ms": summarize_ms(first_bytes),
+    }
+
+
+def cache_lookups(counter) -> dict[str, dict[str, int]]:
+    lookups: dict[str, dict[str, int]] = {}
+    for _, labels, value in counter.samples():
+        cache = lookups.setdefault(labels["cache"], {})
+        cache[labels["result"]] = int(value)
+    return lookups
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--distinct-repos", type=int, default=None)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--files-per-dir", type=int, default=20)
+    parser.add_argument("--github-latency", type=float, default=0.01)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    parser.add_argument("--rate-limit-window", type=float, default=60.0)
+    parser.add_argument("--openai-latency", type=float, default=0.1)
+    parser.add_argument("--openai-keys", type=int, default=1)
+    parser.add_argument("--openai-rpm", type=int, default=None)
+    parser.add_argument("--openai-tpm", type=int, default=None)
+    parser.add_argument(
+        "--fetch-mode", choices=("contents", "trees"), default="contents"
+    )
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--stream-chunks", type=int, default=20)
+    parser.add_argument("--chunk-latency", type=float, default=0.0)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--output", help="Also write the report here.")
+    parser.add_argument("--cassette", help="Records upstream traffic here.")
+    parser.add_argument("--replay", action="store_true")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    args = parser.parse_args()
+    args.distinct_repos = args.distinct_repos or args.requests
+    if args.replay and not args.cassette:
+        parser.error("--replay needs a --cassette to replay")
+    if args.cassette and not args.replay and os.path.exists(args.cassette):
+        # Recordings are appended, start from an empty cassette.
+        os.remove(args.cassette)
+
+    redis_server = TcpFakeServer(("127.0.0.1", 0))
+    threading.Thread(target=redis_server.serve_forever, daemon=True).start()
+    redis_host, redis_port = redis_server.server_address
+
+    github_app = build_github_app(
+        files=args.files,
+        files_per_dir=args.files_per_dir,
+        latency=args.github_latency,
+        rate_limit=args.rate_limit,
+        rate_limit_window=args.rate_limit_window,
+    )
+    openai_app = build_openai_app(
+        latency=args.openai_latency,
+        stream_chunks=args.stream_chunks,
+        chunk_latency=args.chunk_latency,
+        rpm_limit=args.openai_rpm,
+        tpm_limit=args.openai_tpm,
+    )
+
+    try:
+        with (
+            StubServer(github_app) as github,
+            StubServer(openai_app) as openai,
+        ):
+            os.environ.pop("TEST", None)
+            os.environ.update({
+                "GITHUB_API_URL": github.url,
+                "GITHUB_API_KEY": "bench",
+                "GITHUB_FETCH_MODE": args.fetch_mode,
+                "OPENAI_API_URL": f"{openai.url}/v1/chat/completions",
+                "OPENAI_API_KEYS": ",".join(
+                    f"bench-{index}" for index in range(args.openai_keys)
+                ),
+                # Unlimited unless the stub enforces quotas.
+                "OPENAI_RPM_LIMIT": str(args.openai_rpm or 10 ** 9),
+                "OPENAI_TPM_LIMIT": str(args.openai_tpm or 10 ** 12),
+                "REDIS_URL": f"redis://{redis_host}:{redis_port}",
+            })
+            if args.cassette:
+                os.environ.update({
+                    "HTTP_CASSETTE_MODE": (
+                        "replay" if args.replay else "record"
+                    ),
+                    "HTTP_CASSETTE_PATH": args.cassette,
+                    "HTTP_CASSETTE_LATENCY_SCALE": str(args.latency_scale),
+                })
+
+            # Imported late: the configuration is read from the environment.
+            import app.main
+            from app.metrics import (
+                CACHE_REQUESTS,
+                UPSTREAM_CONCURRENCY_LIMIT,
+            )
+
+            # Request logs would dominate the run time.
+            logging.getLogger().setLevel(logging.WARNING)
+
+            if args.tracemalloc:
+                tracemalloc.start()
+            with StubServer(app.main.app) as server:
+                result = asyncio.run(run_load(args, server.url))
+            if args.tracemalloc:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                result["tracemalloc_peak_mb"] = round(peak / 2 ** 20, 1)
+            result["cache"] = cache_lookups(CACHE_REQUESTS)
+            # Adaptive in-flight limits per upstream host at the end.
+            result["concurrency_limits"] = {
+                labels["host"]: round(value, 1)
+                for _, labels, value in UPSTREAM_CONCURRENCY_LIMIT.samples()
+            }
+    finally:
+        redis_server.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(
+                datetime.timezone.utc
+            ).isoformat(),
+            "python": platform.python_version(),
+            "parameters": vars(args),
+        },
+        "requests": args.requests,
+        **result,
+        "upstream_calls": {
+            "github": dict(github_app.state.calls),
+            "openai": dict(openai_app.state.calls),
+        },
+        # Includes the stub servers, they run in this process too.
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
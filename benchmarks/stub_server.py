@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import json
+import socket
+import threading
+import time
+
+from collections import Counter
+
+import uvicorn
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+
+
+def build_github_app(
+    files: int = 400,
+    files_per_dir: int = 20,
+    latency: float = 0.0,
+    rate_limit: int | None = None,
+    rate_limit_window: float = 3600.0,
+) -> FastAPI:
+    """
+    Fake GitHub serving a synthetic repository through the Contents and Git
+    Trees APIs. Files are spread across `files / files_per_dir` top-level
+    directories. With `rate_limit`, API calls beyond that many per window
+    get GitHub's 403 with X-RateLimit-Remaining: 0.
+    """
+    app = FastAPI()
+    app.state.base_url = ""
+    app.state.calls = Counter()
+
+    tree: dict[str, list[str]] = {}
+    for index in range(files):
+        tree.setdefault(f"pkg{index // files_per_dir}", []).append(
+            f"module_{index}.py"
+        )
+    paths = [
+        f"{directory}/{name}"
+        for directory, names in tree.items() for name in names
+    ]
+    by_sha = {sha(path): path for path in paths}
+
+    quota = {"remaining": rate_limit, "reset": time.time() + rate_limit_window}
+
+    @app.middleware("http")
+    async def account(request: Request, call_next):
+        await asyncio.sleep(latency)
+        # "/repos/o/r/contents/..." -> "contents", "/repos/o/r/git/blobs/..."
+        # -> "blobs", "/raw/..." -> "raw".
+        parts = request.url.path.strip("/").split("/")
+        kind = parts[0]
+        if kind == "repos" and len(parts) > 3:
+            kind = parts[3]
+            if kind == "git" and len(parts) > 4:
+                kind = parts[4]
+        app.state.calls[kind] += 1
+
+        if rate_limit is None or kind == "raw":
+            return await call_next(request)
+
+        if quota["reset"] <= time.time():
+            quota.update(
+                remaining=rate_limit, reset=time.time() + rate_limit_window
+            )
+        headers = {
+            "X-RateLimit-Limit": str(rate_limit),
+            "X-RateLimit-Reset": str(int(quota["reset"])),
+        }
+        if quota["remaining"] <= 0:
+            app.state.calls["rate_limited"] += 1
+            return JSONResponse(
+                {"message": "API rate limit exceeded"},
+                status_code=403,
+                headers={**headers, "X-RateLimit-Remaining": "0"},
+            )
+        quota["remaining"] -= 1
+        response = await call_next(request)
+        response.headers.update(
+            {**headers, "X-RateLimit-Remaining": str(quota["remaining"])}
+        )
+        return response
+
+    def entry(path: str, kind: str) -> dict:
+        base_url = app.state.base_url
+        return {
+            "type": kind,
+            "path": path,
+            "sha": sha(path),
+            "size": len(content(path)) if kind == "file" else 0,
+            "url": f"{base_url}/repos/bench/repo/contents/{path}",
+            "download_url": (
+                f"{base_url}/raw/{path}" if kind == "file" else None
+            ),
+        }
+
+    @app.get("/repos/{owner}/{repo}/commits/{ref}")
+    async def commits(owner: str, repo: str, ref: str):
+        # The synthetic repositories never change.
+        return {"sha": sha(f"{owner}/{repo}")}
+
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str = ""):
+        path = path.strip("/")
+        if not path:
+            return [entry(directory, "dir") for directory in tree]
+        if path not in tree:
+            raise HTTPException(status_code=404)
+        return [entry(f"{path}/{name}", "file") for name in tree[path]]
+
+    @app.get("/repos/{owner}/{repo}/git/trees/{ref}")
+    async def trees(owner: str, repo: str, ref: str):
+        base_url = app.state.base_url
+        return {
+            "sha": ref,
+            "truncated": False,
+            "tree": [
+                {
+                    "path": path,
+                    "mode": "100644",
+                    "type": "blob",
+                    "sha": sha(path),
+                    "size": len(content(path)),
+                    "url": (
+                        f"{base_url}/repos/{owner}/{repo}/git/blobs/"
+                        f"{sha(path)}"
+                    ),
+                }
+                for path in paths
+            ],
+        }
+
+    @app.get(
+        "/repos/{owner}/{repo}/git/blobs/{blob_sha}",
+        response_class=PlainTextResponse,
+    )
+    async def blobs(owner: str, repo: str, blob_sha: str):
+        if blob_sha not in by_sha:
+            raise HTTPException(status_code=404)
+        return content(by_sha[blob_sha])
+
+    @app.get("/raw/{path:path}", response_class=PlainTextResponse)
+    async def raw(path: str):
+        return content(path)
+
+    return app
+
+
+def sha(path: str) -> str:
+    return hashlib.sha1(path.encode()).hexdigest()
+
+
+def content(path: str) -> str:
+    return f"# {path}\ndef main():\n    return {len(path)}\n"
+
+
+def build_openai_app(
+    latency: float = 0.0,
+    stream_chunks: int = 20,
+    chunk_latency: float = 0.0,
+    rpm_limit: int | None = None,
+    tpm_limit: int | None = None,
+) -> FastAPI:
+    """
+    Fake chat-completions endpoint. Streaming requests get `stream_chunks`
+    deltas, `chunk_latency` seconds apart. With `rpm_limit`/`tpm_limit`
+    every API key gets that many requests/tokens (a token per four bytes
+    of the body) per minute and OpenAI's x-ratelimit-* headers, beyond
+    them a 429.
+    """
+    app = FastAPI()
+    app.state.calls = Counter()
+    # API key -> [window start, requests, tokens]
+    usage: dict[str, list[float]] = {}
+
+    def admit(key: str, tokens: int) -> tuple[bool, dict[str, str]]:
+        now = time.monotonic()
+        window = usage.setdefault(key, [now, 0, 0])
+        if now - window[0] >= 60:
+            window[:] = [now, 0, 0]
+        headers = {}
+        allowed = True
+        for kind, limit, used, cost in (
+            ("requests", rpm_limit, window[1], 1),
+            ("tokens", tpm_limit, window[2], tokens),
+        ):
+            if limit is None:
+                continue
+            allowed = allowed and used + cost <= limit
+            headers.update({
+                f"x-ratelimit-limit-{kind}": str(limit),
+                f"x-ratelimit-remaining-{kind}": str(
+                    max(limit - used - cost, 0)
+                ),
+                f"x-ratelimit-reset-{kind}": (
+                    f"{60 - (now - window[0]):.3f}s"
+                ),
+            })
+        if allowed:
+            window[1] += 1
+            window[2] += tokens
+        return allowed, headers
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        allowed, headers = admit(
+            request.headers.get("authorization", ""),
+            len(await request.body()) // 4,
+        )
+        if not allowed:
+            app.state.calls["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached"}},
+                status_code=429,
+                headers=headers,
+            )
+
+        app.state.calls["completions"] += 1
+        await asyncio.sleep(latency)
+        if not body.get("stream"):
+            return JSONResponse({
+                "choices": [
+                    {"message": {"role": "assistant", "content": "LGTM"}}
+                ]
+            }, headers=headers)
+
+        async def events():
+            for index in range(stream_chunks):
+                await asyncio.sleep(chunk_latency)
+                delta = {"choices": [{"delta": {"content": f"{index} "}}]}
+                yield f"data: {json.dumps(delta)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(
+            events(), media_type="text/event-stream", headers=headers
+        )
+
+    return app
+
+
+class StubServer:
+    """Runs an ASGI app with uvicorn on a free local port in a thread."""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1"):
+        self.app = app
+        self.host = host
+        self.port = self._free_port(host)
+        self.server = uvicorn.Server(
+            uvicorn.Config(
+                app, host=host, port=self.port, log_level="warning"
+            )
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+
+    def __enter__(self) -> "StubServer":
+        self.app.state.base_url = self.url
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        self.thread.join()